@@ -0,0 +1,384 @@
+import os
+import csv
+import codecs
+import time
+import logging
+from collections import deque
+from typing import AsyncIterator, Dict, List, Literal, Tuple
+
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from pydantic import ValidationError
+from sqlalchemy import bindparam, func, or_, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+import models
+import schemas
+import bulk
+import auth
+import hash_pool
+import mailer
+import user_index
+from database import get_db
+from security import require_roles
+
+# ---------------- Configuration ----------------
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 500))
+IMPORT_MAX_BATCH_SIZE = 2000  # keeps one multi-row INSERT under SQLite's bound-parameter limit
+IMPORT_CHUNK_SIZE = 64 * 1024
+REQUIRED_COLUMNS = ("nom", "prenom", "email", "cin")
+ACTIVATION_CHUNK_SIZE = int(os.getenv("ACTIVATION_CHUNK_SIZE", 200))
+
+# ---------------- Router ----------------
+router = APIRouter(
+    prefix="/admin",
+    tags=["Administration"],
+    dependencies=[Depends(require_roles("administratif"))],
+)
+
+# ---------------- Logging ----------------
+logger = logging.getLogger("admin")
+
+
+# ---------------- CSV Streaming ----------------
+class _LineFeed:
+    """
+    Iterator handed to csv.reader; lines are pushed in as upload chunks arrive.
+    """
+
+    def __init__(self):
+        self.lines = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+def _split_complete_records(text: str) -> Tuple[List[str], str]:
+    """
+    Split decoded text into lines that end outside a quoted field; return (lines, remainder).
+    A quoted field containing newlines is never cut between two chunks.
+    """
+    lines = text.splitlines(keepends=True)
+    cut = 0
+    quotes = 0
+    for i, line in enumerate(lines):
+        quotes += line.count('"')
+        if quotes % 2 == 0 and line.endswith(("\n", "\r")):
+            cut = i + 1
+    return lines[:cut], "".join(lines[cut:])
+
+
+async def iter_csv_rows(
+    upload: UploadFile,
+    required: Tuple[str, ...] = (),
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+) -> AsyncIterator[Tuple[int, Dict[str, str]]]:
+    """
+    Yield (line_number, row) from an uploaded CSV while reading it chunk by chunk.
+    Keys are the lower-cased header names; the whole file is never held in memory.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+    header = None
+    pending = ""
+
+    while True:
+        chunk = await upload.read(chunk_size)
+        final = not chunk
+        pending += decoder.decode(chunk, final=final)
+        if final:
+            lines, pending = pending.splitlines(keepends=True), ""
+        else:
+            lines, pending = _split_complete_records(pending)
+        feed.lines.extend(lines)
+
+        for values in reader:
+            if not any(v.strip() for v in values):
+                continue
+            if header is None:
+                header = [v.strip().lower() for v in values]
+                missing = [c for c in required if c not in header]
+                if missing:
+                    raise HTTPException(status_code=400, detail=f"Colonnes manquantes: {', '.join(missing)}")
+                continue
+            yield reader.line_num, {k: v.strip() for k, v in zip(header, values)}
+
+        if final:
+            break
+
+    if header is None:
+        raise HTTPException(status_code=400, detail="Fichier CSV vide")
+
+
+# ---------------- Batch Writing ----------------
+async def _flush_user_batch(db: AsyncSession, batch: List[Tuple[int, schemas.UserImportRow]], mode: str, report: dict):
+    """
+    Write one batch: a single lookup for existing cin/email, then one multi-row INSERT
+    (and in update mode one executemany UPDATE) followed by a commit.
+    """
+    cins = [row.cin for _, row in batch]
+    emails = [row.email for _, row in batch]
+    existing = (await db.execute(
+        select(models.Utilisateur.id, models.Utilisateur.cin, models.Utilisateur.email)
+        .filter(or_(models.Utilisateur.cin.in_(cins), models.Utilisateur.email.in_(emails)))
+    )).all()
+    by_cin = {r.cin: r for r in existing}
+    by_email = {r.email: r for r in existing}
+
+    to_insert = []
+    to_update = []
+    updates = []
+    for line, row in batch:
+        match_cin = by_cin.get(row.cin)
+        match_email = by_email.get(row.email)
+        if match_cin is None and match_email is None:
+            to_insert.append((line, row))
+            continue
+        if mode == "update" and (match_cin is None or match_email is None or match_cin.id == match_email.id):
+            target = match_cin or match_email
+            to_update.append((line, row))
+            updates.append({
+                "id": target.id, "nom": row.nom, "prenom": row.prenom,
+                "email": row.email, "cin": row.cin, "telp": row.telp, "role": row.role,
+            })
+            continue
+        report["skipped"] += 1
+        reason = "cin et email appartiennent à deux utilisateurs différents" if mode == "update" else "cin ou email déjà existant"
+        report["errors"].append(schemas.ImportRowError(line=line, cin=str(row.cin), email=row.email, error=reason))
+
+    try:
+        if to_insert:
+            result = await db.execute(
+                bulk.insert_ignore(models.Utilisateur.__table__).values(
+                    [row.model_dump() | {"mdp_hash": None, "image": None} for _, row in to_insert]
+                )
+            )
+            inserted = result.rowcount if result.rowcount is not None and result.rowcount >= 0 else len(to_insert)
+            report["inserted"] += inserted
+            # rows that lost a race with a concurrent writer were ignored by the database
+            report["skipped"] += len(to_insert) - inserted
+        if to_update:
+            await db.execute(update(models.Utilisateur), updates)
+            report["updated"] += len(to_update)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.exception(f"[import_users] batch starting at line {batch[0][0]} failed: {e}")
+        report["failed"] += len(to_insert) + len(to_update)
+        report["errors"].extend(
+            schemas.ImportRowError(line=line, cin=str(row.cin), email=row.email, error="Erreur base de données")
+            for line, row in to_insert + to_update
+        )
+    report["batches"] += 1
+
+
+# ---------------- Bulk Import Endpoint ----------------
+@router.post("/users/import", response_model=schemas.UserImportReport)
+async def import_users(
+    csvfile: UploadFile = File(...),
+    batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=IMPORT_MAX_BATCH_SIZE),
+    mode: Literal["ignore", "update"] = "ignore",
+    default_role: schemas.RoleName = "etudiant",
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Import users from a CSV (nom, prenom, email, telp, cin[, role]) in multi-row batches.
+    - mode=ignore: rows whose cin or email already exist are skipped and reported.
+    - mode=update: existing users matched by cin or email are updated in place.
+    """
+    started = time.perf_counter()
+    report = {"total_rows": 0, "inserted": 0, "updated": 0, "skipped": 0, "failed": 0, "batches": 0, "errors": []}
+    seen_cin = set()
+    seen_email = set()
+    batch: List[Tuple[int, schemas.UserImportRow]] = []
+
+    async for line, raw in iter_csv_rows(csvfile, REQUIRED_COLUMNS):
+        report["total_rows"] += 1
+        if not raw.get("role"):
+            raw["role"] = default_role
+        try:
+            row = schemas.UserImportRow.model_validate(raw)
+        except ValidationError as e:
+            report["failed"] += 1
+            error = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            report["errors"].append(schemas.ImportRowError(line=line, cin=raw.get("cin"), email=raw.get("email"), error=error))
+            continue
+
+        if row.cin in seen_cin or row.email in seen_email:
+            report["skipped"] += 1
+            report["errors"].append(schemas.ImportRowError(line=line, cin=str(row.cin), email=row.email, error="Doublon dans le fichier"))
+            continue
+        seen_cin.add(row.cin)
+        seen_email.add(row.email)
+
+        batch.append((line, row))
+        if len(batch) >= batch_size:
+            await _flush_user_batch(db, batch, mode, report)
+            batch = []
+
+    if batch:
+        await _flush_user_batch(db, batch, mode, report)
+    if report["inserted"] or report["updated"]:
+        # Core INSERT / UPDATE: no ORM events for the search index to follow
+        user_index.invalidate()
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"[import_users] {report['total_rows']} rows, {report['inserted']} inserted in {elapsed:.2f}s")
+    return schemas.UserImportReport(
+        **report,
+        batch_size=batch_size,
+        elapsed_seconds=round(elapsed, 3),
+        rows_per_second=round(report["total_rows"] / elapsed, 1) if elapsed > 0 else 0.0,
+    )
+
+
+# ---------------- Batch Account Activation ----------------
+def _role_rows(users: List[models.Utilisateur]) -> List[Tuple[object, list]]:
+    """
+    Missing Etudiant / Enseignant / Administratif rows for a chunk, grouped per table.
+    """
+    etudiants = [{"id": u.id, "id_groupe": None, "id_specialite": None}
+                 for u in users if u.role == "etudiant" and u.etudiant is None]
+    enseignants = [{"id": u.id} for u in users if u.role == "enseignant" and u.enseignant is None]
+    administratifs = [{"id": u.id, "poste": None} for u in users if u.role == "administratif" and u.administratif is None]
+    return [
+        (models.Etudiant.__table__, etudiants),
+        (models.Enseignant.__table__, enseignants),
+        (models.Administratif.__table__, administratifs),
+    ]
+
+
+@router.post("/users/activate", response_model=schemas.BatchActivationReport)
+async def activate_users(
+    req: schemas.BatchActivationRequest,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Activate many pre-created users at once, selected by cin/email pairs and/or a Groupe or Niveau.
+    Passwords are hashed in parallel across the bcrypt pool, role rows are bulk-inserted,
+    commits are chunked, and credential emails are queued in the outbox with each chunk.
+    """
+    started = time.perf_counter()
+    results: List[schemas.ActivationOutcome] = []
+    users = {}
+    with_roles = (
+        joinedload(models.Utilisateur.etudiant),
+        joinedload(models.Utilisateur.enseignant),
+        joinedload(models.Utilisateur.administratif),
+    )
+
+    if req.users:
+        pairs = set()
+        for item in req.users:
+            cin = item.cin.strip()
+            if cin.isdigit():
+                pairs.add((int(cin), item.email))
+            else:
+                results.append(schemas.ActivationOutcome(cin=item.cin, email=item.email, status="not_found"))
+        if pairs:
+            found = (await db.execute(
+                select(models.Utilisateur).options(*with_roles)
+                .filter(tuple_(models.Utilisateur.cin, models.Utilisateur.email).in_(pairs))
+            )).scalars().all()
+            users.update((u.id, u) for u in found)
+            found_pairs = {(u.cin, u.email) for u in found}
+            results.extend(
+                schemas.ActivationOutcome(cin=str(cin), email=email, status="not_found")
+                for cin, email in pairs - found_pairs
+            )
+
+    if req.id_groupe is not None or req.id_niveau is not None:
+        query = (
+            select(models.Utilisateur).options(*with_roles)
+            .join(models.Etudiant, models.Etudiant.id == models.Utilisateur.id)
+        )
+        if req.id_groupe is not None:
+            query = query.filter(models.Etudiant.id_groupe == req.id_groupe)
+        if req.id_niveau is not None:
+            query = (
+                query.join(models.Groupe, models.Groupe.id == models.Etudiant.id_groupe)
+                .filter(models.Groupe.id_niveau == req.id_niveau)
+            )
+        users.update((u.id, u) for u in (await db.execute(query)).scalars().all())
+
+    pending = []
+    for user in users.values():
+        if user.mdp_hash and user.mdp_hash.strip():
+            results.append(schemas.ActivationOutcome(id=user.id, cin=str(user.cin), email=user.email, status="already_active"))
+        else:
+            pending.append(user)
+
+    passwords = [auth.generate_random_password(12) for _ in pending]
+    hashes = await hash_pool.hash_passwords(passwords)
+
+    emails_queued = 0
+    for i in range(0, len(pending), ACTIVATION_CHUNK_SIZE):
+        chunk = pending[i:i + ACTIVATION_CHUNK_SIZE]
+        chunk_hashes = hashes[i:i + ACTIVATION_CHUNK_SIZE]
+        chunk_passwords = passwords[i:i + ACTIVATION_CHUNK_SIZE]
+        try:
+            users_table = models.Utilisateur.__table__
+            # the not-yet-active check is repeated here: a signup or an overlapping batch may have
+            # activated the account since it was read, and its password must not be replaced
+            updated = await db.execute(
+                update(users_table)
+                .where(
+                    users_table.c.id == bindparam("b_id"),
+                    or_(users_table.c.mdp_hash.is_(None), func.trim(users_table.c.mdp_hash) == ""),
+                )
+                .values(mdp_hash=bindparam("b_hash")),
+                [{"b_id": u.id, "b_hash": h} for u, h in zip(chunk, chunk_hashes)],
+            )
+            if updated.rowcount != len(chunk) or not db.bind.dialect.supports_sane_multi_rowcount:
+                # hashes are salted, so a row holding ours is a row this batch activated
+                stored = dict((await db.execute(
+                    select(users_table.c.id, users_table.c.mdp_hash).where(users_table.c.id.in_([u.id for u in chunk]))
+                )).all())
+                ours = [stored.get(u.id) == h for u, h in zip(chunk, chunk_hashes)]
+                taken = [u for u, mine in zip(chunk, ours) if not mine]
+                chunk = [u for u, mine in zip(chunk, ours) if mine]
+                chunk_passwords = [p for p, mine in zip(chunk_passwords, ours) if mine]
+                results.extend(
+                    schemas.ActivationOutcome(id=u.id, cin=str(u.cin), email=u.email, status="already_active") for u in taken
+                )
+            for table, rows in _role_rows(chunk):
+                if rows:
+                    await db.execute(bulk.insert_ignore(table).values(rows))
+            if chunk:
+                await mailer.enqueue_emails(db, [
+                    (u.email, auth.ACTIVATION_SUBJECT, auth.activation_email_body(u, p))
+                    for u, p in zip(chunk, chunk_passwords)
+                ])
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.exception(f"[activate_users] chunk of {len(chunk)} users failed: {e}")
+            results.extend(
+                schemas.ActivationOutcome(id=u.id, cin=str(u.cin), email=u.email, status="failed") for u in chunk
+            )
+            continue
+
+        emails_queued += len(chunk)
+        mailer.dispatcher.notify()
+        results.extend(
+            schemas.ActivationOutcome(id=u.id, cin=str(u.cin), email=u.email, status="activated") for u in chunk
+        )
+
+    counts = {status: 0 for status in ("activated", "already_active", "not_found", "failed")}
+    for outcome in results:
+        counts[outcome.status] += 1
+    elapsed = time.perf_counter() - started
+    logger.info(f"[activate_users] {counts['activated']} users activated in {elapsed:.2f}s")
+    return schemas.BatchActivationReport(
+        requested=len(results),
+        **counts,
+        emails_queued=emails_queued,
+        elapsed_seconds=round(elapsed, 3),
+        results=results,
+    )
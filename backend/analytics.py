@@ -0,0 +1,408 @@
+from __future__ import annotations
+
+import os
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+import schemas
+import model_events
+from lazy_imports import lazy_module
+from conflicts import weekday
+from occupancy import week_start
+from database import get_db
+from security import ExpiringLRU, Principal, get_current_user, require_roles
+
+np = lazy_module("numpy")
+
+# ---------------- Configuration ----------------
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", 8))
+ANALYTICS_TTL = float(os.getenv("ANALYTICS_TTL", 600))
+AT_RISK_THRESHOLD = float(os.getenv("AT_RISK_THRESHOLD", 0.2))
+# Absence.statut values counted as a missed seance (compared lower-cased)
+ABSENT_STATUSES = tuple(s.strip().lower() for s in os.getenv("ABSENT_STATUSES", "absent,absente").split(",") if s.strip())
+
+# ---------------- Router ----------------
+router = APIRouter(prefix="/analytics", tags=["Analytics"])
+staff_only = require_roles("administratif", "enseignant")
+
+# ---------------- Logging ----------------
+logger = logging.getLogger("analytics")
+
+
+def current_semester(today: date) -> Tuple[date, date]:
+    """
+    S1 runs September to January, S2 February to July.
+    """
+    if today.month >= 9:
+        return date(today.year, 9, 1), date(today.year + 1, 1, 31)
+    if today.month == 1:
+        return date(today.year - 1, 9, 1), date(today.year, 1, 31)
+    return date(today.year, 2, 1), date(today.year, 7, 31)
+
+
+def _rate(absent: np.ndarray, expected: np.ndarray) -> np.ndarray:
+    return np.divide(absent, expected, out=np.zeros(np.shape(absent), dtype=np.float64), where=expected > 0)
+
+
+def _week_index(days: Iterable[date], origin: date) -> np.ndarray:
+    offsets = np.array(list(days), dtype="datetime64[D]") - np.datetime64(origin, "D")
+    return offsets.astype(np.int64) // 7
+
+
+@dataclass
+class AttendanceCube:
+    """
+    Absences and expected seance occurrences for one period, as arrays indexed by
+    compact student / matière / groupe / week positions.
+
+    expected[g, m, w]: occurrences of matière m for groupe g in week w (per student).
+    Absences are kept sparse: (abs_s, abs_m, abs_w) -> abs_n, since a student only
+    follows the matières of their niveau.
+    """
+    debut: date
+    fin: date
+    weeks: List[date]
+    student_ids: np.ndarray
+    student_group: np.ndarray
+    group_ids: np.ndarray
+    matiere_ids: np.ndarray
+    expected: np.ndarray
+    abs_s: np.ndarray
+    abs_m: np.ndarray
+    abs_w: np.ndarray
+    abs_n: np.ndarray
+
+    def __post_init__(self):
+        n, (g, m, w) = len(self.student_ids), self.expected.shape
+        self.group_size = np.bincount(self.student_group, minlength=g)
+        expected_gw = self.expected.sum(axis=1)
+        self.expected_gm = self.expected.sum(axis=2)
+        # per student x week
+        self.student_expected_w = expected_gw[self.student_group]
+        self.student_absent_w = np.bincount(
+            self.abs_s * w + self.abs_w, weights=self.abs_n, minlength=n * w,
+        ).reshape(n, w)
+        # per matière x week and per groupe x week, weighted by head count
+        self.matiere_expected_w = np.einsum("gmw,g->mw", self.expected, self.group_size)
+        self.matiere_absent_w = np.bincount(
+            self.abs_m * w + self.abs_w, weights=self.abs_n, minlength=m * w,
+        ).reshape(m, w)
+        self.group_expected_w = expected_gw * self.group_size[:, None]
+        self.group_absent_w = np.bincount(
+            self.student_group[self.abs_s] * w + self.abs_w, weights=self.abs_n, minlength=g * w,
+        ).reshape(g, w)
+
+    def student_matiere_totals(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (student index, matière index, absences, expected) for every pair with an absence.
+        """
+        m = len(self.matiere_ids)
+        keys, inverse = np.unique(self.abs_s * m + self.abs_m, return_inverse=True)
+        absent = np.bincount(inverse, weights=self.abs_n, minlength=len(keys))
+        s, mi = keys // m, keys % m
+        return s, mi, absent, self.expected_gm[self.student_group[s], mi]
+
+    def student_position(self, student_id: int) -> Optional[int]:
+        pos = int(np.searchsorted(self.student_ids, student_id))
+        if pos < len(self.student_ids) and self.student_ids[pos] == student_id:
+            return pos
+        return None
+
+
+async def build_cube(db: AsyncSession, debut: date, fin: date) -> AttendanceCube:
+    """
+    Three column-only queries, then pure array work: no per-row ORM objects.
+    """
+    origin = week_start(debut)
+    n_weeks = (week_start(fin) - origin).days // 7 + 1
+
+    students = (await db.execute(
+        select(models.Etudiant.id, models.Etudiant.id_groupe)
+        .where(models.Etudiant.id_groupe.is_not(None))
+        .order_by(models.Etudiant.id)
+    )).all()
+    seances = (await db.execute(
+        select(models.Seance.id_groupe, models.Seance.id_matiere, models.Seance.day_of_week, models.Seance.specific_date)
+        .where(or_(models.Seance.specific_date.is_(None), models.Seance.specific_date.between(debut, fin)))
+    )).all()
+    absences = (await db.execute(
+        select(models.Absence.id_etudiant, models.Seance.id_matiere, models.Absence.date)
+        .join(models.Seance, models.Seance.id == models.Absence.id_seance)
+        .where(models.Absence.date.between(debut, fin), func.lower(models.Absence.statut).in_(ABSENT_STATUSES))
+    )).all()
+
+    student_ids = np.array([r[0] for r in students], dtype=np.int64)
+    student_group_ids = np.array([r[1] for r in students], dtype=np.int64)
+    seance_group_ids = np.array([r[0] for r in seances], dtype=np.int64)
+    seance_matiere_ids = np.array([r[1] for r in seances], dtype=np.int64)
+    abs_student_ids = np.array([r[0] for r in absences], dtype=np.int64)
+    abs_matiere_ids = np.array([r[1] for r in absences], dtype=np.int64)
+
+    group_ids = np.unique(np.concatenate([student_group_ids, seance_group_ids]))
+    matiere_ids = np.unique(np.concatenate([seance_matiere_ids, abs_matiere_ids]))
+    student_group = np.searchsorted(group_ids, student_group_ids)
+
+    # expected occurrences: recurring seances hit every week containing their weekday
+    expected = np.zeros((len(group_ids), len(matiere_ids), n_weeks), dtype=np.int32)
+    if seances:
+        g = np.searchsorted(group_ids, seance_group_ids)
+        m = np.searchsorted(matiere_ids, seance_matiere_ids)
+        dated = np.array([r[3] is not None for r in seances])
+        dows = np.array([-1 if r[2] is None else r[2] for r in seances], dtype=np.int64)
+        for dow in range(7):
+            mask = ~dated & (dows == dow)
+            if not mask.any():
+                continue
+            first = debut + timedelta(days=(dow - weekday(debut)) % 7)
+            if first > fin:
+                continue
+            occurrences = _week_index([first], origin)[0] + np.arange((fin - first).days // 7 + 1)
+            np.add.at(expected, (g[mask][:, None], m[mask][:, None], occurrences[None, :]), 1)
+        if dated.any():
+            w = _week_index([r[3] for r in seances if r[3] is not None], origin)
+            np.add.at(expected, (g[dated], m[dated], w), 1)
+
+    # absences of students without a groupe fall outside every rate
+    abs_s = np.searchsorted(student_ids, abs_student_ids)
+    known = abs_s < len(student_ids)
+    known[known] = student_ids[abs_s[known]] == abs_student_ids[known]
+    abs_s = abs_s[known]
+    abs_m = np.searchsorted(matiere_ids, abs_matiere_ids[known])
+    abs_w = _week_index([r[2] for r, k in zip(absences, known) if k], origin) if known.any() else np.zeros(0, dtype=np.int64)
+
+    n_m = max(len(matiere_ids), 1)
+    keys, counts = np.unique((abs_s * n_m + abs_m) * n_weeks + abs_w, return_counts=True)
+    return AttendanceCube(
+        debut=debut,
+        fin=fin,
+        weeks=[origin + timedelta(weeks=i) for i in range(n_weeks)],
+        student_ids=student_ids,
+        student_group=student_group,
+        group_ids=group_ids,
+        matiere_ids=matiere_ids,
+        expected=expected,
+        abs_s=keys // n_weeks // n_m,
+        abs_m=keys // n_weeks % n_m,
+        abs_w=keys % n_weeks,
+        abs_n=counts,
+    )
+
+
+# ---------------- Per-period cache ----------------
+_cache = ExpiringLRU(ANALYTICS_CACHE_SIZE)
+_build_lock = asyncio.Lock()
+# bumped on every invalidation so a build that raced a write is not cached
+_generation = 0
+
+
+async def get_cube(db: AsyncSession, debut: Optional[date], fin: Optional[date]) -> AttendanceCube:
+    """
+    Cube for [debut, fin] (default: current semester), counted up to today.
+    """
+    today = date.today()
+    if debut is None or fin is None:
+        semester = current_semester(today)
+        debut, fin = debut or semester[0], fin or semester[1]
+    fin = min(fin, today)
+    if fin < debut:
+        raise HTTPException(status_code=422, detail="Période invalide")
+
+    key = (debut, fin)
+    cube = _cache.get(key)
+    if cube is not None:
+        return cube
+    async with _build_lock:
+        cube = _cache.get(key)
+        if cube is not None:
+            return cube
+        generation, started = _generation, time.perf_counter()
+        cube = await build_cube(db, debut, fin)
+        if generation == _generation:
+            _cache.set(key, cube, time.time() + ANALYTICS_TTL)
+        logger.info(
+            f"[analytics] cube {debut}..{fin}: {len(cube.student_ids)} students, {len(cube.matiere_ids)} matieres, "
+            f"{len(cube.weeks)} weeks built in {(time.perf_counter() - started) * 1000:.1f} ms"
+        )
+    return cube
+
+
+def invalidate(days: Optional[Iterable[date]] = None):
+    """
+    Drop cached periods containing any of `days` (all periods when None).
+    Bulk Core writes, which bypass model_events, call this directly.
+    """
+    global _generation
+    _generation += 1
+    if days is None:
+        _cache.clear()
+        return
+    days = set(days)
+    for debut, fin in _cache.keys():
+        if any(debut <= d <= fin for d in days):
+            _cache.pop((debut, fin))
+
+
+def _on_absence_change(upserted: List[dict], deleted: List[dict]):
+    invalidate(row["date"] for row in upserted + deleted)
+
+
+def _on_roster_change(upserted: List[dict], deleted: List[dict]):
+    invalidate()
+
+
+model_events.subscribe(models.Absence, _on_absence_change)
+model_events.subscribe(models.Seance, _on_roster_change)
+model_events.subscribe(models.Etudiant, _on_roster_change)
+
+
+# ---------------- Endpoints ----------------
+def _period(cube: AttendanceCube) -> dict:
+    return {"debut": cube.debut, "fin": cube.fin, "semaines": cube.weeks}
+
+
+@router.get("/attendance/etudiants", response_model=schemas.StudentAttendanceReport, dependencies=[Depends(staff_only)])
+async def student_rates(
+    debut: Optional[date] = None,
+    fin: Optional[date] = None,
+    id_groupe: Optional[int] = None,
+    limit: int = Query(500, ge=1, le=10000),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Absence rate of every student over the period, highest first.
+    """
+    cube = await get_cube(db, debut, fin)
+    absent = cube.student_absent_w.sum(axis=1)
+    expected = cube.student_expected_w.sum(axis=1)
+    rows = np.arange(len(cube.student_ids))
+    if id_groupe is not None:
+        rows = rows[cube.group_ids[cube.student_group] == id_groupe]
+    rate = _rate(absent[rows], expected[rows])
+    order = rows[np.argsort(-rate, kind="stable")][:limit]
+    return schemas.StudentAttendanceReport(**_period(cube), etudiants=[
+        schemas.StudentAttendance(
+            id=int(cube.student_ids[i]),
+            id_groupe=int(cube.group_ids[cube.student_group[i]]),
+            absences=int(absent[i]),
+            seances_prevues=int(expected[i]),
+            taux=round(float(_rate(absent[i], expected[i])), 4),
+        )
+        for i in order
+    ])
+
+
+@router.get("/attendance/etudiants/{id_etudiant}", response_model=schemas.StudentAttendanceDetail)
+async def student_detail(
+    id_etudiant: int,
+    debut: Optional[date] = None,
+    fin: Optional[date] = None,
+    db: AsyncSession = Depends(get_db),
+    principal: Principal = Depends(get_current_user),
+):
+    """
+    Matière x week absence matrix of one student; students may only read their own.
+    """
+    if principal.id != id_etudiant and not principal.has_role("administratif", "enseignant"):
+        raise HTTPException(status_code=403, detail="Accès refusé")
+    cube = await get_cube(db, debut, fin)
+    pos = cube.student_position(id_etudiant)
+    if pos is None:
+        raise HTTPException(status_code=404, detail="Étudiant introuvable ou sans groupe")
+
+    group = cube.student_group[pos]
+    followed = np.flatnonzero(cube.expected_gm[group] > 0)
+    mine = cube.abs_s == pos
+    matrix = np.zeros((len(cube.matiere_ids), len(cube.weeks)), dtype=np.int64)
+    np.add.at(matrix, (cube.abs_m[mine], cube.abs_w[mine]), cube.abs_n[mine])
+    shown = np.union1d(followed, np.flatnonzero(matrix.any(axis=1)))
+
+    absent, expected = cube.student_absent_w[pos].sum(), cube.student_expected_w[pos].sum()
+    return schemas.StudentAttendanceDetail(
+        **_period(cube),
+        id=id_etudiant,
+        id_groupe=int(cube.group_ids[group]),
+        absences=int(absent),
+        seances_prevues=int(expected),
+        taux=round(float(_rate(absent, expected)), 4),
+        matieres=[
+            schemas.MatiereAttendance(
+                id_matiere=int(cube.matiere_ids[m]),
+                absences=int(matrix[m].sum()),
+                seances_prevues=int(cube.expected_gm[group, m]),
+                taux=round(float(_rate(matrix[m].sum(), cube.expected_gm[group, m])), 4),
+                par_semaine=matrix[m].tolist(),
+            )
+            for m in shown
+        ],
+    )
+
+
+def _rollup(cube: AttendanceCube, ids: np.ndarray, absent_w: np.ndarray, expected_w: np.ndarray) -> schemas.AttendanceRollup:
+    absent, expected = absent_w.sum(axis=1), expected_w.sum(axis=1)
+    rate, weekly = _rate(absent, expected), _rate(absent_w, expected_w).round(4)
+    return schemas.AttendanceRollup(**_period(cube), items=[
+        schemas.AttendanceSeries(
+            id=int(ids[i]),
+            absences=int(absent[i]),
+            seances_prevues=int(expected[i]),
+            taux=round(float(rate[i]), 4),
+            par_semaine=weekly[i].tolist(),
+        )
+        for i in range(len(ids))
+        if expected[i] > 0 or absent[i] > 0
+    ])
+
+
+@router.get("/attendance/matieres", response_model=schemas.AttendanceRollup, dependencies=[Depends(staff_only)])
+async def matiere_rollup(debut: Optional[date] = None, fin: Optional[date] = None, db: AsyncSession = Depends(get_db)):
+    """
+    Absence rate per matière, overall and week by week (student-seances missed / expected).
+    """
+    cube = await get_cube(db, debut, fin)
+    return _rollup(cube, cube.matiere_ids, cube.matiere_absent_w, cube.matiere_expected_w)
+
+
+@router.get("/attendance/groupes", response_model=schemas.AttendanceRollup, dependencies=[Depends(staff_only)])
+async def groupe_rollup(debut: Optional[date] = None, fin: Optional[date] = None, db: AsyncSession = Depends(get_db)):
+    """
+    Absence rate per groupe, overall and week by week.
+    """
+    cube = await get_cube(db, debut, fin)
+    return _rollup(cube, cube.group_ids, cube.group_absent_w, cube.group_expected_w)
+
+
+@router.get("/attendance/at-risk", response_model=schemas.AtRiskReport, dependencies=[Depends(staff_only)])
+async def at_risk(
+    seuil: float = Query(AT_RISK_THRESHOLD, gt=0, le=1),
+    debut: Optional[date] = None,
+    fin: Optional[date] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    (student, matière) pairs whose absence rate reached `seuil`, worst first.
+    """
+    cube = await get_cube(db, debut, fin)
+    s, m, absent, expected = cube.student_matiere_totals()
+    rate = _rate(absent, expected)
+    hits = np.flatnonzero(rate >= seuil)
+    hits = hits[np.argsort(-rate[hits], kind="stable")]
+    return schemas.AtRiskReport(**_period(cube), seuil=seuil, etudiants=[
+        schemas.AtRiskStudent(
+            id_etudiant=int(cube.student_ids[s[i]]),
+            id_groupe=int(cube.group_ids[cube.student_group[s[i]]]),
+            id_matiere=int(cube.matiere_ids[m[i]]),
+            absences=int(absent[i]),
+            seances_prevues=int(expected[i]),
+            taux=round(float(rate[i]), 4),
+        )
+        for i in hits
+    ])
@@ -0,0 +1,532 @@
+import os
+import re
+import hmac
+import time
+import uuid
+import base64
+import asyncio
+import hashlib
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.security import HTTPAuthorizationCredentials
+from fastapi.responses import FileResponse
+from sqlalchemy import bindparam, case, delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import bulk
+import models
+import schemas
+import auth_utils
+from database import AsyncSessionLocal, get_db
+from security import ExpiringLRU, bearer_scheme, get_current_user, get_current_user_id, invalidate_user, require_roles
+
+# ---------------- Configuration ----------------
+FICHIERS_DIR = os.getenv("FICHIERS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "storage", "fichiers"))
+FICHIER_MAX_BYTES = int(os.getenv("FICHIER_MAX_BYTES", 10 * 1024 * 1024))
+FICHIER_TYPES = frozenset(
+    t.strip().lower() for t in os.getenv("FICHIER_TYPES", "image/jpeg,image/png,image/webp,application/pdf").split(",") if t.strip()
+)
+# An unreferenced blob is kept this long (seconds), so an upload can be attached afterwards
+FICHIER_GRACE = float(os.getenv("FICHIER_GRACE", 24 * 3600))
+FICHIER_GC_INTERVAL = float(os.getenv("FICHIER_GC_INTERVAL", 3600))  # 0 disables the periodic collection
+FICHIER_GC_BATCH = int(os.getenv("FICHIER_GC_BATCH", 500))
+# Behind nginx: internal location prefix mapped onto FICHIERS_DIR, so nginx sends the file itself
+# (sendfile, ranges) and the API only answers with headers
+FICHIER_ACCEL_REDIRECT = os.getenv("FICHIER_ACCEL_REDIRECT")
+# Signed download URLs stay valid between one and two of these periods (seconds); expiries are
+# rounded to the period so a page rendered twice yields the same URL and reuses the browser cache
+FICHIER_URL_TTL = int(os.getenv("FICHIER_URL_TTL", 300))
+
+URL_PREFIX = "/fichiers/"
+WRITE_BUFFER = 1024 * 1024
+
+# ---------------- Router ----------------
+router = APIRouter(prefix="/fichiers", tags=["Fichiers"])
+admin_only = require_roles("administratif")
+
+# ---------------- Logging ----------------
+logger = logging.getLogger("attachments")
+
+_SHA256 = re.compile(r"[0-9a-f]{64}")
+# sha256 -> (content_type, size); blobs never change, only disappear
+_meta = ExpiringLRU(10000)
+
+
+# ---------------- Paths and references ----------------
+def blob_path(digest: str) -> str:
+    return os.path.join(FICHIERS_DIR, digest[:2], digest)
+
+
+def url_of(digest: str) -> str:
+    return URL_PREFIX + digest
+
+
+def sha_of(reference: Optional[str]) -> Optional[str]:
+    """
+    The blob a stored path string (Utilisateur.image, MessEnsAbs.file_path) points at, if any.
+    """
+    if reference and reference.startswith(URL_PREFIX) and _SHA256.fullmatch(reference[len(URL_PREFIX):]):
+        return reference[len(URL_PREFIX):]
+    return None
+
+
+def _signature(digest: str, expires: int) -> str:
+    mac = hmac.new(auth_utils.SECRET_KEY.encode(), f"fichier:{digest}:{expires}".encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(mac).rstrip(b"=").decode()
+
+
+def signed_url(digest: str) -> Tuple[str, int]:
+    """
+    A short-lived URL opening the blob without credentials, for <img> / <a> tags, and its
+    expiry (epoch seconds). It carries an HMAC of the digest and the expiry, never a token.
+    """
+    expires = (int(time.time()) // FICHIER_URL_TTL + 2) * FICHIER_URL_TTL
+    return f"{url_of(digest)}?expires={expires}&signature={_signature(digest, expires)}", expires
+
+
+def _media_type(header: Optional[str]) -> str:
+    return (header or "").split(";")[0].strip().lower()
+
+
+def _response(row: models.Fichier) -> schemas.FichierResponse:
+    return schemas.FichierResponse(
+        sha256=row.sha256, taille=row.taille, content_type=row.content_type,
+        url=url_of(row.sha256), lien=signed_url(row.sha256)[0],
+    )
+
+
+# ---------------- Upload ----------------
+def _write(f, hasher, data: bytes):
+    hasher.update(data)
+    f.write(data)
+
+
+def _close(f):
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+
+
+def _discard(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+async def _receive(request: Request) -> Tuple[str, int, str]:
+    """
+    Stream the raw request body to a temporary file, hashing it on the way. Chunks are
+    gathered into 1 MiB writes done off the event loop. Returns (sha256, size, temp path).
+    """
+    declared = request.headers.get("content-length")
+    if declared is not None and declared.isdigit() and int(declared) > FICHIER_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Fichier trop volumineux")
+
+    tmp_dir = os.path.join(FICHIERS_DIR, ".tmp")
+    await anyio.to_thread.run_sync(lambda: os.makedirs(tmp_dir, exist_ok=True))
+    tmp = os.path.join(tmp_dir, uuid.uuid4().hex)
+    f = await anyio.to_thread.run_sync(open, tmp, "wb")
+    hasher = hashlib.sha256()
+    size = 0
+    buffer = bytearray()
+    try:
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > FICHIER_MAX_BYTES:
+                raise HTTPException(status_code=413, detail="Fichier trop volumineux")
+            buffer += chunk
+            if len(buffer) >= WRITE_BUFFER:
+                data, buffer = buffer, bytearray()
+                await anyio.to_thread.run_sync(_write, f, hasher, data)
+        if buffer:
+            await anyio.to_thread.run_sync(_write, f, hasher, buffer)
+        await anyio.to_thread.run_sync(_close, f)
+    except BaseException:
+        f.close()
+        await anyio.to_thread.run_sync(_discard, tmp)
+        raise
+    if size == 0:
+        await anyio.to_thread.run_sync(_discard, tmp)
+        raise HTTPException(status_code=400, detail="Fichier vide")
+    return hasher.hexdigest(), size, tmp
+
+
+def _place(tmp: str, digest: str):
+    final = blob_path(digest)
+    os.makedirs(os.path.dirname(final), exist_ok=True)
+    # identical bytes under the same name: replacing an existing copy is harmless, and
+    # guarantees the blob is on disk after its row was (re)committed
+    os.replace(tmp, final)
+
+
+async def store(db: AsyncSession, request: Request, allowed=FICHIER_TYPES) -> models.Fichier:
+    """
+    Store the request body as a blob and commit its row (unreferenced, inside its grace
+    period). Uploading bytes that are already stored keeps a single copy.
+    """
+    content_type = _media_type(request.headers.get("content-type"))
+    if content_type not in allowed:
+        raise HTTPException(status_code=415, detail="Type de fichier non autorisé")
+    digest, size, tmp = await _receive(request)
+    try:
+        now = datetime.utcnow()
+        await db.execute(bulk.insert_ignore(models.Fichier.__table__).values(
+            sha256=digest, taille=size, content_type=content_type, created_at=now,
+            nb_references=0, orphelin_depuis=now,
+        ))
+        # an orphan uploaded again gets its grace period back
+        await db.execute(
+            update(models.Fichier)
+            .where(models.Fichier.sha256 == digest, models.Fichier.nb_references == 0)
+            .values(orphelin_depuis=now)
+        )
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        await anyio.to_thread.run_sync(_discard, tmp)
+        logger.exception(f"[store] DB commit failed: {e}")
+        raise HTTPException(status_code=500, detail="Enregistrement du fichier impossible")
+    await anyio.to_thread.run_sync(_place, tmp, digest)
+    return await db.get(models.Fichier, digest)
+
+
+# ---------------- Reference counting ----------------
+async def retain(db: AsyncSession, reference: Optional[str]):
+    """
+    Count one more reference to the blob behind `reference` in the caller's transaction.
+    Path strings that are not blob URLs (legacy uploads) are left alone.
+    """
+    digest = sha_of(reference)
+    if digest is None:
+        return
+    f = models.Fichier
+    result = await db.execute(
+        update(f).where(f.sha256 == digest).values(nb_references=f.nb_references + 1, orphelin_depuis=None)
+    )
+    if not result.rowcount:
+        raise HTTPException(status_code=404, detail="Fichier introuvable")
+
+
+async def release(db: AsyncSession, reference: Optional[str]):
+    digest = sha_of(reference)
+    if digest is None:
+        return
+    f = models.Fichier
+    # orphelin_depuis first: MySQL evaluates SET clauses left to right on the updated values
+    await db.execute(
+        update(f).where(f.sha256 == digest, f.nb_references > 0).ordered_values(
+            (f.orphelin_depuis, case((f.nb_references <= 1, datetime.utcnow()), else_=None)),
+            (f.nb_references, f.nb_references - 1),
+        )
+    )
+
+
+async def recount(db: AsyncSession) -> int:
+    """
+    Recompute every reference count from the columns holding blob URLs, e.g. after rows
+    were written or deleted outside this API. Returns the number of referenced blobs.
+    """
+    counts: Counter = Counter()
+    for column in (models.Utilisateur.image, models.MessEnsAbs.file_path):
+        rows = await db.execute(select(column, func.count()).where(column.like(URL_PREFIX + "%")).group_by(column))
+        for reference, n in rows:
+            digest = sha_of(reference)
+            if digest is not None:
+                counts[digest] += n
+
+    table = models.Fichier.__table__
+    await db.execute(update(table).values(
+        nb_references=0, orphelin_depuis=func.coalesce(table.c.orphelin_depuis, datetime.utcnow()),
+    ))
+    if counts:
+        await db.execute(
+            update(table).where(table.c.sha256 == bindparam("b_sha256")).values(nb_references=bindparam("b_n"), orphelin_depuis=None),
+            [{"b_sha256": digest, "b_n": n} for digest, n in counts.items()],
+        )
+    await db.commit()
+    return len(counts)
+
+
+# ---------------- Garbage collection ----------------
+def _trash(digests: List[str]) -> List[Tuple[str, str]]:
+    moved = []
+    for digest in digests:
+        aside = os.path.join(FICHIERS_DIR, ".tmp", f"gc-{digest}-{uuid.uuid4().hex[:8]}")
+        try:
+            os.replace(blob_path(digest), aside)
+        except FileNotFoundError:
+            continue
+        moved.append((digest, aside))
+    return moved
+
+
+def _settle(moved: List[Tuple[str, str]], alive: set):
+    for digest, aside in moved:
+        if digest in alive:
+            os.replace(aside, blob_path(digest))
+        else:
+            _discard(aside)
+
+
+def _sweep_tmp(older_than: float) -> int:
+    """
+    Temporary files left by interrupted uploads or a crash.
+    """
+    removed = 0
+    tmp_dir = os.path.join(FICHIERS_DIR, ".tmp")
+    try:
+        entries = list(os.scandir(tmp_dir))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.stat().st_mtime < older_than:
+                os.unlink(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+async def collect(limit: int = FICHIER_GC_BATCH) -> schemas.FichierGcReport:
+    """
+    Delete blobs unreferenced for longer than FICHIER_GRACE: rows first, then files. Each file
+    is moved aside and its row looked up again before it is removed, so a blob uploaded
+    again meanwhile (row re-created, file re-placed) is kept. Safe to run from every worker.
+    """
+    f = models.Fichier
+    cutoff = datetime.utcnow() - timedelta(seconds=FICHIER_GRACE)
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(
+            select(f.sha256, f.taille).where(f.nb_references == 0, f.orphelin_depuis < cutoff).limit(limit)
+        )).all()
+        if rows:
+            digests = [r.sha256 for r in rows]
+            await db.execute(delete(f).where(f.sha256.in_(digests), f.nb_references == 0, f.orphelin_depuis < cutoff))
+            await db.commit()
+            moved = await anyio.to_thread.run_sync(_trash, digests)
+            alive = set((await db.execute(select(f.sha256).where(f.sha256.in_(digests)))).scalars())
+            await anyio.to_thread.run_sync(_settle, moved, alive)
+        else:
+            alive = set()
+    await anyio.to_thread.run_sync(_sweep_tmp, time.time() - FICHIER_GRACE)
+
+    removed = [r for r in rows if r.sha256 not in alive]
+    for r in removed:
+        _meta.pop(r.sha256)
+    report = schemas.FichierGcReport(supprimes=len(removed), octets=sum(r.taille for r in removed))
+    if removed:
+        logger.info(f"[collect] {report.supprimes} fichiers supprimés ({report.octets} octets)")
+    return report
+
+
+class Collector:
+    """
+    Background task running collect() every FICHIER_GC_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if FICHIER_GC_INTERVAL > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run(), name="fichier-gc")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(FICHIER_GC_INTERVAL)
+            try:
+                await collect()
+            except Exception as e:
+                logger.exception(f"[collector] collection failed: {e}")
+
+
+collector = Collector()
+
+
+# ---------------- Download ----------------
+class FileRangeResponse(FileResponse):
+    """
+    206 Partial Content for one byte window of a file, read in chunks off the event loop.
+    """
+
+    def __init__(self, path: str, first: int, last: int, size: int, **kwargs):
+        super().__init__(path, status_code=206, **kwargs)
+        self.first, self.last = first, last
+        self.headers["content-range"] = f"bytes {first}-{last}/{size}"
+        self.headers["content-length"] = str(last - first + 1)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        remaining = self.last - self.first + 1
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.first)
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                remaining = remaining - len(chunk) if chunk else 0
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+
+
+def _byte_range(request: Request, etag: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    The single range requested, as inclusive offsets; None means the whole file (no Range,
+    a stale If-Range, or several ranges, which may be answered with the full body).
+    """
+    header = request.headers.get("range")
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    if_range = request.headers.get("if-range")
+    if if_range is not None and if_range.strip() != etag:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first == "":
+            # suffix range: the last N bytes
+            suffix = int(last)
+            start, end = (max(0, size - suffix), size - 1) if suffix > 0 else (size, 0)
+        else:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise HTTPException(status_code=416, detail="Plage non satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+async def _can_download(
+    digest: str,
+    expires: Optional[int] = Query(None),
+    signature: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+):
+    """
+    A bearer token, or the expires/signature pair of a signed URL (see signed_url).
+    """
+    if credentials is not None:
+        await get_current_user(credentials)
+        return
+    if expires is None or not signature:
+        raise HTTPException(status_code=401, detail="Authentification requise", headers={"WWW-Authenticate": "Bearer"})
+    if expires < time.time() or not hmac.compare_digest(signature.encode(), _signature(digest, expires).encode()):
+        raise HTTPException(status_code=403, detail="Lien expiré ou invalide")
+
+
+@router.api_route("/{digest}", methods=["GET", "HEAD"], dependencies=[Depends(_can_download)])
+async def download(digest: str, request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    The blob, with a strong ETag (its sha256), If-None-Match and single Range requests.
+    Signed URLs (GET /fichiers/{digest}/lien) can be used directly in <img> / <a> tags.
+    """
+    if not _SHA256.fullmatch(digest):
+        raise HTTPException(status_code=404, detail="Fichier introuvable")
+    etag = f'"{digest}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes",
+        "X-Content-Type-Options": "nosniff",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(","))):
+        return Response(status_code=304, headers=headers)
+
+    meta = _meta.get(digest)
+    if meta is None:
+        row = (await db.execute(
+            select(models.Fichier.content_type, models.Fichier.taille).where(models.Fichier.sha256 == digest)
+        )).first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Fichier introuvable")
+        meta = (row.content_type, row.taille)
+        _meta.set(digest, meta, time.time() + 3600)
+    content_type, size = meta
+
+    if FICHIER_ACCEL_REDIRECT:
+        headers["X-Accel-Redirect"] = f"{FICHIER_ACCEL_REDIRECT.rstrip('/')}/{digest[:2]}/{digest}"
+        return Response(media_type=content_type, headers=headers)
+
+    path = blob_path(digest)
+    try:
+        stat_result = await anyio.to_thread.run_sync(os.stat, path)
+    except FileNotFoundError:
+        _meta.pop(digest)
+        logger.error(f"[download] blob {digest} has a row but no file")
+        raise HTTPException(status_code=404, detail="Fichier introuvable")
+    byte_range = _byte_range(request, etag, stat_result.st_size)
+    if byte_range is not None:
+        return FileRangeResponse(path, *byte_range, stat_result.st_size, headers=headers, media_type=content_type, stat_result=stat_result)
+    return FileResponse(path, headers=headers, media_type=content_type, stat_result=stat_result)
+
+
+@router.get("/{digest}/lien", response_model=schemas.FichierLien, dependencies=[Depends(get_current_user)])
+async def download_link(digest: str):
+    if not _SHA256.fullmatch(digest):
+        raise HTTPException(status_code=404, detail="Fichier introuvable")
+    url, expires = signed_url(digest)
+    return schemas.FichierLien(url=url, expires_at=expires)
+
+
+# ---------------- Upload endpoints ----------------
+@router.post("", response_model=schemas.FichierResponse, status_code=201, dependencies=[Depends(get_current_user)])
+async def upload(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Upload a file as the raw request body (Content-Type: its media type). The returned url
+    is what to store as file_path; it is collected unless referenced within FICHIER_GRACE.
+    """
+    return _response(await store(db, request))
+
+
+@router.put("/moi/photo", response_model=schemas.FichierResponse)
+async def upload_photo(request: Request, user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_db)):
+    """
+    Replace the caller's profile photo (raw image body) and release the previous one.
+    """
+    blob = _response(await store(db, request, allowed={t for t in FICHIER_TYPES if t.startswith("image/")}))
+    user = await db.get(models.Utilisateur, user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="Utilisateur introuvable")
+    url = blob.url
+    if user.image != url:
+        previous = user.image
+        await retain(db, url)
+        await release(db, previous)
+        user.image = url
+        try:
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.exception(f"[upload_photo] DB commit failed: {e}")
+            raise HTTPException(status_code=500, detail="Mise à jour de la photo impossible")
+        invalidate_user(user_id)
+    return blob
+
+
+# ---------------- Maintenance ----------------
+@router.post("/gc", response_model=schemas.FichierGcReport, dependencies=[Depends(admin_only)])
+async def run_collection():
+    return await collect()
+
+
+@router.post("/references/recalcul", dependencies=[Depends(admin_only)])
+async def rebuild_references(db: AsyncSession = Depends(get_db)):
+    referenced = await recount(db)
+    logger.info(f"[rebuild_references] {referenced} fichiers référencés")
+    return {"fichiers_references": referenced}
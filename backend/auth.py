@@ -1,29 +1,22 @@
-import os
 import logging
 import secrets
 import string
-from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from email.message import EmailMessage
-import aiosmtplib
-import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy import and_, select, update
 
 import models  # uses the uploaded / project models.py
 import schemas
 import database
 import auth_utils
-from dotenv import load_dotenv
-
-# ---------------- Environment ----------------
-load_dotenv()
-EMAIL_USER = os.getenv("EMAIL_USER")
-EMAIL_PASS = os.getenv("EMAIL_PASS")
-SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
-SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
-SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "True").lower() in ("1", "true", "yes")
+import hash_pool
+import mailer
+import throttle
+from database import get_db
+from replicas import get_read_db, on_replica
+from security import require_roles
 
 # ---------------- Router ----------------
 router = APIRouter(prefix="/auth", tags=["Authentication"])
@@ -32,83 +25,68 @@ router = APIRouter(prefix="/auth", tags=["Authentication"])
 logger = logging.getLogger("auth")
 logging.basicConfig(level=logging.INFO)
 
-# ---------------- Database Dependency ----------------
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 # ---------------- Utilities ----------------
 def generate_random_password(length: int = 12) -> str:
     chars = string.ascii_letters + string.digits + "!@#$%^&*()-_"
     return ''.join(secrets.choice(chars) for _ in range(length))
 
 
-# ---------------- Email Sending ----------------
-# This function is safe to run in BackgroundTasks. It is async and uses timeout + simple retry.
-async def send_email(to_email: str, subject: str, body: str, timeout: int = 10, retries: int = 1):
+def login_lookup_filter(cin_or_email: str):
     """
-    Send an email with a timeout and small retry logic.
-    If EMAIL_USER or EMAIL_PASS are not set, log and return (do not raise).
-    This prevents blocking user activation if mail fails.
+    Build the WHERE clause for a login identifier so it hits a single unique index:
+    email-shaped values use utilisateur.email, numeric values use utilisateur.cin.
+    Returns None when the identifier can match neither.
     """
-    if not EMAIL_USER or not EMAIL_PASS:
-        logger.warning("[send_email] EMAIL_USER or EMAIL_PASS not configured; skipping send.")
-        return
-
-    message = EmailMessage()
-    message["From"] = EMAIL_USER
-    message["To"] = to_email
-    message["Subject"] = subject
-    message.set_content(body)
-
-    attempt = 0
-    while attempt <= retries:
-        try:
-            # wrap send in asyncio.wait_for to guarantee a hard timeout
-            await asyncio.wait_for(
-                aiosmtplib.send(
-                    message,
-                    hostname=SMTP_HOST,
-                    port=SMTP_PORT,
-                    start_tls=SMTP_STARTTLS,
-                    username=EMAIL_USER,
-                    password=EMAIL_PASS,
-                ),
-                timeout=timeout
-            )
-            logger.info(f"[send_email] Email sent to {to_email}")
-            return
-        except asyncio.TimeoutError:
-            logger.error(f"[send_email] Timeout when sending email to {to_email} (attempt {attempt + 1})")
-        except aiosmtplib.errors.SMTPAuthenticationError:
-            logger.error(f"[send_email] SMTP authentication failed for {EMAIL_USER}")
-            # Authentication errors won't succeed on retry; break.
-            break
-        except Exception as e:
-            logger.exception(f"[send_email] Unexpected error sending to {to_email}: {e}")
+    identifier = cin_or_email.strip()
+    if "@" in identifier:
+        return models.Utilisateur.email == identifier
+    if identifier.isdigit():
+        return models.Utilisateur.cin == int(identifier)
+    return None
+
 
-        attempt += 1
+# ---------------- Email Templates ----------------
+ACTIVATION_SUBJECT = "Activation de votre compte"
+
+
+def activation_email_body(user: models.Utilisateur, plain_password: str) -> str:
+    return f"""Bonjour {user.nom},
+
+Votre compte a été activé avec succès.
+
+Voici vos informations de connexion :
+CIN : {user.cin}
+Email : {user.email}
+Mot de passe : {plain_password}
 
-    logger.warning(f"[send_email] Giving up sending email to {to_email} after {attempt} attempts.")
+Veuillez conserver ce mot de passe en lieu sûr.
+Cordialement,
+L’équipe d’administration.
+"""
 
 
 # ---------------- Signup Endpoint ----------------
 @router.post("/signup")
-async def signup(req: schemas.SignupRequest, background: BackgroundTasks, db: Session = Depends(get_db)):
+async def signup(req: schemas.SignupRequest, db: AsyncSession = Depends(get_db)):
     """
     Activates a pre-created Utilisateur: sets a random password and creates related role rows if missing.
-    Email is sent in the background; if email fails, activation still succeeds.
+    The credentials email is written to the outbox in the same transaction and sent by the dispatcher.
     """
-    user = db.query(models.Utilisateur).filter(
-        and_(
-            models.Utilisateur.cin == req.cin,
-            models.Utilisateur.email == req.email
+    result = await db.execute(
+        select(models.Utilisateur)
+        .options(
+            selectinload(models.Utilisateur.etudiant),
+            selectinload(models.Utilisateur.enseignant),
+            selectinload(models.Utilisateur.administratif),
+        )
+        .filter(
+            and_(
+                models.Utilisateur.cin == req.cin,
+                models.Utilisateur.email == req.email
+            )
         )
-    ).first()
+    )
+    user = result.scalars().first()
 
     if not user:
         raise HTTPException(status_code=404, detail="Utilisateur introuvable")
@@ -118,7 +96,7 @@ async def signup(req: schemas.SignupRequest, background: BackgroundTasks, db: Se
 
     # Generate and hash password
     plain_password = generate_random_password(12)
-    hashed_password = auth_utils.hash_password(plain_password)
+    hashed_password = await hash_pool.hash_password(plain_password)
     user.mdp_hash = hashed_password
 
     # Create role entries if missing
@@ -130,64 +108,77 @@ async def signup(req: schemas.SignupRequest, background: BackgroundTasks, db: Se
     if user.role == "administratif" and not user.administratif:
         db.add(models.Administratif(id=user.id, poste=None))
 
+    # Queue the credentials email with the activation so neither can be lost without the other
+    await mailer.enqueue_email(db, user.email, ACTIVATION_SUBJECT, activation_email_body(user, plain_password))
+
     # Commit all changes
     try:
-        db.commit()
-        db.refresh(user)
+        await db.commit()
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.exception(f"[signup] DB commit failed: {e}")
         raise HTTPException(status_code=500, detail="Database error during signup")
 
-    # Prepare email body (plain text)
-    email_body = f"""Bonjour {user.nom},
-
-Votre compte a été activé avec succès.
-
-Voici vos informations de connexion :
-CIN : {user.cin}
-Email : {user.email}
-Mot de passe : {plain_password}
-
-Veuillez conserver ce mot de passe en lieu sûr.
-Cordialement,
-L’équipe d’administration.
-"""
-
-    # schedule email in the background to avoid blocking
-    background.add_task(send_email, user.email, "Activation de votre compte", email_body)
+    mailer.dispatcher.notify()
 
     return {"message": "Compte activé. Un email de confirmation sera envoyé."}
 
 
 # ---------------- Signin Endpoint ----------------
 @router.post("/signin")
-def signin(req: schemas.SigninRequest, db: Session = Depends(get_db)):
+async def signin(req: schemas.SigninRequest, request: Request, db: AsyncSession = Depends(get_read_db)):
     """
     Authenticate a user by CIN or email and password.
+    - Throttled per client IP and per identifier before any query or hashing (429).
     - Supports rehashing legacy SHA-256 (len == 64) to new hashing scheme.
+    - Looks the user up on a read replica when configured; writes go to the primary.
     - Returns JWT token with roles.
     """
+    throttle.login.check(throttle.client_ip(request), req.cin_or_email)
+
+    def invalid_credentials() -> HTTPException:
+        throttle.login.failed(req.cin_or_email)
+        return HTTPException(status_code=401, detail="Identifiants invalides")
+
     try:
-        user = db.query(models.Utilisateur).filter(
-            (models.Utilisateur.cin == req.cin_or_email) |
-            (models.Utilisateur.email == req.cin_or_email)
-        ).first()
+        login_filter = login_lookup_filter(req.cin_or_email)
+        if login_filter is None:
+            raise invalid_credentials()
+
+        # One round trip: the user row plus every role row the token needs
+        lookup = (
+            select(models.Utilisateur)
+            .options(
+                joinedload(models.Utilisateur.etudiant),
+                joinedload(models.Utilisateur.enseignant).joinedload(models.Enseignant.chef),
+                joinedload(models.Utilisateur.administratif),
+            )
+            .filter(login_filter)
+        )
+        user = (await db.execute(lookup)).scalars().first()
+        if user is not None and not user.mdp_hash and on_replica(db):
+            # activated moments ago, possibly from another client: the replica may lag behind
+            async with database.AsyncSessionLocal() as primary:
+                user = (await primary.execute(lookup)).scalars().first()
 
         if not user or not user.mdp_hash:
-            raise HTTPException(status_code=401, detail="Identifiants invalides")
+            raise invalid_credentials()
 
-        if not auth_utils.verify_password(req.password, user.mdp_hash):
-            raise HTTPException(status_code=401, detail="Identifiants invalides")
+        if not await hash_pool.verify_password(req.password, user.mdp_hash):
+            raise invalid_credentials()
+
+        throttle.login.succeeded(req.cin_or_email)
 
         # Rehash legacy SHA passwords (keep your existing heuristic)
         if len(user.mdp_hash) == 64:
             try:
-                user.mdp_hash = auth_utils.hash_password(req.password)
-                db.commit()
-                db.refresh(user)
+                new_hash = await hash_pool.hash_password(req.password)
+                async with database.AsyncSessionLocal() as primary:
+                    await primary.execute(
+                        update(models.Utilisateur).where(models.Utilisateur.id == user.id).values(mdp_hash=new_hash)
+                    )
+                    await primary.commit()
             except Exception:
-                db.rollback()
                 logger.exception("[signin] failed to rehash legacy password; continuing")
 
         # Determine roles
@@ -203,7 +194,7 @@ def signin(req: schemas.SigninRequest, db: Session = Depends(get_db)):
             roles.append("administratif")
 
         # Create access token
-        token = auth_utils.create_access_token({"sub": user.email, "roles": roles})
+        token = auth_utils.create_access_token({"sub": user.email, "uid": user.id, "roles": roles})
 
         return {
             "access_token": token,
@@ -221,4 +212,22 @@ def signin(req: schemas.SigninRequest, db: Session = Depends(get_db)):
         raise
     except Exception as e:
         logger.exception(f"[signin] Unexpected error: {e}")
-        raise HTTPException(status_code=500, detail="Internal Server Error")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+# ---------------- Hash Pool Stats ----------------
+@router.get("/hash-pool/stats", dependencies=[Depends(require_roles("administratif"))])
+def hash_pool_stats():
+    """
+    Utilisation, queue depth and wait-time statistics of the bcrypt worker pool.
+    """
+    return hash_pool.pool.stats()
+
+
+# ---------------- Throttle Stats ----------------
+@router.get("/throttle/stats", dependencies=[Depends(require_roles("administratif"))])
+def throttle_stats():
+    """
+    Tracked keys, rejections by reason and lockouts of the signin throttle.
+    """
+    return throttle.login.stats()
@@ -1,23 +1,38 @@
 import os
+import hmac
+import time
+import base64
 import hashlib
 import logging
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 import jwt
-from passlib.context import CryptContext
 
 # ---------------- Configuration ----------------
 MAX_BCRYPT_LENGTH = 72
 SECRET_KEY = os.getenv("SECRET_KEY", "default_secret_key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+# Event stream tickets only need to outlive the EventSource connection attempt (seconds)
+STREAM_TICKET_TTL = int(os.getenv("STREAM_TICKET_TTL", 60))
 
 # ---------------- Logging ----------------
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 # ---------------- Password Context ----------------
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+_pwd_context = None
+
+
+def pwd_context():
+    """
+    passlib context, built on first use: only hash pool workers ever hash or verify.
+    """
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
 
 
 # ---------------- Password Utilities ----------------
@@ -26,7 +41,7 @@ def hash_password(password: str) -> str:
     Hash a password safely using bcrypt, truncated to 72 chars.
     """
     truncated = password[:MAX_BCRYPT_LENGTH]
-    return pwd_context.hash(truncated)
+    return pwd_context().hash(truncated)
 
 
 def verify_password(plain: str, hashed: str) -> bool:
@@ -39,7 +54,7 @@ def verify_password(plain: str, hashed: str) -> bool:
     truncated = plain[:MAX_BCRYPT_LENGTH]
 
     try:
-        return pwd_context.verify(truncated, hashed)
+        return pwd_context().verify(truncated, hashed)
     except ValueError:
         # Fallback for legacy SHA-256 hashes
         legacy_sha = hashlib.sha256(plain.encode()).hexdigest()
@@ -72,3 +87,54 @@ def decode_access_token(token: str) -> Optional[dict]:
     except jwt.InvalidTokenError:
         logger.warning("Invalid JWT token")
         return None
+
+
+# ---------------- Calendar Feed Tokens ----------------
+def _feed_signature(user_id: int, secret: str) -> str:
+    digest = hmac.new(SECRET_KEY.encode(), f"ics:{user_id}:{secret}".encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def create_feed_token(user_id: int, secret: str) -> str:
+    """
+    Calendar feed token "<user id>.<HMAC of the id and the user's feed secret>". It carries no
+    expiry and is no JWT: only the iCalendar routes accept it, and replacing the secret revokes it.
+    """
+    return f"{user_id}.{_feed_signature(user_id, secret)}"
+
+
+def feed_token_user_id(token: str) -> Optional[int]:
+    user_id, sep, _ = token.partition(".")
+    return int(user_id) if sep and user_id.isdigit() else None
+
+
+def verify_feed_token(token: str, user_id: int, secret: str) -> bool:
+    return hmac.compare_digest(token.encode(), create_feed_token(user_id, secret).encode())
+
+
+# ---------------- Event Stream Tickets ----------------
+def _ticket_signature(user_id: int, expires: int) -> str:
+    digest = hmac.new(SECRET_KEY.encode(), f"sse:{user_id}:{expires}".encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def create_stream_ticket(user_id: int) -> Tuple[str, int]:
+    """
+    Ticket "<user id>.<expiry>.<HMAC of both>" opening the event stream for STREAM_TICKET_TTL
+    seconds, and its expiry (epoch seconds). Only GET /events/stream accepts it.
+    """
+    expires = int(time.time()) + STREAM_TICKET_TTL
+    return f"{user_id}.{expires}.{_ticket_signature(user_id, expires)}", expires
+
+
+def verify_stream_ticket(ticket: str) -> Optional[int]:
+    """
+    The user id of a valid, unexpired ticket, else None.
+    """
+    user_id, _, rest = ticket.partition(".")
+    expires, _, signature = rest.partition(".")
+    if not (user_id.isdigit() and expires.isdigit() and signature) or int(expires) < time.time():
+        return None
+    if not hmac.compare_digest(signature.encode(), _ticket_signature(int(user_id), int(expires)).encode()):
+        return None
+    return int(user_id)
@@ -0,0 +1,87 @@
+"""
+Helpers shared by the benchmark scripts: paths, migrations, percentiles and report files.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+from typing import List, Optional, Sequence
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# Benchmarks never read a developer's .env, and sign tokens with the key the server gets
+os.environ["ENV_FILE"] = os.devnull
+os.environ.setdefault("SECRET_KEY", "benchmark-only-secret-key-0123456789abcdef")
+
+
+def bench_env(database_url: str, **overrides) -> dict:
+    """
+    Environment for a child process: the given database and no outgoing mail.
+    """
+    env = dict(os.environ, DATABASE_URL=database_url, EMAIL_USER="")
+    env.update({key: str(value) for key, value in overrides.items()})
+    return env
+
+
+def migrate(database_url: str) -> dict:
+    """
+    Bring the database to head with Alembic, exactly as a deployment would.
+    """
+    env = bench_env(database_url)
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"],
+        cwd=BACKEND_DIR, env=env, check=True, capture_output=True,
+    )
+    return env
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted sequence.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), round(q / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[rank - 1]
+
+
+def latency_summary(seconds: List[float]) -> dict:
+    values = sorted(seconds)
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def report_header(kind: str, **settings) -> dict:
+    return {
+        "benchmark": kind,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()} ({os.cpu_count()} cpu)",
+        "settings": settings,
+    }
+
+
+def write_report(report: dict, path: Optional[str]):
+    if path:
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"report written to {path}")
@@ -0,0 +1,303 @@
+"""
+Load benchmark: starts the API under uvicorn against a seeded database and drives the hot
+endpoints with concurrent async clients, reporting throughput and p50/p95/p99 per scenario,
+plus the SQL statements per request read back from /metrics.
+
+    python benchmarks/load.py --output load.json
+    python benchmarks/load.py --database-url sqlite:////tmp/bench.db --concurrency 64 --compare load.json
+    python benchmarks/load.py --database-url sqlite:////tmp/bench.db --replicas 2
+
+Without --database-url a temporary SQLite database is seeded first (see seed.py). --replicas
+copies a SQLite database into stand-in read replicas (DATABASE_REPLICA_URLS). The signup
+scenario activates accounts, so a reused database runs out of them: reseed it.
+"""
+import os
+import sys
+import json
+import time
+import random
+import secrets
+import socket
+import asyncio
+import logging
+import argparse
+import shutil
+import tempfile
+import subprocess
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from common import BACKEND_DIR, bench_env, latency_summary, report_header, write_report
+import seed as seeding
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+Request = Tuple[str, str, Optional[dict], Optional[dict]]  # method, path, json body, headers
+
+# the server only exposes /metrics to holders of its token
+METRICS_TOKEN = secrets.token_urlsafe(24)
+
+
+# ---------------- Server ----------------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(env: dict, port: int, workers: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+
+
+async def wait_ready(base_url: str, server: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError(f"server exited: {server.stderr.read().decode()[-2000:]}")
+            try:
+                if (await client.get("/")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+# ---------------- Scenarios ----------------
+def scenarios(manifest: dict, tokens: Dict[str, str], rng: random.Random) -> Dict[str, Tuple[Callable[[int], Request], Optional[int]]]:
+    """
+    name -> (request factory, request cap). The cap bounds one-shot scenarios such as signup,
+    where each account can only be activated once.
+    """
+    students = manifest["students"]
+    inactive = list(manifest["inactive"])
+    rng.shuffle(inactive)
+    admin = {"Authorization": f"Bearer {tokens['admin']}"}
+
+    def student_headers(i: int) -> dict:
+        return {"Authorization": f"Bearer {tokens['students'][i % len(tokens['students'])][1]}"}
+
+    return {
+        "signin": (lambda i: ("POST", "/auth/signin", {
+            "cin_or_email": students[rng.randrange(len(students))]["email"], "password": manifest["password"],
+        }, None), None),
+        "signup": (lambda i: ("POST", "/auth/signup", inactive[i], None), len(inactive)),
+        "hierarchy": (lambda i: ("GET", "/hierarchie", None, admin), None),
+        "free_rooms": (lambda i: ("GET", f"/search/free-rooms?day_of_week={1 + i % 6}&heure_debut=10:15&heure_fin=11:45", None, admin), None),
+        "free_slots": (lambda i: ("GET", f"/search/free-slots?id_groupe={rng.choice(manifest['groupes'])}&duree=90", None, admin), None),
+        "attendance_students": (lambda i: ("GET", "/analytics/attendance/etudiants?limit=500", None, admin), None),
+        "attendance_detail": (lambda i: ("GET", f"/analytics/attendance/etudiants/{students[rng.randrange(len(students))]['id']}", None, admin), None),
+        "at_risk": (lambda i: ("GET", "/analytics/attendance/at-risk", None, admin), None),
+        "inbox": (lambda i: ("GET", "/messages/recus?limit=30", None, student_headers(i)), None),
+        "unread": (lambda i: ("GET", "/messages/non-lus", None, student_headers(i)), None),
+        "export_absences": (lambda i: ("GET", "/admin/exports/absences?format=csv", None, admin), None),
+    }
+
+
+async def run_scenario(base_url: str, factory: Callable[[int], Request], requests: int, concurrency: int, warmup: int) -> dict:
+    """
+    `concurrency` clients share one connection pool and pull request numbers from a common
+    counter until `requests` are done; the first `warmup` responses are not measured.
+    """
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    counter = iter(range(requests + warmup))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        async def worker():
+            for i in counter:
+                method, path, body, headers = factory(i)
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, json=body, headers=headers)
+                    await response.aread()
+                    status = response.status_code
+                except httpx.TransportError:
+                    status = 0
+                elapsed = time.perf_counter() - started
+                if i >= warmup:
+                    latencies.append(elapsed)
+                    statuses[status] = statuses.get(status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+
+    ok = sum(n for status, n in statuses.items() if 200 <= status < 300)
+    return {
+        **latency_summary(latencies),
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else 0.0,
+        "errors": len(latencies) - ok,
+        "statuses": {str(status): n for status, n in sorted(statuses.items())},
+    }
+
+
+async def sql_per_route(base_url: str) -> Dict[str, dict]:
+    """
+    Average statements and SQL time per request by route, from the server's own histograms.
+    """
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        response = await client.get("/metrics", headers={"Authorization": f"Bearer {METRICS_TOKEN}"})
+    if response.status_code != 200:
+        return {}
+    sums: Dict[Tuple[str, str], float] = {}
+    for line in response.text.splitlines():
+        for metric in ("http_request_db_statements", "http_request_db_duration_seconds"):
+            for suffix in ("_sum", "_count"):
+                prefix = metric + suffix + "{"
+                if line.startswith(prefix):
+                    labels, value = line[len(prefix):].rsplit("} ", 1)
+                    route = dict(part.split("=", 1) for part in labels.split('",')).get("route", "").strip('"')
+                    sums[(metric + suffix, route)] = float(value)
+    routes = {}
+    for (name, route), count in sums.items():
+        if name != "http_request_db_statements_count" or not count:
+            continue
+        routes[route] = {
+            "statements": round(sums.get(("http_request_db_statements_sum", route), 0) / count, 2),
+            "sql_ms": round(sums.get(("http_request_db_duration_seconds_sum", route), 0) / count * 1000, 3),
+        }
+    return routes
+
+
+def compare(report: dict, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\ncompared with {baseline_path} ({baseline.get('revision')}):")
+    for name, result in report["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        rps = (result["throughput_rps"] / before["throughput_rps"] - 1) * 100 if before["throughput_rps"] else 0
+        p95 = (result["p95_ms"] / before["p95_ms"] - 1) * 100 if before["p95_ms"] else 0
+        print(f"  {name:<22} throughput {rps:+6.1f}%   p95 {p95:+6.1f}%")
+
+
+# ---------------- Main ----------------
+def issue_tokens(manifest: dict) -> Dict[str, object]:
+    """
+    JWTs signed with the server's SECRET_KEY, so read scenarios do not depend on signin.
+    """
+    import auth_utils
+    admin = auth_utils.create_access_token({"sub": manifest["admin"]["email"], "uid": manifest["admin"]["id"], "roles": ["administratif"]})
+    students = [
+        (s["id"], auth_utils.create_access_token({"sub": s["email"], "uid": s["id"], "roles": ["etudiant"]}))
+        for s in manifest["students"][:2000]
+    ]
+    return {"admin": admin, "students": students}
+
+
+def sqlite_replicas(database_url: str, count: int, directory: str) -> List[str]:
+    """
+    Copies of a SQLite database file standing in for read replicas (frozen at copy time).
+    """
+    if not database_url.startswith("sqlite:///"):
+        raise SystemExit("--replicas needs a SQLite --database-url; point DATABASE_REPLICA_URLS at real replicas instead")
+    urls = []
+    for i in range(1, count + 1):
+        path = os.path.join(directory, f"replica-{i}.db")
+        shutil.copyfile(database_url[len("sqlite:///"):], path)
+        urls.append(f"sqlite:///{path}")
+    return urls
+
+
+async def run(args, database_url: str, manifest: dict, replica_urls: List[str]) -> dict:
+    port = free_port()
+    env = bench_env(
+        database_url,
+        HASH_POOL_WORKERS=args.hash_workers,
+        # the benchmark is one client address hammering a few thousand accounts
+        LOGIN_IP_BURST=10 ** 9, LOGIN_IP_PER_MINUTE=10 ** 9, LOGIN_ID_BURST=10 ** 6, LOGIN_ID_PER_MINUTE=10 ** 6,
+        METRICS_ENABLED="true", METRICS_TOKEN=METRICS_TOKEN, WARMUP="true", DATABASE_REPLICA_URLS=",".join(replica_urls),
+    )
+    tokens = issue_tokens(manifest)
+    rng = random.Random(args.seed)
+    available = scenarios(manifest, tokens, rng)
+    selected = args.scenarios.split(",") if args.scenarios else list(available)
+
+    report = report_header(
+        "load", database=database_url.split("://")[0], concurrency=args.concurrency, requests=args.requests,
+        workers=args.workers, hash_workers=args.hash_workers, replicas=args.replicas, rows=manifest.get("counts"),
+    )
+    report["scenarios"] = {}
+    server = start_server(env, port, args.workers)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        await wait_ready(base_url, server)
+        for name in selected:
+            factory, cap = available[name]
+            requests = args.requests_per.get(name, args.requests)
+            warmup = min(args.warmup, requests)
+            if cap is not None:
+                requests = min(requests, cap - warmup)
+            concurrency = args.concurrency_per.get(name, args.concurrency)
+            result = await run_scenario(base_url, factory, requests, concurrency, warmup)
+            result["concurrency"] = concurrency
+            report["scenarios"][name] = result
+            print(
+                f"{name:<22} {result['throughput_rps']:>8.1f} req/s   p50 {result['p50_ms']:>8.2f}   "
+                f"p95 {result['p95_ms']:>8.2f}   p99 {result['p99_ms']:>8.2f} ms   errors {result['errors']}"
+            )
+        if args.workers == 1:
+            # with several workers each scrape only sees one of them
+            report["sql_per_request"] = await sql_per_route(base_url)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return report
+
+
+def overrides(spec: str) -> Dict[str, int]:
+    return {name: int(n) for name, n in (item.split("=") for item in spec.split(",") if item)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url", help="an already seeded database (default: seed a temporary SQLite file)")
+    parser.add_argument("--manifest", help="manifest written by seed.py (default: next to the SQLite file)")
+    parser.add_argument("--scale", type=float, default=1.0, help="size of the temporary database")
+    parser.add_argument("--scenarios", help="comma-separated subset (signin, signup, hierarchy, free_rooms, ...)")
+    parser.add_argument("--requests", type=int, default=500, help="measured requests per scenario")
+    parser.add_argument("--requests-per", default="signin=200,signup=200,export_absences=20",
+                        help="per-scenario overrides, e.g. signin=200,export_absences=20")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests before each scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    # bcrypt scenarios beyond the hash pool's queue only measure its 503 shedding
+    parser.add_argument("--concurrency-per", default="signin=8,signup=8", help="per-scenario overrides")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--hash-workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--replicas", type=int, default=0, help="SQLite copies to serve reads from")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--compare", metavar="REPORT", help="print the change against an earlier JSON report")
+    args = parser.parse_args()
+    args.requests_per = overrides(args.requests_per)
+    args.concurrency_per = overrides(args.concurrency_per)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url
+        if database_url is None:
+            database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            print("seeding a temporary database...")
+            manifest = seeding.seed(database_url, args.scale, args.seed)
+        else:
+            with open(args.manifest or seeding.default_manifest_path(database_url)) as f:
+                manifest = json.load(f)
+        replica_urls = sqlite_replicas(database_url, args.replicas, tmp) if args.replicas else []
+        report = asyncio.run(run(args, database_url, manifest, replica_urls))
+
+    write_report(report, args.output)
+    if args.compare:
+        compare(report, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Micro-benchmarks of the per-request primitives: bcrypt hashing and verification (inline and
+through the hash pool), JWT encode/decode, and token resolution with a cold and a warm cache.
+
+    python benchmarks/micro.py --output micro.json
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+from typing import Callable, List
+
+from common import latency_summary, report_header, write_report
+
+# nothing here touches the database; only the engines built at import need a URL
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import auth_utils
+import hash_pool
+import security
+
+
+def measure(func: Callable[[], object], iterations: int, warmup: int = 3) -> dict:
+    for _ in range(warmup):
+        func()
+    samples: List[float] = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    result = latency_summary(samples)
+    result["ops_per_s"] = round(len(samples) / sum(samples), 1) if sum(samples) else 0.0
+    return result
+
+
+async def pool_throughput(jobs: int) -> dict:
+    """
+    bcrypt hashes pushed through the process pool at full concurrency: what signup and signin
+    can sustain per API worker.
+    """
+    await hash_pool.pool.warm_up()
+    started = time.perf_counter()
+    await hash_pool.hash_passwords([f"password-{i}" for i in range(jobs)])
+    elapsed = time.perf_counter() - started
+    stats = hash_pool.pool.stats()
+    hash_pool.pool.shutdown()
+    return {"jobs": jobs, "workers": stats["workers"], "seconds": round(elapsed, 3), "ops_per_s": round(jobs / elapsed, 1)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--bcrypt-iterations", type=int, default=20)
+    parser.add_argument("--jwt-iterations", type=int, default=20000)
+    parser.add_argument("--pool-jobs", type=int, default=64)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    hashed = auth_utils.hash_password("bench-password")
+    claims = {"sub": "bench@univ-bench.tn", "uid": 1, "roles": ["etudiant"]}
+    token = auth_utils.create_access_token(claims)
+    tokens = iter([auth_utils.create_access_token(dict(claims, uid=i)) for i in range(args.jwt_iterations + 10)])
+
+    def resolve_cold():
+        # a token never seen before: signature check plus cache insert
+        security.principal_from_token(next(tokens))
+
+    results = {
+        "bcrypt_hash": measure(lambda: auth_utils.hash_password("bench-password"), args.bcrypt_iterations),
+        "bcrypt_verify": measure(lambda: auth_utils.verify_password("bench-password", hashed), args.bcrypt_iterations),
+        "jwt_encode": measure(lambda: auth_utils.create_access_token(claims), args.jwt_iterations),
+        "jwt_decode": measure(lambda: auth_utils.decode_access_token(token), args.jwt_iterations),
+        "token_resolve_cold": measure(resolve_cold, args.jwt_iterations),
+        "token_resolve_cached": measure(lambda: security.principal_from_token(token), args.jwt_iterations),
+    }
+    results["hash_pool"] = asyncio.run(pool_throughput(args.pool_jobs))
+
+    for name, result in results.items():
+        if "p50_ms" in result:
+            print(f"{name:<22} {result['ops_per_s']:>12.1f} ops/s   p50 {result['p50_ms'] * 1000:>10.1f} us   p99 {result['p99_ms'] * 1000:>10.1f} us")
+        else:
+            print(f"{name:<22} {result['ops_per_s']:>12.1f} ops/s   ({result['jobs']} jobs on {result['workers']} workers)")
+
+    report = report_header("micro", **{k: v for k, v in vars(args).items() if k != "output"})
+    report["results"] = results
+    write_report(report, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
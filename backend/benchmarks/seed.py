@@ -0,0 +1,238 @@
+"""
+Seed a benchmark database with a realistic university: departements down to groupes, a
+clash-free weekly timetable, make-up seances, tens of thousands of students, absences over
+the last weeks and some messages. Deterministic for a given --seed and --scale.
+
+    python benchmarks/seed.py --database-url sqlite:////tmp/bench.db --scale 1
+
+Writes <database>.manifest.json next to a SQLite file (or --manifest) with the ids the
+load benchmark needs: active students, not-yet-activated accounts, teachers, groupes.
+"""
+import os
+import sys
+import json
+import random
+import argparse
+from datetime import date, datetime, time as dtime, timedelta
+
+from common import BACKEND_DIR, migrate  # also puts the backend on sys.path
+
+PASSWORD = "bench-password"
+SLOTS = [dtime(8, 30), dtime(10, 15), dtime(12, 0), dtime(14, 0), dtime(15, 45)]
+DAYS = [1, 2, 3, 4, 5, 6]  # Monday..Saturday (0 = Sunday, as in conflicts.weekday)
+ABSENCE_RATE = 0.025
+LATE_SHARE = 0.25
+INACTIVE_SHARE = 0.1
+CHUNK = 5000
+
+NOMS = ["Ben Ali", "Trabelsi", "Gharbi", "Jebali", "Mansour", "Haddad", "Bouazizi", "Chaabane", "Sassi", "Karray"]
+PRENOMS = ["Amine", "Yasmine", "Mohamed", "Eya", "Youssef", "Nour", "Ahmed", "Salma", "Omar", "Rania"]
+
+
+def layout(scale: float) -> dict:
+    return {
+        "departements": max(1, round(8 * scale)),
+        "specialites_per_departement": 4,
+        "niveaux_per_specialite": 3,
+        "groupes_per_niveau": 5,
+        "students_per_groupe": 40,
+        "matieres_per_niveau": 8,
+        "weekly_seances_per_groupe": 16,
+        "makeup_seances_per_groupe": 16,
+        "salles": max(10, round(320 * scale)),
+        "enseignants": max(10, round(1100 * scale)),
+        "administratifs": 20,
+        "messages": round(40000 * scale),
+        "absence_weeks": 12,
+    }
+
+
+def generate(scale: float, seed: int, password_hash: str) -> tuple:
+    """
+    Build every row in memory as plain dicts, table by table, in insertion order.
+    """
+    rng = random.Random(seed)
+    shape = layout(scale)
+    rows = {name: [] for name in (
+        "utilisateur", "administratif", "enseignant", "departement", "specialite", "niveau", "groupe",
+        "matiere", "salle", "etudiant", "seance", "absence", "message",
+    )}
+    manifest = {"password": PASSWORD, "students": [], "inactive": [], "enseignants": [], "groupes": [], "matieres": []}
+    next_user = iter(range(1, 10 ** 9))
+
+    def user(role: str, active: bool = True) -> dict:
+        uid = next(next_user)
+        row = {
+            "id": uid, "nom": rng.choice(NOMS), "prenom": rng.choice(PRENOMS),
+            "email": f"{role[:3]}{uid}@univ-bench.tn", "cin": 10_000_000 + uid, "telp": f"2{uid:07d}"[-8:],
+            "image": None, "mdp_hash": password_hash if active else None, "role": role,
+        }
+        rows["utilisateur"].append(row)
+        return row
+
+    admin = user("administratif")
+    manifest["admin"] = {"id": admin["id"], "email": admin["email"]}
+    rows["administratif"].append({"id": admin["id"], "poste": "scolarite"})
+    for _ in range(shape["administratifs"] - 1):
+        rows["administratif"].append({"id": user("administratif")["id"], "poste": "scolarite"})
+
+    teachers = [user("enseignant")["id"] for _ in range(shape["enseignants"])]
+    rows["enseignant"] = [{"id": t} for t in teachers]
+    manifest["enseignants"] = teachers
+
+    salles = []
+    for i in range(1, shape["salles"] + 1):
+        kind = "tp" if i % 5 == 0 else ("amphi" if i % 17 == 0 else "cours")
+        salles.append(i)
+        rows["salle"].append({"id": i, "numero": f"{'ABCD'[i % 4]}{i:03d}", "type": kind, "capacite": 120 if kind == "amphi" else 40})
+
+    ids = {"specialite": 0, "niveau": 0, "groupe": 0, "matiere": 0}
+    groupes = []  # (groupe id, matiere ids)
+    for d in range(1, shape["departements"] + 1):
+        rows["departement"].append({"id": d, "nom": f"Departement {d}", "id_chef": None})
+        for _ in range(shape["specialites_per_departement"]):
+            ids["specialite"] += 1
+            rows["specialite"].append({"id": ids["specialite"], "nom": f"Specialite {ids['specialite']}", "id_departement": d})
+            for level in range(1, shape["niveaux_per_specialite"] + 1):
+                ids["niveau"] += 1
+                rows["niveau"].append({"id": ids["niveau"], "nom": f"L{level}", "id_specialite": ids["specialite"]})
+                matieres = []
+                for _ in range(shape["matieres_per_niveau"]):
+                    ids["matiere"] += 1
+                    matieres.append(ids["matiere"])
+                    rows["matiere"].append({"id": ids["matiere"], "nom": f"Matiere {ids['matiere']}", "id_niveau": ids["niveau"]})
+                for g in range(shape["groupes_per_niveau"]):
+                    ids["groupe"] += 1
+                    groupes.append((ids["groupe"], matieres))
+                    rows["groupe"].append({"id": ids["groupe"], "nom": f"G{g + 1}", "id_niveau": ids["niveau"]})
+                    for _ in range(shape["students_per_groupe"]):
+                        active = rng.random() >= INACTIVE_SHARE
+                        student = user("etudiant", active)
+                        if active:
+                            rows["etudiant"].append({"id": student["id"], "id_groupe": ids["groupe"], "id_specialite": ids["specialite"]})
+                            manifest["students"].append({"id": student["id"], "email": student["email"], "id_groupe": ids["groupe"]})
+                        else:
+                            manifest["inactive"].append({"cin": str(student["cin"]), "email": student["email"]})
+    manifest["groupes"] = [g for g, _ in groupes]
+    manifest["matieres"] = ids["matiere"]
+
+    # Weekly timetable without room or teacher clashes: greedy over (day, slot) cells
+    busy_teacher, busy_room = set(), set()
+    cells = [(day, slot) for day in DAYS for slot in range(len(SLOTS))]
+    members = {}
+    for s in rows["etudiant"]:
+        members.setdefault(s["id_groupe"], []).append(s["id"])
+    weekly = []
+    seance_id = 0
+
+    def place(groupe_id: int, matiere_id: int, cell, specific_date=None) -> bool:
+        nonlocal seance_id
+        key = cell if specific_date is None else (specific_date, cell[1])
+        teacher = next((t for t in rng.sample(teachers, 40) if (t, key) not in busy_teacher), None)
+        room = next((r for r in rng.sample(salles, 40) if (r, key) not in busy_room), None)
+        if teacher is None or room is None:
+            return False
+        busy_teacher.add((teacher, key))
+        busy_room.add((room, key))
+        seance_id += 1
+        start = SLOTS[cell[1]]
+        rows["seance"].append({
+            "id": seance_id, "day_of_week": None if specific_date else cell[0], "specific_date": specific_date,
+            "heure_debut": start, "heure_fin": (datetime.combine(date.today(), start) + timedelta(minutes=90)).time(),
+            "id_salle": room, "id_matiere": matiere_id, "id_groupe": groupe_id, "id_enseignant": teacher,
+            "created_by": admin["id"], "is_presente": False,
+        })
+        return True
+
+    for groupe_id, matieres in groupes:
+        for cell in rng.sample(cells, shape["weekly_seances_per_groupe"]):
+            if place(groupe_id, rng.choice(matieres), cell):
+                weekly.append((seance_id, groupe_id, cell[0]))
+
+    today = date.today()
+    first_day = today - timedelta(weeks=shape["absence_weeks"])
+    for groupe_id, matieres in groupes:
+        for _ in range(shape["makeup_seances_per_groupe"]):
+            day = first_day + timedelta(days=rng.randrange((today - first_day).days + 28))
+            place(groupe_id, rng.choice(matieres), (None, rng.randrange(len(SLOTS))), specific_date=day)
+
+    # Absences: every past occurrence of every weekly seance, a small share of its students
+    absence_id = 0
+    for sid, groupe_id, dow in weekly:
+        offset = (dow - (first_day.isoweekday() % 7)) % 7
+        day = first_day + timedelta(days=offset)
+        students = members.get(groupe_id, ())
+        while day < today:
+            for student_id in students:
+                if rng.random() < ABSENCE_RATE:
+                    absence_id += 1
+                    rows["absence"].append({
+                        "id": absence_id, "id_etudiant": student_id, "id_seance": sid, "date": day,
+                        "statut": "retard" if rng.random() < LATE_SHARE else "absent",
+                    })
+            day += timedelta(days=7)
+
+    all_users = [u["id"] for u in rows["utilisateur"] if u["mdp_hash"]]
+    for i in range(1, shape["messages"] + 1):
+        sender, recipient = rng.sample(all_users, 2)
+        rows["message"].append({
+            "id": i, "id_expediteur": sender, "id_destinataire": recipient, "contenu": f"Message {i}",
+            "date": today - timedelta(days=rng.randrange(120)), "lu": rng.random() < 0.7,
+        })
+    return rows, manifest
+
+
+def seed(database_url: str, scale: float = 1.0, seed_value: int = 42) -> dict:
+    """
+    Migrate, then bulk-insert everything with executemany in chunks. Returns the manifest.
+    """
+    migrate(database_url)
+    os.environ["DATABASE_URL"] = database_url
+    import auth_utils
+    import models
+    from sqlalchemy import create_engine, func, insert, select
+
+    password_hash = auth_utils.hash_password(PASSWORD)
+    rows, manifest = generate(scale, seed_value, password_hash)
+    engine = create_engine(database_url)
+    tables = models.Base.metadata.tables
+    with engine.begin() as conn:
+        for name, values in rows.items():
+            for start in range(0, len(values), CHUNK):
+                conn.execute(insert(tables[name]), values[start:start + CHUNK])
+        unread = conn.execute(
+            select(models.Message.id_destinataire, func.count())
+            .where(models.Message.lu.is_(False)).group_by(models.Message.id_destinataire)
+        ).all()
+        if unread:
+            conn.execute(insert(models.MessageCounter.__table__), [{"id_utilisateur": u, "non_lus": n} for u, n in unread])
+    engine.dispose()
+    manifest["counts"] = {name: len(values) for name, values in rows.items()}
+    return manifest
+
+
+def default_manifest_path(database_url: str) -> str:
+    if database_url.startswith("sqlite:///"):
+        return database_url[len("sqlite:///"):] + ".manifest.json"
+    return os.path.join(BACKEND_DIR, "benchmarks", "manifest.json")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url", required=True, help="an empty database (sqlite:///... or a local MySQL)")
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--manifest")
+    args = parser.parse_args()
+
+    manifest = seed(args.database_url, args.scale, args.seed)
+    path = args.manifest or default_manifest_path(args.database_url)
+    with open(path, "w") as f:
+        json.dump(manifest, f)
+    print(", ".join(f"{name} {n}" for name, n in manifest["counts"].items()))
+    print(f"manifest written to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+Cold-start benchmark: import time, lifespan startup (with and without warm-up) and
+first-request latency, each measured in a fresh interpreter against a migrated SQLite
+database so module-level work is paid exactly as a new worker would pay it.
+
+    python benchmarks/startup.py --runs 5 --output startup.json --max-ready-ms 2500
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from common import BACKEND_DIR, migrate, report_header, write_report
+
+# Runs inside the child interpreter; prints one JSON line of timings.
+_PROBE = r"""
+import time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+import asyncio, json, httpx
+
+async def probe():
+    async with main.app.router.lifespan_context(main.app):
+        t2 = time.perf_counter()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            r = await client.get("/hierarchie/salles", headers={"Authorization": "Bearer " + TOKEN})
+            assert r.status_code == 200, r.text
+        t3 = time.perf_counter()
+    return t2, t3
+
+t2, t3 = asyncio.run(probe())
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "startup_ms": (t2 - t1) * 1000,
+    "first_request_ms": (t3 - t2) * 1000,
+    "ready_ms": (t2 - t0) * 1000,
+}))
+"""
+
+
+def make_token(env: dict) -> str:
+    out = subprocess.run(
+        [sys.executable, "-c", "import auth_utils; print(auth_utils.create_access_token({'sub': 'bench@example.com', 'roles': ['administratif'], 'uid': 1}))"],
+        cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True,
+    )
+    return out.stdout.strip()
+
+
+def run_once(env: dict, token: str, warmup: bool) -> dict:
+    child_env = dict(env, WARMUP="true" if warmup else "false", PYTHONDONTWRITEBYTECODE="")
+    out = subprocess.run(
+        [sys.executable, "-c", f"TOKEN = {token!r}\n" + _PROBE],
+        cwd=BACKEND_DIR, env=child_env, check=True, capture_output=True, text=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def import_profile(env: dict, top: int) -> list:
+    """
+    Modules with the highest self import time (python -X importtime), to see what moved.
+    """
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True,
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({"module": name.strip(), "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    rows.sort(key=lambda r: r["self_ms"], reverse=True)
+    return rows[:top]
+
+
+def summarise(samples: list) -> dict:
+    return {
+        key: {
+            "median": round(statistics.median(s[key] for s in samples), 1),
+            "min": round(min(s[key] for s in samples), 1),
+            "max": round(max(s[key] for s in samples), 1),
+        }
+        for key in samples[0]
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--profile", type=int, default=0, metavar="N", help="also list the N heaviest imports")
+    parser.add_argument("--max-import-ms", type=float, help="fail when the median import time exceeds this")
+    parser.add_argument("--max-ready-ms", type=float, help="fail when the median time to ready (no warm-up) exceeds this")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = migrate(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        env["HASH_POOL_WORKERS"] = env.get("HASH_POOL_WORKERS", "2")
+        token = make_token(env)
+        report = report_header("startup", runs=args.runs, hash_workers=env["HASH_POOL_WORKERS"])
+        for warmup in (False, True):
+            samples = [run_once(env, token, warmup) for _ in range(args.runs)]
+            report["warmup" if warmup else "cold"] = summarise(samples)
+        if args.profile:
+            report["imports"] = import_profile(env, args.profile)
+
+    for scenario in ("cold", "warmup"):
+        line = ", ".join(f"{key} {stats['median']:.0f} ms" for key, stats in report[scenario].items())
+        print(f"{scenario:>7}: {line}")
+    for row in report.get("imports", ()):
+        print(f"  {row['self_ms']:8.1f} ms  {row['module']}")
+    write_report(report, args.output)
+
+    failures = []
+    if args.max_import_ms is not None and report["cold"]["import_ms"]["median"] > args.max_import_ms:
+        failures.append(f"import {report['cold']['import_ms']['median']} ms > {args.max_import_ms} ms")
+    if args.max_ready_ms is not None and report["cold"]["ready_ms"]["median"] > args.max_ready_ms:
+        failures.append(f"ready {report['cold']['ready_ms']['median']} ms > {args.max_ready_ms} ms")
+    for failure in failures:
+        print(f"REGRESSION: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+from typing import Iterable, Optional
+
+from sqlalchemy import Table
+from sqlalchemy.dialects import mysql, sqlite
+
+import database
+
+
+# ---------------- Dialect-aware INSERT helpers ----------------
+def dialect_name() -> str:
+    return database.async_engine.dialect.name
+
+
+def insert_ignore(table: Table):
+    """
+    INSERT that silently skips rows violating a unique / primary key constraint.
+    """
+    if dialect_name() == "mysql":
+        return mysql.insert(table).prefix_with("IGNORE")
+    return sqlite.insert(table).on_conflict_do_nothing()
+
+
+def upsert(table: Table, index_elements: Iterable[str], update_columns: Iterable[str], values: Optional[list] = None):
+    """
+    Multi-row INSERT that overwrites update_columns when a row with the same
+    index_elements already exists (ON DUPLICATE KEY UPDATE / ON CONFLICT DO UPDATE).
+    """
+    update_columns = list(update_columns)
+    if dialect_name() == "mysql":
+        stmt = mysql.insert(table)
+        if values is not None:
+            stmt = stmt.values(values)
+        return stmt.on_duplicate_key_update({col: stmt.inserted[col] for col in update_columns})
+
+    stmt = sqlite.insert(table)
+    if values is not None:
+        stmt = stmt.values(values)
+    return stmt.on_conflict_do_update(
+        index_elements=list(index_elements),
+        set_={col: stmt.excluded[col] for col in update_columns},
+    )
+
+
+def increment(table: Table, index_elements: Iterable[str], column: str, values: list):
+    """
+    Multi-row INSERT of counter rows that adds `column` to the stored value when the
+    row already exists, so counters are bumped without reading them first.
+    """
+    if dialect_name() == "mysql":
+        stmt = mysql.insert(table).values(values)
+        return stmt.on_duplicate_key_update({column: table.c[column] + stmt.inserted[column]})
+
+    stmt = sqlite.insert(table).values(values)
+    return stmt.on_conflict_do_update(
+        index_elements=list(index_elements),
+        set_={column: table.c[column] + stmt.excluded[column]},
+    )
@@ -0,0 +1,268 @@
+import os
+import time
+import asyncio
+import logging
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import date, time as dtime
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+import model_events
+
+# ---------------- Configuration ----------------
+# Each worker keeps its own index; a periodic rebuild picks up seances written by other workers.
+CONFLICT_INDEX_TTL = float(os.getenv("CONFLICT_INDEX_TTL", 300))
+
+# (conflict kind, Seance column) pairs: a seance occupies its room, its teacher and its group
+RESOURCES = (("salle", "id_salle"), ("enseignant", "id_enseignant"), ("groupe", "id_groupe"))
+
+# ---------------- Logging ----------------
+logger = logging.getLogger("conflicts")
+
+
+def to_minutes(value: dtime) -> int:
+    return value.hour * 60 + value.minute
+
+
+def weekday(day: date) -> int:
+    """
+    day_of_week convention shared with the Node service: 0 = Sunday ... 6 = Saturday.
+    """
+    return day.isoweekday() % 7
+
+
+@dataclass(frozen=True, slots=True)
+class Slot:
+    """
+    Time footprint of one seance; `ref` is the seance id, or any hashable key for proposals.
+    """
+    ref: Hashable
+    id_salle: int
+    id_enseignant: int
+    id_groupe: int
+    day_of_week: Optional[int]
+    specific_date: Optional[date]
+    start: int
+    end: int
+
+    @classmethod
+    def of(cls, seance, ref: Hashable = None) -> "Slot":
+        """
+        Build from an ORM Seance, a pydantic schema or a column dict.
+        """
+        get = seance.get if isinstance(seance, dict) else lambda key: getattr(seance, key, None)
+        return cls(
+            ref=get("id") if ref is None else ref,
+            id_salle=get("id_salle"),
+            id_enseignant=get("id_enseignant"),
+            id_groupe=get("id_groupe"),
+            day_of_week=get("day_of_week") if get("specific_date") is None else None,
+            specific_date=get("specific_date"),
+            start=to_minutes(get("heure_debut")),
+            end=to_minutes(get("heure_fin")),
+        )
+
+    def resource(self, kind: str) -> int:
+        return getattr(self, f"id_{kind}")
+
+    def stored_under(self) -> List[Tuple[str, object]]:
+        # a dated seance is also filed under its weekday so recurring probes can find it
+        if self.specific_date is not None:
+            return [("date", self.specific_date), ("dated_dow", weekday(self.specific_date))]
+        return [("dow", self.day_of_week)]
+
+    def probes(self) -> List[Tuple[str, object]]:
+        if self.specific_date is not None:
+            return [("dow", weekday(self.specific_date)), ("date", self.specific_date)]
+        return [("dow", self.day_of_week), ("dated_dow", self.day_of_week)]
+
+
+class SortedIntervals:
+    """
+    Intervals sorted by start, with a running max of end times: an overlap query binary
+    searches for the last start before the probe's end, then walks left only while some
+    earlier interval can still reach the probe's start. That usually stops after the hits,
+    but one long interval near the front keeps the running max high and the walk visits
+    every entry before it, so the worst case is O(n), as are add and remove. Buckets hold a
+    single resource's seances for one weekday or date, which keeps n small.
+    """
+
+    __slots__ = ("starts", "slots", "max_end")
+
+    def __init__(self):
+        self.starts: List[int] = []
+        self.slots: List[Slot] = []
+        self.max_end: List[int] = []
+
+    def _rebuild_max_end(self, from_index: int):
+        running = self.max_end[from_index - 1] if from_index > 0 else -1
+        for i in range(from_index, len(self.slots)):
+            running = max(running, self.slots[i].end)
+            self.max_end[i] = running
+
+    def add(self, slot: Slot):
+        i = bisect_left(self.starts, slot.start)
+        self.starts.insert(i, slot.start)
+        self.slots.insert(i, slot)
+        self.max_end.insert(i, slot.end)
+        self._rebuild_max_end(i)
+
+    def remove(self, ref: Hashable) -> bool:
+        for i, slot in enumerate(self.slots):
+            if slot.ref == ref:
+                del self.starts[i], self.slots[i], self.max_end[i]
+                self._rebuild_max_end(i)
+                return True
+        return False
+
+    def overlapping(self, start: int, end: int) -> List[Slot]:
+        hits = []
+        j = bisect_left(self.starts, end) - 1
+        while j >= 0 and self.max_end[j] > start:
+            if self.slots[j].end > start:
+                hits.append(self.slots[j])
+            j -= 1
+        return hits
+
+    def __len__(self):
+        return len(self.slots)
+
+
+@dataclass(frozen=True, slots=True)
+class Collision:
+    kind: str
+    resource_id: int
+    slot: Slot
+    other: Slot
+
+
+class ConflictIndex:
+    """
+    Per-room, per-teacher and per-group interval indexes over every seance.
+    """
+
+    def __init__(self):
+        self.buckets: Dict[tuple, SortedIntervals] = {}
+        self.slots: Dict[Hashable, Slot] = {}
+
+    def _keys(self, slot: Slot, placements) -> Iterable[tuple]:
+        for kind, _ in RESOURCES:
+            for tag, value in placements:
+                yield kind, slot.resource(kind), tag, value
+
+    def add(self, slot: Slot):
+        if slot.ref in self.slots:
+            self.remove(slot.ref)
+        self.slots[slot.ref] = slot
+        for key in self._keys(slot, slot.stored_under()):
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = SortedIntervals()
+            bucket.add(slot)
+
+    def remove(self, ref: Hashable):
+        slot = self.slots.pop(ref, None)
+        if slot is None:
+            return
+        for key in self._keys(slot, slot.stored_under()):
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket.remove(ref)
+                if not bucket:
+                    del self.buckets[key]
+
+    def collisions(self, slot: Slot, ignore: Iterable[Hashable] = ()) -> List[Collision]:
+        """
+        Every indexed seance sharing a room, teacher or group with `slot` at an overlapping time.
+        """
+        ignore = set(ignore)
+        ignore.add(slot.ref)
+        found = []
+        for kind, _ in RESOURCES:
+            resource_id = slot.resource(kind)
+            for tag, value in slot.probes():
+                bucket = self.buckets.get((kind, resource_id, tag, value))
+                if bucket is None:
+                    continue
+                for other in bucket.overlapping(slot.start, slot.end):
+                    if other.ref not in ignore:
+                        found.append(Collision(kind, resource_id, slot, other))
+        return found
+
+    def validate(self, proposed: List[Slot], include_existing: bool = True) -> List[Collision]:
+        """
+        Check a whole proposed timetable in one pass. Proposed slots whose ref matches an
+        indexed seance replace it. Each colliding pair is reported once.
+        """
+        replaced = {slot.ref for slot in proposed if slot.ref in self.slots}
+        staged = ConflictIndex()
+        found = []
+        for slot in proposed:
+            if include_existing:
+                found.extend(self.collisions(slot, ignore=replaced))
+            found.extend(staged.collisions(slot))
+            staged.add(slot)
+        return found
+
+    def clear(self):
+        self.buckets.clear()
+        self.slots.clear()
+
+
+# ---------------- Process-wide index ----------------
+index = ConflictIndex()
+_loaded_at: Optional[float] = None
+_load_lock = asyncio.Lock()
+# changes committed while a build reads the table, replayed onto the new index
+_during_build: Optional[List[Tuple[List[dict], List[dict]]]] = None
+
+
+async def ensure_loaded(db: AsyncSession) -> ConflictIndex:
+    """
+    Build the index from the seance table on first use and again every CONFLICT_INDEX_TTL seconds.
+    """
+    global index, _loaded_at, _during_build
+    if _loaded_at is not None and time.monotonic() - _loaded_at < CONFLICT_INDEX_TTL:
+        return index
+    async with _load_lock:
+        if _loaded_at is not None and time.monotonic() - _loaded_at < CONFLICT_INDEX_TTL:
+            return index
+        started = time.perf_counter()
+        _during_build = []
+        try:
+            rows = (await db.execute(select(
+                models.Seance.id, models.Seance.id_salle, models.Seance.id_enseignant, models.Seance.id_groupe,
+                models.Seance.day_of_week, models.Seance.specific_date,
+                models.Seance.heure_debut, models.Seance.heure_fin,
+            ))).mappings().all()
+            fresh = ConflictIndex()
+            for row in rows:
+                fresh.add(Slot.of(row))
+            for upserted, deleted in _during_build:
+                _apply(fresh, upserted, deleted)
+        finally:
+            _during_build = None
+        index, _loaded_at = fresh, time.monotonic()
+        logger.info(f"[conflicts] indexed {len(rows)} seances in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return index
+
+
+def _apply(target: ConflictIndex, upserted: List[dict], deleted: List[dict]):
+    for row in deleted:
+        target.remove(row["id"])
+    for row in upserted:
+        target.add(Slot.of(row))
+
+
+def _on_seance_change(upserted: List[dict], deleted: List[dict]):
+    if _during_build is not None:
+        _during_build.append((upserted, deleted))
+    if _loaded_at is not None:
+        _apply(index, upserted, deleted)
+
+
+model_events.subscribe(models.Seance, _on_seance_change)
@@ -1,12 +1,135 @@
+import os
+import time
+from typing import Callable, Optional
+
+# ---------------- Environment ----------------
+# .env is optional (deployments set real variables). It is loaded here because this is the
+# first module every entry point imports, before anything reads its configuration.
+ENV_FILE = os.getenv("ENV_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
+if os.path.exists(ENV_FILE):
+    from dotenv import load_dotenv
+    load_dotenv(ENV_FILE)
+
 import pymysql
 pymysql.install_as_MySQLdb()  # optional if some libraries expect MySQLdb
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+# ---------------- Configuration ----------------
+DATABASE_URL = os.getenv("DATABASE_URL", "mysql+pymysql://root:@localhost:3306/platforme")
+
+# Async driver used for the same database (aiomysql for MySQL, aiosqlite for SQLite)
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", "True")
+
+
+def to_async_url(url: str) -> str:
+    """
+    Return the async-driver equivalent of a sync DATABASE_URL.
+    """
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{backend}'")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+# ---------------- Pool Instrumentation ----------------
+# Set by metrics when enabled; receives the seconds each checkout waited for a connection.
+pool_wait_observer: Optional[Callable[[float], None]] = None
+
 
+class _TimedCheckout:
+    def _do_get(self):
+        observer = pool_wait_observer
+        if observer is None:
+            return super()._do_get()
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            observer(time.perf_counter() - started)
 
-DATABASE_URL = "mysql+pymysql://root:@localhost:3306/platforme"
 
-engine = create_engine(DATABASE_URL)  
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_options(url: str) -> dict:
+    """
+    Pool keyword arguments for create_engine / create_async_engine.
+    SQLite uses a single-file (or in-memory) pool, so size/overflow/timeout do not apply.
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        return {"pool_pre_ping": DB_POOL_PRE_PING}
+    return {
+        "poolclass": TimedAsyncQueuePool if make_url(url).get_dialect().is_async else TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+# ---------------- Sync Engine (schema management, scripts) ----------------
+engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# ---------------- Async Engine (request handling) ----------------
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options(ASYNC_DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 Base = declarative_base()
+
+# ---------------- Schema Version ----------------
+# Head of migrations/versions; bump together with every new migration.
+SCHEMA_REVISION = "0006"
+
+
+async def schema_revision() -> Optional[str]:
+    """
+    Alembic revision the database is at (None when it was never stamped): one single-row read,
+    in place of the table-by-table checks create_all used to run in every worker.
+    """
+    async with async_engine.connect() as conn:
+        try:
+            return await conn.scalar(text("SELECT version_num FROM alembic_version"))
+        except DBAPIError:
+            return None
+
+
+# ---------------- Database Dependency ----------------
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,223 @@
+import logging
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import Select, delete, func, literal, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import bulk
+import models
+import schemas
+from database import get_db
+from security import get_current_user, get_current_user_id, require_roles
+
+# ---------------- Router ----------------
+router = APIRouter(prefix="/evenements", tags=["Evenements"], dependencies=[Depends(get_current_user)])
+admin_only = require_roles("administratif")
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# ---------------- Logging ----------------
+logger = logging.getLogger("evenements")
+
+
+# ---------------- Target populations ----------------
+def _student_ids(audience: schemas.EventAudience) -> Optional[Select]:
+    """
+    Ids of the students matching the audience: the SELECT the INSERT / DELETE is built on.
+    """
+    e, g, n, s = models.Etudiant, models.Groupe, models.Niveau, models.Specialite
+    criteria = []
+    if audience.id_etudiants:
+        criteria.append(e.id.in_(audience.id_etudiants))
+    if audience.id_groupes:
+        criteria.append(e.id_groupe.in_(audience.id_groupes))
+    if audience.id_niveaux:
+        criteria.append(g.id_niveau.in_(audience.id_niveaux))
+    if audience.id_specialites:
+        criteria.append(n.id_specialite.in_(audience.id_specialites))
+    if audience.id_departements:
+        criteria.append(s.id_departement.in_(audience.id_departements))
+    if not criteria:
+        return None
+    query = select(e.id)
+    if audience.id_niveaux or audience.id_specialites or audience.id_departements:
+        query = query.outerjoin(g, g.id == e.id_groupe)
+    if audience.id_specialites or audience.id_departements:
+        query = query.outerjoin(n, n.id == g.id_niveau)
+    if audience.id_departements:
+        query = query.outerjoin(s, s.id == n.id_specialite)
+    return query.where(or_(*criteria))
+
+
+def _teacher_ids(audience: schemas.EventAudience) -> Optional[Select]:
+    criteria = []
+    if audience.id_enseignants:
+        criteria.append(models.Enseignant.id.in_(audience.id_enseignants))
+    groups = _group_ids(audience)
+    if audience.enseignants_des_groupes and groups is not None:
+        criteria.append(models.Enseignant.id.in_(
+            select(models.Seance.id_enseignant).where(models.Seance.id_groupe.in_(groups))
+        ))
+    if not criteria:
+        return None
+    return select(models.Enseignant.id).where(or_(*criteria))
+
+
+def _group_ids(audience: schemas.EventAudience) -> Optional[Select]:
+    g, n, s = models.Groupe, models.Niveau, models.Specialite
+    criteria = []
+    if audience.id_groupes:
+        criteria.append(g.id.in_(audience.id_groupes))
+    if audience.id_niveaux:
+        criteria.append(g.id_niveau.in_(audience.id_niveaux))
+    if audience.id_specialites:
+        criteria.append(n.id_specialite.in_(audience.id_specialites))
+    if audience.id_departements:
+        criteria.append(s.id_departement.in_(audience.id_departements))
+    if not criteria:
+        return None
+    return (
+        select(g.id)
+        .join(n, n.id == g.id_niveau)
+        .join(s, s.id == n.id_specialite)
+        .where(or_(*criteria))
+    )
+
+
+async def _get_event(db: AsyncSession, event_id: int) -> models.Evenement:
+    event = await db.get(models.Evenement, event_id)
+    if event is None:
+        raise HTTPException(status_code=404, detail="Evénement introuvable")
+    return event
+
+
+async def _apply(db: AsyncSession, event_id: int, audience: schemas.EventAudience, register: bool) -> schemas.EventRegistrationReport:
+    """
+    One INSERT ... SELECT (existing rows ignored) or one DELETE per association table, then
+    the counters moved by exactly the affected row counts, all in one transaction.
+    """
+    await _get_event(db, event_id)
+    changed = {}
+    for key, table, column, population in (
+        ("etudiants", models.evenement_etudiants, "etudiant_id", _student_ids(audience)),
+        ("enseignants", models.evenement_enseignants, "enseignant_id", _teacher_ids(audience)),
+    ):
+        if population is None:
+            changed[key] = 0
+            continue
+        if register:
+            # the population query itself, not a subquery of it: SQLite only parses
+            # INSERT ... SELECT ... ON CONFLICT when that SELECT carries the WHERE
+            statement = bulk.insert_ignore(table).from_select(
+                ["evenement_id", column],
+                population.with_only_columns(literal(event_id), *population.selected_columns),
+            )
+        else:
+            statement = delete(table).where(table.c.evenement_id == event_id, table.c[column].in_(population))
+        changed[key] = (await db.execute(statement)).rowcount or 0
+
+    sign = 1 if register else -1
+    event = models.Evenement
+    if changed["etudiants"] or changed["enseignants"]:
+        await db.execute(
+            update(event).where(event.id == event_id).values(
+                nb_etudiants=event.nb_etudiants + sign * changed["etudiants"],
+                nb_enseignants=event.nb_enseignants + sign * changed["enseignants"],
+            )
+        )
+    totals = (await db.execute(
+        select(event.nb_etudiants, event.nb_enseignants).where(event.id == event_id)
+    )).one()
+    try:
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.exception(f"[{'register' if register else 'unregister'}] DB commit failed: {e}")
+        raise HTTPException(status_code=500, detail="Mise à jour des inscriptions impossible")
+
+    logger.info(
+        f"[{'register' if register else 'unregister'}] evenement {event_id}: "
+        f"{changed['etudiants']} etudiants, {changed['enseignants']} enseignants"
+    )
+    return schemas.EventRegistrationReport(
+        etudiants=changed["etudiants"], enseignants=changed["enseignants"],
+        nb_etudiants=totals.nb_etudiants, nb_enseignants=totals.nb_enseignants,
+    )
+
+
+# ---------------- Evenements ----------------
+@router.get("", response_model=List[schemas.EvenementResponse])
+async def list_events(
+    depuis: Optional[date] = Query(None, description="Par défaut: aujourd'hui"),
+    type: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Upcoming events with their participant counts, read from the event rows themselves.
+    """
+    query = select(models.Evenement).where(models.Evenement.date >= (depuis or date.today()))
+    if type is not None:
+        query = query.where(models.Evenement.type == type)
+    query = query.order_by(models.Evenement.date, models.Evenement.id).offset(offset).limit(limit)
+    return (await db.execute(query)).scalars().all()
+
+
+@router.get("/{event_id}", response_model=schemas.EvenementResponse)
+async def get_event(event_id: int, db: AsyncSession = Depends(get_db)):
+    return await _get_event(db, event_id)
+
+
+@router.post("", response_model=schemas.EvenementResponse, status_code=201, dependencies=[Depends(admin_only)])
+async def create_event(
+    req: schemas.EvenementCreate,
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    if await db.get(models.Administratif, user_id) is None:
+        raise HTTPException(status_code=403, detail="Seul un administratif peut créer un événement")
+    event = models.Evenement(**req.model_dump(), created_by_id=user_id, nb_etudiants=0, nb_enseignants=0)
+    db.add(event)
+    try:
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.exception(f"[create_event] DB commit failed: {e}")
+        raise HTTPException(status_code=500, detail="Création de l'événement impossible")
+    return event
+
+
+# ---------------- Registrations ----------------
+@router.post("/{event_id}/inscriptions", response_model=schemas.EventRegistrationReport, dependencies=[Depends(admin_only)])
+async def register(event_id: int, audience: schemas.EventAudience, db: AsyncSession = Depends(get_db)):
+    """
+    Register a whole population (departements, specialites, niveaux, groupes and/or explicit
+    ids) at once. Already registered participants are left as they are.
+    """
+    return await _apply(db, event_id, audience, register=True)
+
+
+@router.post("/{event_id}/desinscriptions", response_model=schemas.EventRegistrationReport, dependencies=[Depends(admin_only)])
+async def unregister(event_id: int, audience: schemas.EventAudience, db: AsyncSession = Depends(get_db)):
+    return await _apply(db, event_id, audience, register=False)
+
+
+# ---------------- Maintenance ----------------
+@router.post("/compteurs/recalcul", dependencies=[Depends(admin_only)])
+async def rebuild_counts(db: AsyncSession = Depends(get_db)):
+    """
+    Recompute every participant count from the association tables, e.g. after rows were
+    written through the ORM relationships or by another service.
+    """
+    event = models.Evenement
+    for column, table in (("nb_etudiants", models.evenement_etudiants), ("nb_enseignants", models.evenement_enseignants)):
+        count = select(func.count()).where(table.c.evenement_id == event.id).scalar_subquery()
+        await db.execute(update(event).values({column: count}))
+    await db.commit()
+    total = await db.scalar(select(func.count()).select_from(event))
+    logger.info(f"[rebuild_counts] {total} evenements recounted")
+    return {"evenements": total}
@@ -0,0 +1,272 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import itertools
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Set
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import select
+
+import models
+import schemas
+import auth_utils
+import model_events
+from database import AsyncSessionLocal
+from security import bearer_scheme, get_current_user_id, principal_from_token, require_roles
+
+# ---------------- Configuration ----------------
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", 64))
+EVENT_REPLAY_SIZE = int(os.getenv("EVENT_REPLAY_SIZE", 2048))
+EVENT_HEARTBEAT = float(os.getenv("EVENT_HEARTBEAT", 20))
+EVENT_RETRY_MS = int(os.getenv("EVENT_RETRY_MS", 3000))
+
+# ---------------- Router ----------------
+router = APIRouter(prefix="/events", tags=["Events"])
+
+# ---------------- Logging ----------------
+logger = logging.getLogger("events")
+
+
+class Event:
+    __slots__ = ("id", "user_id", "name", "data")
+
+    def __init__(self, event_id: int, user_id: int, name: str, data: str):
+        self.id = event_id
+        self.user_id = user_id
+        self.name = name
+        self.data = data
+
+    def encode(self, epoch: str) -> str:
+        return f"id: {epoch}-{self.id}\nevent: {self.name}\ndata: {self.data}\n\n"
+
+
+# queue sentinels
+_HEARTBEAT = object()
+_CLOSE = object()
+
+
+class Subscription:
+    """
+    One open stream: a bounded queue and nothing else, so an idle connection is a
+    coroutine parked on queue.get() without any timer of its own.
+    """
+    __slots__ = ("user_id", "queue", "closed")
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+        self.closed = False
+
+
+class EventHub:
+    """
+    In-process pub/sub keyed by user id, with a ring buffer of recent events for
+    Last-Event-ID resume. Each worker has its own hub and only sees its own commits.
+    """
+
+    def __init__(self):
+        # event ids are "<epoch>-<seq>": a resume id from another process lifetime is detected
+        self.epoch = format(int(time.time()), "x")
+        self._seq = itertools.count(1)
+        self.connections: Dict[int, Set[Subscription]] = {}
+        self.replay: Deque[Event] = deque(maxlen=EVENT_REPLAY_SIZE)
+        self.published = 0
+        self.dropped = 0
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    # ---- connections ----
+    def connect(self, user_id: int) -> Subscription:
+        sub = Subscription(user_id)
+        self.connections.setdefault(user_id, set()).add(sub)
+        return sub
+
+    def disconnect(self, sub: Subscription):
+        subs = self.connections.get(sub.user_id)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self.connections[sub.user_id]
+
+    def _close(self, sub: Subscription):
+        sub.closed = True
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(_CLOSE)
+
+    def _offer(self, sub: Subscription, item):
+        if sub.closed:
+            return
+        try:
+            sub.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # slow consumer: end its stream, the client reconnects and resumes from its last id
+            self.dropped += 1
+            self._close(sub)
+
+    # ---- publishing ----
+    def publish(self, user_ids: Iterable[int], name: str, payload: dict):
+        """
+        Queue an event for every open stream of the given users. The payload is
+        serialised once, whatever the number of recipients.
+        """
+        data = json.dumps(payload, default=str)
+        for user_id in set(user_ids):
+            event = Event(next(self._seq), user_id, name, data)
+            self.replay.append(event)
+            self.published += 1
+            for sub in self.connections.get(user_id, ()):
+                self._offer(sub, event)
+
+    def backlog(self, user_id: int, last_event_id: Optional[str]) -> Optional[List[Event]]:
+        """
+        Events for `user_id` published after `last_event_id`, or None when that point
+        can no longer be replayed (unknown id, restarted process, or aged out of the buffer).
+        """
+        if not last_event_id:
+            return []
+        epoch, _, seq = last_event_id.partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        if self.replay and self.replay[0].id > seq + 1:
+            return None
+        return [event for event in self.replay if event.user_id == user_id and event.id > seq]
+
+    # ---- lifecycle ----
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(EVENT_HEARTBEAT)
+            # one timer for the whole hub; busy queues already keep their stream alive
+            for subs in list(self.connections.values()):
+                for sub in list(subs):
+                    if sub.queue.empty():
+                        self._offer(sub, _HEARTBEAT)
+
+    def start(self):
+        if self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def stop(self):
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        for subs in list(self.connections.values()):
+            for sub in list(subs):
+                self._close(sub)
+
+    def stats(self) -> dict:
+        return {
+            "connections": sum(len(subs) for subs in self.connections.values()),
+            "users": len(self.connections),
+            "published": self.published,
+            "dropped": self.dropped,
+            "replay_buffer": len(self.replay),
+        }
+
+
+hub = EventHub()
+
+
+# ---------------- Publishers ----------------
+def _on_messages(rows: List[dict]):
+    for row in rows:
+        hub.publish([row["id_destinataire"]], "message", {
+            "id": row["id"], "id_expediteur": row["id_expediteur"], "contenu": row["contenu"], "date": row["date"],
+        })
+
+
+def _on_teacher_absences(rows: List[dict]):
+    for row in rows:
+        hub.publish([row["id_chef"]], "absence_enseignant", {
+            "id": row["id"], "id_enseignant": row["id_enseignant"], "id_seance": row["id_seance"],
+            "contenu": row["contenu"], "date": row["date"],
+        })
+
+
+model_events.subscribe_inserts(models.Message, _on_messages)
+model_events.subscribe_inserts(models.MessEnsAbs, _on_teacher_absences)
+
+
+# ---------------- Stream ----------------
+async def _resolve_user_id(token: Optional[str]) -> int:
+    principal = principal_from_token(token) if token else None
+    if principal is None:
+        raise HTTPException(status_code=401, detail="Jeton invalide ou expiré", headers={"WWW-Authenticate": "Bearer"})
+    if principal.id is not None:
+        return principal.id
+    # short-lived session: a stream must not pin a pooled connection for its whole life
+    async with AsyncSessionLocal() as db:
+        user_id = await db.scalar(select(models.Utilisateur.id).where(models.Utilisateur.email == principal.email))
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Utilisateur introuvable", headers={"WWW-Authenticate": "Bearer"})
+    return user_id
+
+
+async def _stream(user_id: int, last_event_id: Optional[str]):
+    # subscribe before reading the backlog so nothing published in between is lost
+    sub = hub.connect(user_id)
+    backlog = hub.backlog(user_id, last_event_id)
+    try:
+        yield f"retry: {EVENT_RETRY_MS}\n\n"
+        if backlog is None:
+            # history lost: the client reloads its state through the REST endpoints
+            yield "event: reset\ndata: {}\n\n"
+        last_sent = 0
+        for event in backlog or ():
+            yield event.encode(hub.epoch)
+            last_sent = event.id
+        while True:
+            item = await sub.queue.get()
+            if item is _CLOSE:
+                break
+            if item is _HEARTBEAT:
+                yield ": ping\n\n"
+            elif item.id > last_sent:
+                yield item.encode(hub.epoch)
+    finally:
+        hub.disconnect(sub)
+
+
+@router.post("/ticket", response_model=schemas.StreamTicket)
+async def stream_ticket(user_id: int = Depends(get_current_user_id)):
+    """
+    A short-lived ticket for EventSource clients, which cannot set headers: the access token
+    never goes into a URL. Ask for a new one before each (re)connection.
+    """
+    ticket, expires = auth_utils.create_stream_ticket(user_id)
+    return schemas.StreamTicket(ticket=ticket, expires_at=expires)
+
+
+@router.get("/stream")
+async def stream(
+    request: Request,
+    ticket: Optional[str] = Query(None, description="Ticket from POST /events/ticket, for EventSource clients"),
+    last_event_id: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+):
+    """
+    Server-sent events for the caller: `message` (new Message received) and
+    `absence_enseignant` (MessEnsAbs addressed to a chef). Reconnecting with a
+    Last-Event-ID header (or ?last_event_id=) replays what was missed, or sends `reset` if it cannot.
+    """
+    if credentials is not None:
+        user_id = await _resolve_user_id(credentials.credentials)
+    else:
+        user_id = auth_utils.verify_stream_ticket(ticket) if ticket else None
+        if user_id is None:
+            raise HTTPException(status_code=401, detail="Ticket invalide ou expiré", headers={"WWW-Authenticate": "Bearer"})
+    return StreamingResponse(
+        _stream(user_id, request.headers.get("last-event-id") or last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/stats", dependencies=[Depends(require_roles("administratif"))])
+async def hub_stats():
+    return hub.stats()
@@ -0,0 +1,211 @@
+import io
+import os
+import csv
+import json
+import zlib
+import logging
+from datetime import date
+from typing import AsyncIterator, Callable, List, Literal, Optional, Sequence, Tuple
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select, and_, or_, select
+from sqlalchemy.orm import aliased
+
+import models
+from replicas import read_session
+from security import require_roles
+
+# ---------------- Configuration ----------------
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+EXPORT_GZIP_LEVEL = int(os.getenv("EXPORT_GZIP_LEVEL", 6))
+
+ExportFormat = Literal["csv", "ndjson"]
+
+# ---------------- Router ----------------
+router = APIRouter(
+    prefix="/admin/exports",
+    tags=["Exports"],
+    dependencies=[Depends(require_roles("administratif"))],
+)
+
+# ---------------- Logging ----------------
+logger = logging.getLogger("exports")
+
+
+# ---------------- Encoders ----------------
+def _csv_encoder(columns: List[str]) -> Tuple[str, Callable[[Sequence], str]]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def encode(rows: Sequence) -> str:
+        writer.writerows(rows)
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    # BOM so spreadsheet software reads accents correctly; the importer decodes utf-8-sig
+    return "\ufeff" + encode([columns]), encode
+
+
+def _ndjson_encoder(columns: List[str]) -> Tuple[str, Callable[[Sequence], str]]:
+    def encode(rows: Sequence) -> str:
+        return "".join(
+            json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str) + "\n"
+            for row in rows
+        )
+
+    return "", encode
+
+
+async def _stream(query: Select, fmt: ExportFormat, compress: bool) -> AsyncIterator[bytes]:
+    """
+    Rows come off a server-side cursor one partition at a time and are encoded (and
+    optionally gzipped) as they go, so memory stays flat whatever the table size.
+    The generator owns its session (on a read replica when configured): it outlives the request handler.
+    """
+    columns = [c.key for c in query.selected_columns]
+    header, encode = _csv_encoder(columns) if fmt == "csv" else _ndjson_encoder(columns)
+    gzip = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None
+
+    def out(text: str) -> bytes:
+        data = text.encode("utf-8")
+        return gzip.compress(data) if gzip is not None else data
+
+    total = 0
+    yield out(header)
+    async with read_session() as db:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for partition in result.partitions():
+            total += len(partition)
+            chunk = out(encode(partition))
+            if chunk:
+                yield chunk
+    if gzip is not None:
+        yield gzip.flush()
+    logger.info(f"[exports] {total} rows streamed as {fmt}{'.gz' if compress else ''}")
+
+
+def _response(name: str, query: Select, fmt: ExportFormat, compress: bool) -> StreamingResponse:
+    filename = f"{name}-{date.today():%Y%m%d}.{fmt}" + (".gz" if compress else "")
+    media_type = "application/gzip" if compress else ("text/csv; charset=utf-8" if fmt == "csv" else "application/x-ndjson")
+    return StreamingResponse(
+        _stream(query, fmt, compress),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"},
+    )
+
+
+def _date_range(column, debut: Optional[date], fin: Optional[date]):
+    clauses = []
+    if debut is not None:
+        clauses.append(column >= debut)
+    if fin is not None:
+        clauses.append(column <= fin)
+    return clauses
+
+
+# ---------------- Endpoints ----------------
+@router.get("/utilisateurs")
+async def export_users(
+    format: ExportFormat = "csv",
+    gzip: bool = False,
+    role: Optional[str] = None,
+    id_groupe: Optional[int] = None,
+    id_niveau: Optional[int] = None,
+):
+    """
+    Users without credentials; students carry their groupe and niveau.
+    Filtering on groupe or niveau restricts the export to students.
+    """
+    u = models.Utilisateur
+    query = (
+        select(
+            u.id, u.cin, u.nom, u.prenom, u.email, u.telp, u.role,
+            models.Etudiant.id_groupe, models.Groupe.id_niveau,
+        )
+        .outerjoin(models.Etudiant, models.Etudiant.id == u.id)
+        .outerjoin(models.Groupe, models.Groupe.id == models.Etudiant.id_groupe)
+        .order_by(u.id)
+    )
+    if role is not None:
+        query = query.where(u.role == role)
+    if id_groupe is not None:
+        query = query.where(models.Etudiant.id_groupe == id_groupe)
+    if id_niveau is not None:
+        query = query.where(models.Groupe.id_niveau == id_niveau)
+    return _response("utilisateurs", query, format, gzip)
+
+
+@router.get("/seances")
+async def export_timetable(
+    format: ExportFormat = "csv",
+    gzip: bool = False,
+    id_groupe: Optional[int] = None,
+    id_niveau: Optional[int] = None,
+    debut: Optional[date] = None,
+    fin: Optional[date] = None,
+):
+    """
+    Timetable rows with room, matière, groupe and teacher names. A date range keeps
+    recurring seances and the dated ones falling inside it.
+    """
+    s = models.Seance
+    teacher = aliased(models.Utilisateur)
+    query = (
+        select(
+            s.id, s.day_of_week, s.specific_date, s.heure_debut, s.heure_fin,
+            s.id_salle, models.Salle.numero.label("salle"),
+            s.id_matiere, models.Matiere.nom.label("matiere"),
+            s.id_groupe, models.Groupe.nom.label("groupe"), models.Groupe.id_niveau,
+            s.id_enseignant, teacher.nom.label("enseignant_nom"), teacher.prenom.label("enseignant_prenom"),
+            s.is_presente,
+        )
+        .join(models.Salle, models.Salle.id == s.id_salle)
+        .join(models.Matiere, models.Matiere.id == s.id_matiere)
+        .join(models.Groupe, models.Groupe.id == s.id_groupe)
+        .join(teacher, teacher.id == s.id_enseignant)
+        .order_by(s.id)
+    )
+    if id_groupe is not None:
+        query = query.where(s.id_groupe == id_groupe)
+    if id_niveau is not None:
+        query = query.where(models.Groupe.id_niveau == id_niveau)
+    if debut is not None or fin is not None:
+        query = query.where(or_(s.specific_date.is_(None), and_(*_date_range(s.specific_date, debut, fin))))
+    return _response("seances", query, format, gzip)
+
+
+@router.get("/absences")
+async def export_absences(
+    format: ExportFormat = "csv",
+    gzip: bool = False,
+    id_groupe: Optional[int] = None,
+    id_niveau: Optional[int] = None,
+    debut: Optional[date] = None,
+    fin: Optional[date] = None,
+):
+    """
+    Absence records with the student, seance and matière they belong to.
+    """
+    a = models.Absence
+    query = (
+        select(
+            a.id, a.date, a.statut,
+            a.id_etudiant, models.Utilisateur.nom, models.Utilisateur.prenom,
+            a.id_seance, models.Seance.id_matiere, models.Matiere.nom.label("matiere"),
+            models.Seance.id_groupe, models.Groupe.id_niveau,
+        )
+        .join(models.Utilisateur, models.Utilisateur.id == a.id_etudiant)
+        .join(models.Seance, models.Seance.id == a.id_seance)
+        .join(models.Matiere, models.Matiere.id == models.Seance.id_matiere)
+        .join(models.Groupe, models.Groupe.id == models.Seance.id_groupe)
+        .where(*_date_range(a.date, debut, fin))
+        .order_by(a.id)
+    )
+    if id_groupe is not None:
+        query = query.where(models.Seance.id_groupe == id_groupe)
+    if id_niveau is not None:
+        query = query.where(models.Groupe.id_niveau == id_niveau)
+    return _response("absences", query, format, gzip)
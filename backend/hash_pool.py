@@ -0,0 +1,173 @@
+import os
+import math
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from fastapi import HTTPException
+
+import auth_utils
+
+# ---------------- Configuration ----------------
+HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", os.cpu_count() or 2))
+# How many jobs may wait behind the busy workers before new requests are shed with 503
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", HASH_POOL_WORKERS * 4))
+
+# ---------------- Logging ----------------
+logger = logging.getLogger("hash_pool")
+
+
+class HashPoolSaturated(HTTPException):
+    """
+    Raised when the bcrypt queue is full. Being an HTTPException, routes can let it propagate as a 503.
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__(
+            status_code=503,
+            detail="Serveur occupé, veuillez réessayer plus tard",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+def _timed(func, *args):
+    """
+    Runs inside a worker process; reports wall-clock start/end so the parent can compute wait time.
+    """
+    started = time.time()
+    result = func(*args)
+    return started, time.time(), result
+
+
+class HashPool:
+    """
+    Bounded process pool for bcrypt work with queue-depth admission control.
+    """
+
+    def __init__(self, workers: int = HASH_POOL_WORKERS, queue_limit: int = HASH_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._created_at = time.monotonic()
+
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_limit
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: never fork a process that already runs an event loop and DB pool threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            self._created_at = time.monotonic()
+        return self._executor
+
+    def _retry_after(self) -> int:
+        avg_service = self.busy_seconds / self.completed if self.completed else 0.25
+        return max(1, math.ceil(avg_service * self.in_flight / self.workers))
+
+    async def run(self, func, *args):
+        """
+        Run func(*args) in the pool, or raise HashPoolSaturated when the queue is full.
+        """
+        if self.in_flight >= self.capacity:
+            self.rejected += 1
+            raise HashPoolSaturated(self._retry_after())
+
+        return await self._submit(func, args)
+
+    async def _submit(self, func, args):
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        self.submitted += 1
+        submitted_at = time.time()
+        try:
+            started, finished, result = await loop.run_in_executor(self._get_executor(), _timed, func, *args)
+        finally:
+            self.in_flight -= 1
+
+        wait = max(0.0, started - submitted_at)
+        self.completed += 1
+        self.busy_seconds += finished - started
+        self.wait_seconds_total += wait
+        self.wait_seconds_max = max(self.wait_seconds_max, wait)
+        return result
+
+    async def map(self, func, arg_tuples, concurrency: Optional[int] = None) -> list:
+        """
+        Run func over many argument tuples for batch jobs, bypassing admission control.
+        At most `concurrency` (default: workers) tasks are outstanding at once, so
+        interactive requests queued behind a batch wait for one round of work at most.
+        """
+        gate = asyncio.Semaphore(concurrency or self.workers)
+
+        async def one(args):
+            async with gate:
+                return await self._submit(func, args)
+
+        return await asyncio.gather(*(one(args) for args in arg_tuples))
+
+    async def warm_up(self):
+        """
+        Spawn every worker and run one bcrypt round in each, so the first logins pay
+        neither for process start nor for the imports inside the workers.
+        """
+        await self.map(auth_utils.hash_password, [("warm-up",)] * self.workers)
+
+    def stats(self) -> dict:
+        uptime = max(time.monotonic() - self._created_at, 1e-9)
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "in_flight": self.in_flight,
+            "queued": max(0, self.in_flight - self.workers),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "utilisation": round(min(1.0, self.busy_seconds / (uptime * self.workers)), 4),
+            "avg_wait_ms": round(self.wait_seconds_total / self.completed * 1000, 3) if self.completed else 0.0,
+            "max_wait_ms": round(self.wait_seconds_max * 1000, 3),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+pool = HashPool()
+
+
+# ---------------- Password Utilities ----------------
+async def hash_password(password: str) -> str:
+    """
+    bcrypt hash computed in the worker pool.
+    """
+    return await pool.run(auth_utils.hash_password, password)
+
+
+async def verify_password(plain: str, hashed: str) -> bool:
+    """
+    Password verification (bcrypt or legacy SHA-256) computed in the worker pool.
+    """
+    return await pool.run(auth_utils.verify_password, plain, hashed)
+
+
+async def hash_passwords(passwords: list) -> list:
+    """
+    bcrypt hashes for a batch of passwords, spread across all pool workers.
+    """
+    return await pool.map(auth_utils.hash_password, [(p,) for p in passwords])
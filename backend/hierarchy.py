@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+import schemas
+import model_events
+from loaders import Loaders, get_loaders
+from replicas import for_cache, get_read_db
+from security import get_current_user
+
+# ---------------- Configuration ----------------
+# Safety net for writes made by other workers or by the Node service, which this process never sees.
+HIERARCHY_TTL = float(os.getenv("HIERARCHY_TTL", 300))
+
+# ---------------- Router ----------------
+router = APIRouter(prefix="/hierarchie", tags=["Hierarchie"], dependencies=[Depends(get_current_user)])
+
+# ---------------- Logging ----------------
+logger = logging.getLogger("hierarchy")
+
+
+@dataclass(frozen=True)
+class Document:
+    """
+    A response body serialised once, with a strong ETag derived from its bytes
+    (identical across workers holding the same data; the version travels in a header).
+    """
+    body: bytes
+    etag: str
+
+    @classmethod
+    def of(cls, payload) -> "Document":
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str).encode()
+        return cls(body=body, etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+
+
+@dataclass
+class Snapshot:
+    version: int
+    built_at: float
+    tree: Document
+    salles: Document
+    departements: Dict[int, Document] = field(default_factory=dict)
+
+
+async def build_snapshot(db: AsyncSession, version: int) -> Snapshot:
+    """
+    One column-only query per level, assembled into plain dicts and serialised up front.
+    """
+    def rows(*columns):
+        return db.execute(select(*columns).order_by(columns[0]))
+
+    departements = (await rows(models.Departement.id, models.Departement.nom, models.Departement.id_chef)).mappings().all()
+    specialites = (await rows(models.Specialite.id, models.Specialite.nom, models.Specialite.id_departement)).mappings().all()
+    niveaux = (await rows(models.Niveau.id, models.Niveau.nom, models.Niveau.id_specialite)).mappings().all()
+    groupes = (await rows(models.Groupe.id, models.Groupe.nom, models.Groupe.id_niveau)).mappings().all()
+    matieres = (await rows(models.Matiere.id, models.Matiere.nom, models.Matiere.id_niveau)).mappings().all()
+    salles = (await rows(models.Salle.id, models.Salle.numero, models.Salle.type, models.Salle.capacite)).mappings().all()
+
+    by_niveau: Dict[int, dict] = {}
+    for n in niveaux:
+        by_niveau[n["id"]] = {"id": n["id"], "nom": n["nom"], "groupes": [], "matieres": [], "_parent": n["id_specialite"]}
+    for g in groupes:
+        if g["id_niveau"] in by_niveau:
+            by_niveau[g["id_niveau"]]["groupes"].append({"id": g["id"], "nom": g["nom"]})
+    for m in matieres:
+        if m["id_niveau"] in by_niveau:
+            by_niveau[m["id_niveau"]]["matieres"].append({"id": m["id"], "nom": m["nom"]})
+
+    by_specialite: Dict[int, dict] = {
+        s["id"]: {"id": s["id"], "nom": s["nom"], "niveaux": [], "_parent": s["id_departement"]}
+        for s in specialites
+    }
+    for niveau in by_niveau.values():
+        parent = by_specialite.get(niveau.pop("_parent"))
+        if parent is not None:
+            parent["niveaux"].append(niveau)
+
+    by_departement: Dict[int, dict] = {
+        d["id"]: {"id": d["id"], "nom": d["nom"], "id_chef": d["id_chef"], "specialites": []}
+        for d in departements
+    }
+    for specialite in by_specialite.values():
+        parent = by_departement.get(specialite.pop("_parent"))
+        if parent is not None:
+            parent["specialites"].append(specialite)
+
+    tree = list(by_departement.values())
+    return Snapshot(
+        version=version,
+        built_at=time.time(),
+        tree=Document.of({"departements": tree}),
+        salles=Document.of({"salles": [dict(s) for s in salles]}),
+        departements={d["id"]: Document.of(d) for d in tree},
+    )
+
+
+# ---------------- Process-wide snapshot ----------------
+_snapshot: Optional[Snapshot] = None
+_stale = True
+_version = 0
+_invalidated_at = 0.0
+_build_lock = asyncio.Lock()
+
+
+async def current(db: AsyncSession) -> Snapshot:
+    """
+    The snapshot, rebuilt only after an invalidation or HIERARCHY_TTL; otherwise no query at all.
+    """
+    global _snapshot, _stale, _version
+    if not _stale and _snapshot is not None and time.time() - _snapshot.built_at < HIERARCHY_TTL:
+        return _snapshot
+    async with _build_lock:
+        if not _stale and _snapshot is not None and time.time() - _snapshot.built_at < HIERARCHY_TTL:
+            return _snapshot
+        # cleared before reading so a write landing mid-build marks the result stale again
+        _stale = False
+        started = time.perf_counter()
+        try:
+            async with for_cache(db, _invalidated_at) as source:
+                snapshot = await build_snapshot(source, _version + 1)
+        except Exception:
+            _stale = True
+            raise
+        # the version only moves when the content does
+        if _snapshot is not None and snapshot.tree.etag == _snapshot.tree.etag and snapshot.salles.etag == _snapshot.salles.etag:
+            _snapshot.built_at = snapshot.built_at
+        else:
+            _version += 1
+            _snapshot = snapshot
+            logger.info(f"[hierarchy] snapshot v{_version} built in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return _snapshot
+
+
+def invalidate(*_):
+    global _stale, _invalidated_at
+    _stale = True
+    _invalidated_at = time.time()
+
+
+for _model in (models.Departement, models.Specialite, models.Niveau, models.Groupe, models.Matiere, models.Salle):
+    model_events.subscribe(_model, invalidate)
+
+
+# ---------------- Endpoints ----------------
+def _serve(request: Request, document: Document, version: int) -> Response:
+    headers = {"ETag": document.etag, "Cache-Control": "private, no-cache", "X-Hierarchy-Version": str(version)}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or document.etag in (tag.strip() for tag in if_none_match.split(","))):
+        return Response(status_code=304, headers=headers)
+    return Response(content=document.body, media_type="application/json", headers=headers)
+
+
+@router.get("")
+async def full_tree(request: Request, db: AsyncSession = Depends(get_read_db)):
+    """
+    Departement -> Specialite -> Niveau -> (Groupes, Matieres), pre-serialised.
+    """
+    snapshot = await current(db)
+    return _serve(request, snapshot.tree, snapshot.version)
+
+
+@router.get("/salles")
+async def rooms(request: Request, db: AsyncSession = Depends(get_read_db)):
+    snapshot = await current(db)
+    return _serve(request, snapshot.salles, snapshot.version)
+
+
+@router.get("/departements/{departement_id}")
+async def departement_subtree(departement_id: int, request: Request, db: AsyncSession = Depends(get_read_db)):
+    snapshot = await current(db)
+    document = snapshot.departements.get(departement_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Département introuvable")
+    return _serve(request, document, snapshot.version)
+
+
+# ---------------- Groupes with their students ----------------
+# Not part of the snapshot: students move between groupes far more often than the tree changes.
+@router.get("/groupes/{groupe_id}", response_model=schemas.GroupeDetail)
+async def group_detail(groupe_id: int, db: AsyncSession = Depends(get_read_db), loaders: Loaders = Depends(get_loaders)):
+    groupe = await db.get(models.Groupe, groupe_id)
+    if groupe is None:
+        raise HTTPException(status_code=404, detail="Groupe introuvable")
+    etudiants = await loaders.load(groupe, models.Groupe.etudiants)
+    await loaders.load_all(etudiants, models.Etudiant.utilisateur)
+    return groupe
+
+
+@router.get("/niveaux/{niveau_id}/groupes", response_model=List[schemas.GroupeDetail])
+async def level_groups(niveau_id: int, db: AsyncSession = Depends(get_read_db), loaders: Loaders = Depends(get_loaders)):
+    """
+    Every groupe of a niveau with its students: one query per level, however many groupes and students.
+    """
+    niveau = await db.get(models.Niveau, niveau_id)
+    if niveau is None:
+        raise HTTPException(status_code=404, detail="Niveau introuvable")
+    groupes = await loaders.load(niveau, models.Niveau.groupes)
+    etudiants = await loaders.load_all(groupes, models.Groupe.etudiants)
+    await loaders.load_all(etudiants, models.Etudiant.utilisateur)
+    return groupes
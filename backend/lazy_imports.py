@@ -0,0 +1,24 @@
+import sys
+import importlib.util
+
+
+# ---------------- Deferred imports ----------------
+# Heavy optional libraries are bound at module level as usual but only executed on first
+# attribute access, so a worker that never builds a bitmap or a cube never pays for them.
+
+def lazy_module(name: str):
+    """
+    Return `name` as a module whose import runs on first attribute access.
+    Modules using it for annotations need `from __future__ import annotations`.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,139 @@
+import os
+import asyncio
+import logging
+from typing import Any, Dict, Hashable, Iterable, List, Set, Tuple
+
+from fastapi import Depends
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import InstrumentedAttribute, set_committed_value
+
+from replicas import get_read_db
+
+# ---------------- Configuration ----------------
+# Keys per IN (...) list; bigger batches are split (SQLite caps bound parameters, MySQL packet size)
+LOADER_BATCH_SIZE = int(os.getenv("LOADER_BATCH_SIZE", 500))
+
+# ---------------- Logging ----------------
+logger = logging.getLogger("loaders")
+
+
+class Loader:
+    """
+    Rows of one model looked up by one column. Every key asked for within the same event-loop
+    tick is fetched by a single SELECT ... WHERE column IN (...); results are kept for the request.
+    """
+
+    def __init__(self, owner: "Loaders", column: InstrumentedAttribute):
+        self.owner = owner
+        self.model = column.class_
+        self.column = column
+        self.results: Dict[Hashable, List[Any]] = {}
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self._scheduled = False
+
+    def load(self, key: Hashable) -> "asyncio.Future[List[Any]]":
+        future = self._pending.get(key)
+        if future is not None:
+            return future
+        future = asyncio.get_running_loop().create_future()
+        if key in self.results:
+            future.set_result(self.results[key])
+            return future
+        self._pending[key] = future
+        if not self._scheduled:
+            self._scheduled = True
+            # the keys are taken when the task first runs, so every caller woken in this tick is in
+            self.owner.spawn(self._dispatch())
+        return future
+
+    async def _dispatch(self):
+        # one query at a time on the request's session, whatever the number of loaders
+        async with self.owner.lock:
+            batch, self._pending, self._scheduled = self._pending, {}, False
+            keys = list(batch)
+            try:
+                rows: Dict[Hashable, List[Any]] = {key: [] for key in keys}
+                for start in range(0, len(keys), LOADER_BATCH_SIZE):
+                    chunk = keys[start:start + LOADER_BATCH_SIZE]
+                    query = select(self.model).where(self.column.in_(chunk)).order_by(*inspect(self.model).primary_key)
+                    self.owner.queries += 1
+                    for row in (await self.owner.db.execute(query)).scalars():
+                        rows[getattr(row, self.column.key)].append(row)
+            except Exception as e:
+                for future in batch.values():
+                    if not future.done():
+                        future.set_exception(e)
+                return
+        logger.debug(f"[loader] {self.model.__name__}.{self.column.key}: {len(keys)} keys in one batch")
+        self.results.update(rows)
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(rows[key])
+
+
+class Loaders:
+    """
+    The loaders of one request, one per (model, key column), all sharing its session.
+    Nested responses resolve level by level: every parent of a level is answered by the same
+    query, so the cost is one query per relationship level, not one per row.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.lock = asyncio.Lock()
+        self.queries = 0
+        self._loaders: Dict[Tuple[type, str], Loader] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def by(self, column: InstrumentedAttribute) -> Loader:
+        key = (column.class_, column.key)
+        loader = self._loaders.get(key)
+        if loader is None:
+            loader = self._loaders[key] = Loader(self, column)
+        return loader
+
+    def spawn(self, coroutine):
+        # keep a reference: the loop only holds weak ones
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def load(self, obj, relationship: InstrumentedAttribute):
+        """
+        `obj.<relationship>` through the batch, stored on the instance as if eagerly loaded, so
+        response schemas built with from_attributes read it without a lazy load.
+        """
+        state = inspect(obj)
+        name = relationship.key
+        if name in state.dict:
+            return state.dict[name]
+        prop = relationship.property
+        if prop.secondary is not None or len(prop.local_remote_pairs) != 1:
+            raise ValueError(f"{relationship}: only single-column foreign keys can be batched")
+        local, remote = prop.local_remote_pairs[0]
+        key = getattr(obj, prop.parent.get_property_by_column(local).key)
+        column = prop.mapper.get_property_by_column(remote).class_attribute
+        rows = await self.by(column).load(key) if key is not None else []
+        value = list(rows) if prop.uselist else (rows[0] if rows else None)
+        set_committed_value(obj, name, value)
+        return value
+
+    async def load_all(self, objs: Iterable[Any], relationship: InstrumentedAttribute) -> List[Any]:
+        """
+        The relationship loaded on every object; returns the distinct related rows, ready for the next level.
+        """
+        values = await asyncio.gather(*(self.load(obj, relationship) for obj in objs))
+        related: Dict[int, Any] = {}
+        for value in values:
+            for row in (value if isinstance(value, list) else [value] if value is not None else []):
+                related.setdefault(id(row), row)
+        return list(related.values())
+
+
+async def get_loaders(db: AsyncSession = Depends(get_read_db)) -> Loaders:
+    """
+    Request-scoped: FastAPI caches dependencies per request, so an endpoint also asking for
+    get_read_db gets the session the loaders query through.
+    """
+    return Loaders(db)
@@ -0,0 +1,404 @@
+from __future__ import annotations
+
+import os
+import time
+import uuid
+import random
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+import database
+from database import get_db
+from security import require_roles
+from lazy_imports import lazy_module
+
+aiosmtplib = lazy_module("aiosmtplib")
+
+# ---------------- Environment ----------------
+EMAIL_USER = os.getenv("EMAIL_USER")
+EMAIL_PASS = os.getenv("EMAIL_PASS")
+MAIL_FROM = os.getenv("MAIL_FROM", EMAIL_USER)
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "True").lower() in ("1", "true", "yes")
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 10))
+
+MAIL_POOL_SIZE = int(os.getenv("MAIL_POOL_SIZE", 2))
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", 50))
+MAIL_POLL_INTERVAL = float(os.getenv("MAIL_POLL_INTERVAL", 5))
+MAIL_RATE_PER_MINUTE = float(os.getenv("MAIL_RATE_PER_MINUTE", 60))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", 6))
+MAIL_BACKOFF_BASE = float(os.getenv("MAIL_BACKOFF_BASE", 30))
+MAIL_BACKOFF_MAX = float(os.getenv("MAIL_BACKOFF_MAX", 3600))
+# a "sending" row older than this belongs to a worker that died mid-batch
+MAIL_LOCK_TIMEOUT = float(os.getenv("MAIL_LOCK_TIMEOUT", 300))
+# how often a running dispatcher looks for such rows
+MAIL_RECOVER_INTERVAL = float(os.getenv("MAIL_RECOVER_INTERVAL", 60))
+
+# ---------------- Router ----------------
+router = APIRouter(
+    prefix="/admin/outbox",
+    tags=["Administration"],
+    dependencies=[Depends(require_roles("administratif"))],
+)
+
+# ---------------- Logging ----------------
+logger = logging.getLogger("mailer")
+
+
+# ---------------- Outbox Writes ----------------
+def enqueue_emails(db: AsyncSession, messages: List[Tuple[str, str, str]]):
+    """
+    Stage (to_email, subject, body) messages in the outbox as part of the caller's transaction.
+    Returns the awaitable INSERT; the caller commits and then calls dispatcher.notify().
+    """
+    now = datetime.utcnow()
+    rows = [
+        {"to_email": to, "subject": subject, "body": body, "status": "pending",
+         "attempts": 0, "next_attempt_at": now, "created_at": now}
+        for to, subject, body in messages
+    ]
+    return db.execute(insert(models.EmailOutbox), rows)
+
+
+def enqueue_email(db: AsyncSession, to_email: str, subject: str, body: str):
+    return enqueue_emails(db, [(to_email, subject, body)])
+
+
+def backoff_delay(attempts: int) -> float:
+    """
+    Exponential backoff with +/-20% jitter, capped at MAIL_BACKOFF_MAX seconds.
+    """
+    delay = min(MAIL_BACKOFF_MAX, MAIL_BACKOFF_BASE * (2 ** max(attempts - 1, 0)))
+    return delay * random.uniform(0.8, 1.2)
+
+
+# ---------------- Rate Limiting ----------------
+class RateLimiter:
+    """
+    Token bucket: `rate` sends per second with bursts of up to `burst`.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# ---------------- SMTP Connection Pool ----------------
+class SMTPConnectionPool:
+    """
+    Small pool of connected (and, when credentials exist, authenticated) SMTP sessions.
+    """
+
+    def __init__(self, hostname: str, port: int, start_tls: bool, username: Optional[str],
+                 password: Optional[str], size: int = MAIL_POOL_SIZE, timeout: float = SMTP_TIMEOUT):
+        self.hostname = hostname
+        self.port = port
+        self.start_tls = start_tls
+        self.username = username
+        self.password = password
+        self.size = size
+        self.timeout = timeout
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._created = 0
+        self.connects = 0
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        # log in only when both credentials exist (a local relay or aiosmtpd stand-in needs none)
+        authenticate = bool(self.username and self.password)
+        client = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            start_tls=self.start_tls,
+            username=self.username if authenticate else None,
+            password=self.password if authenticate else None,
+            timeout=self.timeout,
+        )
+        await client.connect()
+        self.connects += 1
+        return client
+
+    async def acquire(self) -> aiosmtplib.SMTP:
+        if self._idle.empty() and self._created < self.size:
+            self._created += 1
+            try:
+                return await self._connect()
+            except Exception:
+                self._created -= 1
+                raise
+        client = await self._idle.get()
+        if not client.is_connected:
+            try:
+                await client.connect()
+                self.connects += 1
+            except Exception:
+                self._created -= 1
+                raise
+        return client
+
+    async def release(self, client: aiosmtplib.SMTP, broken: bool = False):
+        if broken:
+            self._created -= 1
+            try:
+                client.close()
+            except Exception:
+                pass
+            return
+        self._idle.put_nowait(client)
+
+    async def close(self):
+        while not self._idle.empty():
+            client = self._idle.get_nowait()
+            try:
+                await client.quit()
+            except Exception:
+                client.close()
+        self._created = 0
+
+    def stats(self) -> dict:
+        return {"size": self.size, "open": self._created, "idle": self._idle.qsize(), "connects": self.connects}
+
+
+# ---------------- Dispatcher ----------------
+class OutboxDispatcher:
+    """
+    Background asyncio task that drains the outbox in batches over the SMTP pool.
+    """
+
+    def __init__(self, session_factory=None):
+        self.session_factory = session_factory or database.AsyncSessionLocal
+        self.pool = SMTPConnectionPool(SMTP_HOST, SMTP_PORT, SMTP_STARTTLS, EMAIL_USER, EMAIL_PASS)
+        self.limiters: Dict[str, RateLimiter] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.last_batch_at: Optional[datetime] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(MAIL_FROM)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def limiter(self) -> RateLimiter:
+        key = f"{self.pool.hostname}:{self.pool.port}"
+        if key not in self.limiters:
+            rate = MAIL_RATE_PER_MINUTE / 60
+            self.limiters[key] = RateLimiter(rate, burst=max(1, MAIL_POOL_SIZE))
+        return self.limiters[key]
+
+    def start(self):
+        if not self.enabled:
+            logger.warning("[mailer] MAIL_FROM / EMAIL_USER not configured; outbox will only queue messages.")
+            return
+        if not self.running:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run(), name="outbox-dispatcher")
+
+    def notify(self):
+        """
+        Wake the dispatcher after new messages were committed.
+        """
+        self._wakeup.set()
+
+    async def stop(self):
+        self._stopping = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.pool.close()
+
+    async def _run(self):
+        recovered_at = None
+        while not self._stopping:
+            try:
+                # rows a crashed worker left in "sending" go back to the queue while this one runs
+                if recovered_at is None or time.monotonic() - recovered_at >= MAIL_RECOVER_INTERVAL:
+                    recovered_at = time.monotonic()
+                    await self.recover_stale()
+                processed = await self.dispatch_once()
+            except Exception as e:
+                logger.exception(f"[mailer] dispatch failed: {e}")
+                processed = 0
+            if processed:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=MAIL_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def recover_stale(self):
+        """
+        Return rows stuck in "sending" by a crashed worker to the pending queue.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=MAIL_LOCK_TIMEOUT)
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(models.EmailOutbox)
+                .where(models.EmailOutbox.status == "sending", models.EmailOutbox.locked_at < cutoff)
+                .values(status="pending", lock_token=None, locked_at=None)
+            )
+            await db.commit()
+            if result.rowcount:
+                logger.info(f"[mailer] recovered {result.rowcount} stale outbox rows")
+
+    async def _claim(self, db: AsyncSession) -> List[models.EmailOutbox]:
+        now = datetime.utcnow()
+        ids = (await db.execute(
+            select(models.EmailOutbox.id)
+            .where(models.EmailOutbox.status == "pending", models.EmailOutbox.next_attempt_at <= now)
+            .order_by(models.EmailOutbox.next_attempt_at)
+            .limit(MAIL_BATCH_SIZE)
+        )).scalars().all()
+        if not ids:
+            return []
+        token = uuid.uuid4().hex
+        # the status guard makes the claim safe when several workers poll the same table
+        await db.execute(
+            update(models.EmailOutbox)
+            .where(models.EmailOutbox.id.in_(ids), models.EmailOutbox.status == "pending")
+            .values(status="sending", lock_token=token, locked_at=now)
+        )
+        await db.commit()
+        return (await db.execute(
+            select(models.EmailOutbox).where(models.EmailOutbox.lock_token == token)
+        )).scalars().all()
+
+    async def _send(self, row: models.EmailOutbox) -> Tuple[bool, Optional[str], bool]:
+        """
+        Send one message; returns (ok, error, permanent_failure).
+        """
+        message = EmailMessage()
+        message["From"] = MAIL_FROM
+        message["To"] = row.to_email
+        message["Subject"] = row.subject
+        message.set_content(row.body)
+
+        await self.limiter().acquire()
+        try:
+            client = await self.pool.acquire()
+        except aiosmtplib.errors.SMTPAuthenticationError as e:
+            return False, f"auth: {e}", False
+        except Exception as e:
+            return False, f"connect: {e}", False
+
+        try:
+            await client.send_message(message)
+        except aiosmtplib.errors.SMTPRecipientsRefused as e:
+            await self.pool.release(client)
+            return False, f"recipient refused: {e}", True
+        except (aiosmtplib.errors.SMTPServerDisconnected, aiosmtplib.errors.SMTPTimeoutError, OSError) as e:
+            await self.pool.release(client, broken=True)
+            return False, str(e), False
+        except Exception as e:
+            await self.pool.release(client)
+            return False, str(e), False
+        await self.pool.release(client)
+        return True, None, False
+
+    async def dispatch_once(self) -> int:
+        """
+        Claim one batch of due messages, send them over the pool, and record the outcomes.
+        """
+        async with self.session_factory() as db:
+            rows = await self._claim(db)
+            if not rows:
+                return 0
+
+            gate = asyncio.Semaphore(self.pool.size)
+
+            async def one(row):
+                async with gate:
+                    return await self._send(row)
+
+            outcomes = await asyncio.gather(*(one(row) for row in rows))
+
+            now = datetime.utcnow()
+            changes = []
+            for row, (ok, error, permanent) in zip(rows, outcomes):
+                attempts = row.attempts + 1
+                change = {"id": row.id, "attempts": attempts, "lock_token": None, "locked_at": None}
+                # a finished row keeps no body: activation mails carry the issued password
+                if ok:
+                    change.update(status="sent", sent_at=now, last_error=None, body=None)
+                    self.sent += 1
+                elif permanent or attempts >= MAIL_MAX_ATTEMPTS:
+                    change.update(status="failed", last_error=(error or "")[:500], body=None)
+                    self.failed += 1
+                    logger.error(f"[mailer] giving up on message {row.id} to {row.to_email}: {error}")
+                else:
+                    change.update(
+                        status="pending",
+                        last_error=(error or "")[:500],
+                        next_attempt_at=now + timedelta(seconds=backoff_delay(attempts)),
+                    )
+                    self.retried += 1
+                changes.append(change)
+
+            await db.execute(update(models.EmailOutbox), changes)
+            await db.commit()
+            self.last_batch_at = now
+            return len(rows)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "last_batch_at": self.last_batch_at,
+            "smtp_pool": self.pool.stats(),
+        }
+
+
+dispatcher = OutboxDispatcher()
+
+
+# ---------------- Status Endpoint ----------------
+@router.get("/status")
+async def outbox_status(db: AsyncSession = Depends(get_db)):
+    """
+    Outbox depth per status, age of the oldest pending message and dispatcher statistics.
+    """
+    counts = dict((await db.execute(
+        select(models.EmailOutbox.status, func.count()).group_by(models.EmailOutbox.status)
+    )).all())
+    oldest = (await db.execute(
+        select(func.min(models.EmailOutbox.created_at)).where(models.EmailOutbox.status == "pending")
+    )).scalar()
+
+    return {
+        "counts": {status: counts.get(status, 0) for status in ("pending", "sending", "sent", "failed")},
+        "oldest_pending_seconds": (datetime.utcnow() - oldest).total_seconds() if oldest else 0,
+        "dispatcher": dispatcher.stats(),
+    }
@@ -1,13 +1,116 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import os
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from sqlalchemy import text
 import database
+import hash_pool
+import mailer
+import events
+import attachments
+import replicas
 from auth import router as auth_router  
+from admin import router as admin_router
+from mailer import router as outbox_router
+from seances import router as seances_router
+from search import router as search_router
+from analytics import router as analytics_router
+from messages import router as messages_router
+from events import router as events_router
+from hierarchy import router as hierarchy_router
+from exports import router as exports_router
+from evenements import router as evenements_router
+from timetable import router as timetable_router
+from attachments import router as attachments_router
+import metrics
 from fastapi.middleware.cors import CORSMiddleware
 
+import occupancy
+import conflicts
+import hierarchy
+import user_index
+
+_IMPORT_DONE = time.perf_counter()
+
+# ---------------- Startup Configuration ----------------
+# strict: refuse to start on a schema mismatch; warn: log it and serve anyway; off: skip the check
+SCHEMA_CHECK = os.getenv("SCHEMA_CHECK", "strict")
+# Pre-open pool connections, spawn the hash workers and build the in-memory indexes before serving
+WARMUP = os.getenv("WARMUP", "false").lower() in ("1", "true", "yes")
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", 4))
+
+logger = logging.getLogger("startup")
+
+
+async def check_schema():
+    """
+    The schema is owned by Alembic (`alembic upgrade head`); a worker only checks it
+    is serving the revision its models were written for.
+    """
+    if SCHEMA_CHECK == "off":
+        return
+    revision = await database.schema_revision()
+    if revision == database.SCHEMA_REVISION:
+        return
+    message = (
+        f"[startup] database schema at {revision or 'no revision'}, code expects "
+        f"{database.SCHEMA_REVISION}: run `alembic upgrade head`"
+    )
+    if SCHEMA_CHECK == "strict":
+        raise RuntimeError(message)
+    logger.warning(message)
+
+
+async def warm_up():
+    """
+    Pay the first-request costs up front: pool connections, bcrypt worker processes,
+    and the conflict, occupancy, hierarchy and user search indexes (the first two import numpy).
+    """
+    async def ping():
+        async with database.async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    # concurrent, so the pool really holds that many connections afterwards
+    await asyncio.gather(*(ping() for _ in range(WARMUP_CONNECTIONS)))
+    await hash_pool.pool.warm_up()
+    async with database.AsyncSessionLocal() as db:
+        await conflicts.ensure_loaded(db)
+        await occupancy.ensure_loaded(db)
+        await hierarchy.current(db)
+        await user_index.ensure_loaded(db)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    await check_schema()
+    await replicas.replicas.check_all()
+    if WARMUP:
+        await warm_up()
+    mailer.dispatcher.start()
+    events.hub.start()
+    attachments.collector.start()
+    replicas.replicas.start()
+    ready = time.perf_counter()
+    logger.info(
+        f"[startup] ready in {(ready - _IMPORT_STARTED) * 1000:.0f} ms "
+        f"(imports {(_IMPORT_DONE - _IMPORT_STARTED) * 1000:.0f} ms, "
+        f"startup {(ready - started) * 1000:.0f} ms, warm-up {'on' if WARMUP else 'off'})"
+    )
+    yield
+    await attachments.collector.stop()
+    await replicas.replicas.stop()
+    await events.hub.stop()
+    await mailer.dispatcher.stop()
+    hash_pool.pool.shutdown()
+    await database.async_engine.dispose()
 
-database.Base.metadata.create_all(bind=database.engine)
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],  # React dev server
@@ -18,6 +121,25 @@ app.add_middleware(
 
 
 app.include_router(auth_router)
+app.include_router(admin_router)
+app.include_router(outbox_router)
+app.include_router(seances_router)
+app.include_router(search_router)
+app.include_router(analytics_router)
+app.include_router(messages_router)
+app.include_router(events_router)
+app.include_router(hierarchy_router)
+app.include_router(exports_router)
+app.include_router(evenements_router)
+app.include_router(timetable_router)
+app.include_router(attachments_router)
+if replicas.replicas:
+    replicas.track_writes()
+    app.add_middleware(replicas.ReadYourWritesMiddleware)
+if metrics.METRICS_ENABLED:
+    metrics.instrument_engine()
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.include_router(metrics.router)
 SECRET_KEY = os.getenv("SECRET_KEY")
 @app.get("/")
 def root():
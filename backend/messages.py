@@ -0,0 +1,200 @@
+import logging
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import case, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import attachments
+import bulk
+import models
+import schemas
+from database import get_db
+from security import Principal, get_current_user_id, require_roles
+
+# ---------------- Router ----------------
+router = APIRouter(prefix="/messages", tags=["Messages"])
+admin_only = require_roles("administratif")
+teaching_staff = require_roles("administratif", "enseignant")
+
+PAGE_SIZE = 30
+MAX_PAGE_SIZE = 100
+
+# ---------------- Logging ----------------
+logger = logging.getLogger("messages")
+
+
+# ---------------- Helpers ----------------
+async def _page(db: AsyncSession, owner_column, user_id: int, avant: Optional[int], limit: int, unread_only: bool = False) -> schemas.MessagePage:
+    """
+    Keyset page: newest first, strictly older than the `avant` cursor. One row past the
+    limit is fetched to know whether another page exists.
+    """
+    query = select(models.Message).where(owner_column == user_id)
+    if avant is not None:
+        query = query.where(models.Message.id < avant)
+    if unread_only:
+        query = query.where(models.Message.lu.is_(False))
+    rows = (await db.execute(query.order_by(models.Message.id.desc()).limit(limit + 1))).scalars().all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return schemas.MessagePage(items=rows, next_cursor=rows[-1].id if more else None)
+
+
+async def _unread(db: AsyncSession, user_id: int) -> int:
+    count = await db.scalar(
+        select(models.MessageCounter.non_lus).where(models.MessageCounter.id_utilisateur == user_id)
+    )
+    return count or 0
+
+
+# ---------------- Mailboxes ----------------
+@router.get("/recus", response_model=schemas.MessagePage)
+async def inbox(
+    avant: Optional[int] = Query(None, description="Curseur: id du dernier message de la page précédente"),
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    non_lus: bool = False,
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    return await _page(db, models.Message.id_destinataire, user_id, avant, limit, unread_only=non_lus)
+
+
+@router.get("/envoyes", response_model=schemas.MessagePage)
+async def sent_box(
+    avant: Optional[int] = Query(None, description="Curseur: id du dernier message de la page précédente"),
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    return await _page(db, models.Message.id_expediteur, user_id, avant, limit)
+
+
+@router.get("/non-lus", response_model=schemas.UnreadCount)
+async def unread_count(user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_db)):
+    """
+    Badge count: a primary-key read of the user's counter row.
+    """
+    return schemas.UnreadCount(non_lus=await _unread(db, user_id))
+
+
+# ---------------- Send / Read ----------------
+@router.post("", response_model=schemas.MessageResponse, status_code=201)
+async def send_message(
+    req: schemas.MessageCreate,
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Store the message and bump the recipient's unread counter in the same transaction.
+    """
+    if await db.get(models.Utilisateur, req.id_destinataire) is None:
+        raise HTTPException(status_code=404, detail="Destinataire introuvable")
+
+    message = models.Message(
+        id_expediteur=user_id,
+        id_destinataire=req.id_destinataire,
+        contenu=req.contenu,
+        date=date.today(),
+        lu=False,
+    )
+    db.add(message)
+    try:
+        await db.execute(bulk.increment(
+            models.MessageCounter.__table__, ("id_utilisateur",), "non_lus",
+            [{"id_utilisateur": req.id_destinataire, "non_lus": 1}],
+        ))
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.exception(f"[send_message] DB commit failed: {e}")
+        raise HTTPException(status_code=500, detail="Envoi du message impossible")
+    return message
+
+
+async def _mark_read(db: AsyncSession, user_id: int, ids: Optional[list]) -> schemas.MarkReadReport:
+    """
+    Flip unread messages to read and subtract exactly the rows that changed, so
+    concurrent reads of the same message decrement the counter once.
+    """
+    query = update(models.Message).where(
+        models.Message.id_destinataire == user_id, models.Message.lu.is_(False),
+    )
+    if ids is not None:
+        query = query.where(models.Message.id.in_(ids))
+    marked = (await db.execute(query.values(lu=True).execution_options(synchronize_session=False))).rowcount
+
+    counter = models.MessageCounter
+    # "read all" too: a message delivered after the UPDATE above is still unread and counted
+    if marked:
+        await db.execute(
+            update(counter).where(counter.id_utilisateur == user_id)
+            .values(non_lus=case((counter.non_lus > marked, counter.non_lus - marked), else_=0))
+        )
+    remaining = await _unread(db, user_id)
+    await db.commit()
+    return schemas.MarkReadReport(marques=marked, non_lus=remaining)
+
+
+@router.put("/{message_id}/lu", response_model=schemas.MarkReadReport)
+async def mark_one_read(message_id: int, user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_db)):
+    return await _mark_read(db, user_id, [message_id])
+
+
+@router.post("/lu", response_model=schemas.MarkReadReport)
+async def mark_read(req: schemas.MarkReadRequest, user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_db)):
+    """
+    Mark the given messages (or the whole inbox when `ids` is omitted) as read.
+    """
+    return await _mark_read(db, user_id, req.ids)
+
+
+# ---------------- Teacher absence notices ----------------
+@router.post("/absences-enseignant", response_model=schemas.MessEnsAbsResponse, status_code=201)
+async def notify_teacher_absence(
+    req: schemas.MessEnsAbsCreate,
+    principal: Principal = Depends(teaching_staff),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    A teacher tells their chef about an absence; the chef is notified live through /events.
+    """
+    if not principal.has_role("administratif") and req.id_enseignant != principal.id:
+        raise HTTPException(status_code=403, detail="Accès refusé")
+    if await db.get(models.Chef, req.id_chef) is None:
+        raise HTTPException(status_code=404, detail="Chef introuvable")
+
+    notice = models.MessEnsAbs(**req.model_dump())
+    db.add(notice)
+    await attachments.retain(db, req.file_path)
+    try:
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.exception(f"[notify_teacher_absence] DB commit failed: {e}")
+        raise HTTPException(status_code=400, detail="Enseignant ou séance invalide")
+    return notice
+
+
+# ---------------- Maintenance ----------------
+@router.post("/non-lus/recalcul", dependencies=[Depends(admin_only)])
+async def rebuild_counters(db: AsyncSession = Depends(get_db)):
+    """
+    Recompute every unread counter with one GROUP BY, e.g. after the table was written
+    outside this API or when the counters are first introduced.
+    """
+    counts = (await db.execute(
+        select(models.Message.id_destinataire, func.count())
+        .where(models.Message.lu.is_(False))
+        .group_by(models.Message.id_destinataire)
+    )).all()
+    await db.execute(update(models.MessageCounter).values(non_lus=0))
+    if counts:
+        await db.execute(bulk.upsert(
+            models.MessageCounter.__table__, ("id_utilisateur",), ("non_lus",),
+            values=[{"id_utilisateur": user_id, "non_lus": n} for user_id, n in counts],
+        ))
+    await db.commit()
+    logger.info(f"[rebuild_counters] {len(counts)} counters rebuilt")
+    return {"utilisateurs": len(counts)}
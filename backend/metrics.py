@@ -0,0 +1,341 @@
+import os
+import hmac
+import time
+import bisect
+import logging
+import contextvars
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event, func, select
+
+import models
+import database
+import hash_pool
+import mailer
+import events
+import throttle
+import timetable
+import replicas
+import user_index
+
+# ---------------- Configuration ----------------
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# /metrics requires "Authorization: Bearer <METRICS_TOKEN>"; while it is unset the endpoint
+# answers 404 (collection still runs, nothing is exposed)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") or None
+# Long-lived streams would only add noise to the latency histograms
+METRICS_EXCLUDED_ROUTES = set(filter(None, os.getenv("METRICS_EXCLUDED_ROUTES", "/metrics,/events/stream").split(",")))
+# Opt-in: requests slower than this are logged with the SQL they ran (0 = off, nothing captured)
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", 0))
+SLOW_REQUEST_MAX_STATEMENTS = int(os.getenv("SLOW_REQUEST_MAX_STATEMENTS", 50))
+SLOW_REQUEST_SQL_CHARS = int(os.getenv("SLOW_REQUEST_SQL_CHARS", 500))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# ---------------- Router ----------------
+router = APIRouter(tags=["Metrics"])
+
+# ---------------- Logging ----------------
+logger = logging.getLogger("metrics")
+slow_logger = logging.getLogger("slow_requests")
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+# ---------------- Metric types ----------------
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, labels: Labels = ()):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Per-bucket counts are kept non-cumulative (one increment per observation) and summed at render time.
+    """
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float], labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self.series: Dict[Labels, list] = {}
+
+    def observe(self, value: float, labels: Labels = ()):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        for labels, (counts, total) in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(names, labels + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+def gauge(name: str, help: str, samples: List[Tuple[dict, float]], kind: str = "gauge") -> List[str]:
+    """
+    Render a metric whose values are read at scrape time from the component that owns them.
+    """
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}")
+    return lines
+
+
+# ---------------- Metrics ----------------
+ROUTE_LABELS = ("method", "route", "status")
+
+request_latency = Histogram(
+    "http_request_duration_seconds", "Request latency by route template.", LATENCY_BUCKETS, ROUTE_LABELS,
+)
+request_statements = Histogram(
+    "http_request_db_statements", "SQL statements executed per request.", STATEMENT_BUCKETS, ("method", "route"),
+)
+request_db_time = Histogram(
+    "http_request_db_duration_seconds", "Time spent in SQL per request.", LATENCY_BUCKETS, ("method", "route"),
+)
+db_statements = Counter("db_statements_total", "SQL statements executed (all callers).")
+db_time = Counter("db_statement_duration_seconds_total", "Time spent executing SQL (all callers).")
+pool_wait = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.", (0.001,) + LATENCY_BUCKETS,
+)
+slow_requests = Counter("http_slow_requests_total", "Requests over SLOW_REQUEST_MS.", ("method", "route"))
+
+
+# ---------------- Request context ----------------
+class RequestStats:
+    __slots__ = ("statements", "db_seconds", "queries")
+
+    def __init__(self, capture: bool):
+        self.statements = 0
+        self.db_seconds = 0.0
+        # only allocated when the slow-request log is on
+        self.queries: Optional[List[Tuple[float, str]]] = [] if capture else None
+
+
+_current: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["metrics_started"].pop()
+    db_statements.inc()
+    db_time.inc(elapsed)
+    stats = _current.get()
+    if stats is None:
+        return
+    stats.statements += 1
+    stats.db_seconds += elapsed
+    if stats.queries is not None and len(stats.queries) < SLOW_REQUEST_MAX_STATEMENTS:
+        stats.queries.append((elapsed, statement[:SLOW_REQUEST_SQL_CHARS]))
+
+
+def _handle_error(exception_context):
+    # a failed statement never reaches after_cursor_execute
+    started = exception_context.connection.info.get("metrics_started") if exception_context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def instrument_engine():
+    """
+    Statement counting on the primary and replica engines (the greenlet bridge shares the request's context)
+    and checkout-wait timing on its pool.
+    """
+    for engine in [database.async_engine] + [r.engine for r in replicas.replicas.replicas]:
+        target = engine.sync_engine
+        event.listen(target, "before_cursor_execute", _before_cursor_execute)
+        event.listen(target, "after_cursor_execute", _after_cursor_execute)
+        event.listen(target, "handle_error", _handle_error)
+    database.pool_wait_observer = pool_wait.observe
+
+
+# ---------------- Middleware ----------------
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (streams pass through untouched): latency, status and per-request
+    SQL totals, labelled by route template so path parameters do not explode cardinality.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats(capture=SLOW_REQUEST_MS > 0)
+        token = _current.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            if route not in METRICS_EXCLUDED_ROUTES:
+                method = scope["method"]
+                request_latency.observe(elapsed, (method, route, str(status)))
+                request_statements.observe(stats.statements, (method, route))
+                request_db_time.observe(stats.db_seconds, (method, route))
+                if SLOW_REQUEST_MS > 0 and elapsed * 1000 >= SLOW_REQUEST_MS:
+                    _log_slow(method, scope.get("path", route), status, elapsed, stats)
+                    slow_requests.inc(labels=(method, route))
+
+
+def _log_slow(method: str, path: str, status: int, elapsed: float, stats: RequestStats):
+    lines = [
+        f"[slow] {method} {path} -> {status} in {elapsed * 1000:.0f} ms, "
+        f"{stats.statements} statements, {stats.db_seconds * 1000:.0f} ms in SQL"
+    ]
+    for duration, statement in stats.queries or ():
+        lines.append(f"  {duration * 1000:8.1f} ms  {' '.join(statement.split())}")
+    if stats.statements > len(stats.queries or ()):
+        lines.append(f"  ... {stats.statements - len(stats.queries or ())} more")
+    slow_logger.warning("\n".join(lines))
+
+
+# ---------------- Scrape-time collectors ----------------
+def _pool_lines() -> List[str]:
+    pool = database.async_engine.pool
+    samples = {}
+    for name, attribute in (("size", "size"), ("checked_out", "checkedout"), ("checked_in", "checkedin"), ("overflow", "overflow")):
+        reader = getattr(pool, attribute, None)
+        if callable(reader):
+            samples[name] = reader()
+    lines = []
+    for name, value in samples.items():
+        lines += gauge(f"db_pool_{name}", f"Connection pool {name.replace('_', ' ')}.", [({}, value)])
+    return lines + pool_wait.render()
+
+
+def _hash_pool_lines() -> List[str]:
+    pool = hash_pool.pool
+    return (
+        gauge("hash_pool_workers", "bcrypt worker processes.", [({}, pool.workers)])
+        + gauge("hash_pool_in_flight", "bcrypt jobs running or queued.", [({}, pool.in_flight)])
+        + gauge("hash_pool_jobs_total", "bcrypt jobs completed.", [({}, pool.completed)], "counter")
+        + gauge("hash_pool_rejected_total", "bcrypt jobs shed with 503.", [({}, pool.rejected)], "counter")
+        + gauge("hash_pool_busy_seconds_total", "Time workers spent hashing.", [({}, pool.busy_seconds)], "counter")
+        + gauge("hash_pool_wait_seconds_total", "Time jobs waited for a worker.", [({}, pool.wait_seconds_total)], "counter")
+    )
+
+
+async def _outbox_lines() -> List[str]:
+    async with database.AsyncSessionLocal() as db:
+        counts = (await db.execute(
+            select(models.EmailOutbox.status, func.count()).group_by(models.EmailOutbox.status)
+        )).all()
+    dispatcher = mailer.dispatcher
+    return (
+        gauge("email_outbox_messages", "Outbox rows by status.", [({"status": status}, n) for status, n in counts])
+        + gauge("email_sent_total", "Emails delivered by this worker.", [({}, dispatcher.sent)], "counter")
+        + gauge("email_retried_total", "Email deliveries rescheduled.", [({}, dispatcher.retried)], "counter")
+        + gauge("email_failed_total", "Emails given up on.", [({}, dispatcher.failed)], "counter")
+    )
+
+
+def _misc_lines() -> List[str]:
+    hub = events.hub.stats()
+    login = throttle.login.stats()
+    weeks = timetable.stats()
+    reads = replicas.replicas.stats()
+    users = user_index.stats()
+    return (
+        gauge("sse_connections", "Open event streams.", [({}, hub["connections"])])
+        + gauge("sse_dropped_total", "Streams closed for falling behind.", [({}, hub["dropped"])], "counter")
+        + gauge("login_throttle_keys", "Keys tracked by the signin throttle.", [({}, login["keys"])])
+        + gauge(
+            "login_throttle_rejected_total", "Signin attempts refused before lookup.",
+            [({"reason": reason}, n) for reason, n in login["rejected"].items()], "counter",
+        )
+        + gauge("timetable_cached_weeks", "Timetable weeks held in memory.", [({}, weeks["weeks"])])
+        + gauge("timetable_builds_total", "Timetable weeks built from the database.", [({}, weeks["builds"])], "counter")
+        + gauge(
+            "timetable_lookups_total", "Timetable cache lookups.",
+            [({"result": "hit"}, weeks["hits"]), ({"result": "miss"}, weeks["misses"])], "counter",
+        )
+        + gauge("db_replica_healthy", "Read replica in rotation (1) or down (0).", [({"replica": r["name"]}, int(r["healthy"])) for r in reads["replicas"]])
+        + gauge("db_replica_sessions", "Read sessions open on the replica.", [({"replica": r["name"]}, r["in_flight"]) for r in reads["replicas"]])
+        + gauge("db_replica_sessions_total", "Read sessions served by the replica.", [({"replica": r["name"]}, r["served"]) for r in reads["replicas"]], "counter")
+        + gauge("db_replica_fallbacks_total", "Read sessions sent to the primary because their replica was down.", [({}, reads["fallbacks"])], "counter")
+        + gauge("user_index_users", "Users held by the search index.", [({}, users["users"])])
+        + gauge("user_index_builds_total", "Full rebuilds of the user search index.", [({}, users["builds"])], "counter")
+    )
+
+
+async def render() -> str:
+    lines: List[str] = []
+    for metric in (request_latency, request_statements, request_db_time, db_statements, db_time, slow_requests):
+        lines += metric.render()
+    lines += _pool_lines()
+    lines += _hash_pool_lines()
+    try:
+        lines += await _outbox_lines()
+    except Exception as e:
+        # a database outage must not take the metrics of everything else down with it
+        logger.warning(f"[metrics] outbox depth unavailable: {e}")
+    lines += _misc_lines()
+    return "\n".join(lines) + "\n"
+
+
+# ---------------- Endpoint ----------------
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics(request: Request):
+    """
+    Prometheus text exposition format (0.0.4).
+    """
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get("authorization", "").encode(), f"Bearer {METRICS_TOKEN}".encode()):
+        raise HTTPException(status_code=401, detail="Jeton invalide", headers={"WWW-Authenticate": "Bearer"})
+    return PlainTextResponse(await render(), media_type="text/plain; version=0.0.4; charset=utf-8")
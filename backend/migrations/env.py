@@ -0,0 +1,46 @@
+from logging.config import fileConfig
+
+from alembic import context
+
+import database
+import models  # noqa: F401  registers every table on database.Base.metadata
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = database.Base.metadata
+
+
+def run_migrations_offline() -> None:
+    """
+    Emit SQL to stdout instead of executing it (alembic upgrade head --sql).
+    """
+    context.configure(
+        url=database.DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    with database.engine.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            # SQLite can only ALTER through table copies; batch mode is a no-op elsewhere
+            render_as_batch=True,
+            compare_type=True,
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,284 @@
+"""baseline schema
+
+Tables as main.py used to create them with create_all. A database created that way
+is brought under migration control with `alembic stamp 0001` then `alembic upgrade head`.
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 17:15:38.001721
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('salle',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('numero', sa.String(length=50), nullable=False),
+    sa.Column('type', sa.String(length=100), nullable=False),
+    sa.Column('capacite', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('salle', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_salle_id'), ['id'], unique=False)
+
+    op.create_table('utilisateur',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('nom', sa.String(length=50), nullable=False),
+    sa.Column('prenom', sa.String(length=50), nullable=False),
+    sa.Column('email', sa.String(length=100), nullable=False),
+    sa.Column('cin', sa.Integer(), nullable=False),
+    sa.Column('telp', sa.String(length=20), nullable=True),
+    sa.Column('image', sa.String(length=255), nullable=True),
+    sa.Column('mdp_hash', sa.String(length=255), nullable=True),
+    sa.Column('role', sa.String(length=20), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('cin'),
+    sa.UniqueConstraint('email')
+    )
+    with op.batch_alter_table('utilisateur', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_utilisateur_id'), ['id'], unique=False)
+
+    op.create_table('administratif',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('poste', sa.String(length=100), nullable=True),
+    sa.ForeignKeyConstraint(['id'], ['utilisateur.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('enseignant',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['id'], ['utilisateur.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('message',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('id_expediteur', sa.Integer(), nullable=False),
+    sa.Column('id_destinataire', sa.Integer(), nullable=False),
+    sa.Column('contenu', sa.String(length=1000), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.ForeignKeyConstraint(['id_destinataire'], ['utilisateur.id'], ),
+    sa.ForeignKeyConstraint(['id_expediteur'], ['utilisateur.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_message_id'), ['id'], unique=False)
+
+    op.create_table('chef',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date_nomination', sa.String(length=50), nullable=True),
+    sa.ForeignKeyConstraint(['id'], ['enseignant.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('evenement',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('titre', sa.String(length=255), nullable=False),
+    sa.Column('type', sa.String(length=50), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('description', sa.String(length=1000), nullable=True),
+    sa.Column('created_by_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['created_by_id'], ['administratif.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('evenement', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_evenement_id'), ['id'], unique=False)
+
+    op.create_table('departement',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('nom', sa.String(length=100), nullable=False),
+    sa.Column('id_chef', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['id_chef'], ['chef.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('nom')
+    )
+    with op.batch_alter_table('departement', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_departement_id'), ['id'], unique=False)
+
+    op.create_table('evenement_enseignants',
+    sa.Column('evenement_id', sa.Integer(), nullable=False),
+    sa.Column('enseignant_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['enseignant_id'], ['enseignant.id'], ),
+    sa.ForeignKeyConstraint(['evenement_id'], ['evenement.id'], ),
+    sa.PrimaryKeyConstraint('evenement_id', 'enseignant_id')
+    )
+    op.create_table('specialite',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('nom', sa.String(length=100), nullable=False),
+    sa.Column('id_departement', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['id_departement'], ['departement.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('specialite', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_specialite_id'), ['id'], unique=False)
+
+    op.create_table('niveau',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('nom', sa.String(length=50), nullable=False),
+    sa.Column('id_specialite', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['id_specialite'], ['specialite.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('niveau', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_niveau_id'), ['id'], unique=False)
+
+    op.create_table('groupe',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('nom', sa.String(length=50), nullable=False),
+    sa.Column('id_niveau', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['id_niveau'], ['niveau.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('groupe', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_groupe_id'), ['id'], unique=False)
+
+    op.create_table('matiere',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('nom', sa.String(length=100), nullable=False),
+    sa.Column('id_niveau', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['id_niveau'], ['niveau.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('matiere', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_matiere_id'), ['id'], unique=False)
+
+    op.create_table('etudiant',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('id_groupe', sa.Integer(), nullable=True),
+    sa.Column('id_specialite', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['id'], ['utilisateur.id'], ),
+    sa.ForeignKeyConstraint(['id_groupe'], ['groupe.id'], ),
+    sa.ForeignKeyConstraint(['id_specialite'], ['specialite.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('seance',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('day_of_week', sa.Integer(), nullable=True),
+    sa.Column('specific_date', sa.Date(), nullable=True),
+    sa.Column('heure_debut', sa.Time(), nullable=False),
+    sa.Column('heure_fin', sa.Time(), nullable=False),
+    sa.Column('id_salle', sa.Integer(), nullable=False),
+    sa.Column('id_matiere', sa.Integer(), nullable=False),
+    sa.Column('id_groupe', sa.Integer(), nullable=False),
+    sa.Column('id_enseignant', sa.Integer(), nullable=False),
+    sa.Column('created_by', sa.Integer(), nullable=True),
+    sa.Column('is_presente', sa.Boolean(), nullable=True),
+    sa.ForeignKeyConstraint(['created_by'], ['utilisateur.id'], ),
+    sa.ForeignKeyConstraint(['id_enseignant'], ['enseignant.id'], ),
+    sa.ForeignKeyConstraint(['id_groupe'], ['groupe.id'], ),
+    sa.ForeignKeyConstraint(['id_matiere'], ['matiere.id'], ),
+    sa.ForeignKeyConstraint(['id_salle'], ['salle.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('seance', schema=None) as batch_op:
+        batch_op.create_index('ix_seance_enseignant_day', ['id_enseignant', 'day_of_week'], unique=False)
+        batch_op.create_index('ix_seance_groupe_day', ['id_groupe', 'day_of_week'], unique=False)
+        batch_op.create_index(batch_op.f('ix_seance_id'), ['id'], unique=False)
+        batch_op.create_index('ix_seance_salle_day', ['id_salle', 'day_of_week'], unique=False)
+        batch_op.create_index('ix_seance_specific_date', ['specific_date'], unique=False)
+
+    op.create_table('absence',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('id_etudiant', sa.Integer(), nullable=False),
+    sa.Column('id_seance', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('statut', sa.String(length=20), nullable=False),
+    sa.ForeignKeyConstraint(['id_etudiant'], ['etudiant.id'], ),
+    sa.ForeignKeyConstraint(['id_seance'], ['seance.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('absence', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_absence_id'), ['id'], unique=False)
+
+    op.create_table('evenement_etudiants',
+    sa.Column('evenement_id', sa.Integer(), nullable=False),
+    sa.Column('etudiant_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['etudiant_id'], ['etudiant.id'], ),
+    sa.ForeignKeyConstraint(['evenement_id'], ['evenement.id'], ),
+    sa.PrimaryKeyConstraint('evenement_id', 'etudiant_id')
+    )
+    op.create_table('mess_ens_abs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('id_enseignant', sa.Integer(), nullable=False),
+    sa.Column('id_chef', sa.Integer(), nullable=False),
+    sa.Column('id_seance', sa.Integer(), nullable=True),
+    sa.Column('contenu', sa.String(length=1000), nullable=False),
+    sa.Column('file_path', sa.String(length=255), nullable=True),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.ForeignKeyConstraint(['id_chef'], ['chef.id'], ),
+    sa.ForeignKeyConstraint(['id_enseignant'], ['enseignant.id'], ),
+    sa.ForeignKeyConstraint(['id_seance'], ['seance.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('mess_ens_abs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_mess_ens_abs_id'), ['id'], unique=False)
+
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('mess_ens_abs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_mess_ens_abs_id'))
+
+    op.drop_table('mess_ens_abs')
+    op.drop_table('evenement_etudiants')
+    with op.batch_alter_table('absence', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_absence_id'))
+
+    op.drop_table('absence')
+    with op.batch_alter_table('seance', schema=None) as batch_op:
+        batch_op.drop_index('ix_seance_specific_date')
+        batch_op.drop_index('ix_seance_salle_day')
+        batch_op.drop_index(batch_op.f('ix_seance_id'))
+        batch_op.drop_index('ix_seance_groupe_day')
+        batch_op.drop_index('ix_seance_enseignant_day')
+
+    op.drop_table('seance')
+    op.drop_table('etudiant')
+    with op.batch_alter_table('matiere', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_matiere_id'))
+
+    op.drop_table('matiere')
+    with op.batch_alter_table('groupe', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_groupe_id'))
+
+    op.drop_table('groupe')
+    with op.batch_alter_table('niveau', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_niveau_id'))
+
+    op.drop_table('niveau')
+    with op.batch_alter_table('specialite', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_specialite_id'))
+
+    op.drop_table('specialite')
+    op.drop_table('evenement_enseignants')
+    with op.batch_alter_table('departement', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_departement_id'))
+
+    op.drop_table('departement')
+    with op.batch_alter_table('evenement', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_evenement_id'))
+
+    op.drop_table('evenement')
+    op.drop_table('chef')
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_message_id'))
+
+    op.drop_table('message')
+    op.drop_table('enseignant')
+    op.drop_table('administratif')
+    with op.batch_alter_table('utilisateur', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_utilisateur_id'))
+
+    op.drop_table('utilisateur')
+    with op.batch_alter_table('salle', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_salle_id'))
+
+    op.drop_table('salle')
@@ -0,0 +1,88 @@
+"""email outbox, absence/message indexes, unread counters
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 17:15:42.153301
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('email_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('to_email', sa.String(length=100), nullable=False),
+    sa.Column('subject', sa.String(length=255), nullable=False),
+    sa.Column('body', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('last_error', sa.String(length=500), nullable=True),
+    sa.Column('lock_token', sa.String(length=32), nullable=True),
+    sa.Column('locked_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('email_outbox', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_email_outbox_id'), ['id'], unique=False)
+        batch_op.create_index('ix_email_outbox_lock_token', ['lock_token'], unique=False)
+        batch_op.create_index('ix_email_outbox_status_next', ['status', 'next_attempt_at'], unique=False)
+
+    op.create_table('message_counter',
+    sa.Column('id_utilisateur', sa.Integer(), nullable=False),
+    sa.Column('non_lus', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['id_utilisateur'], ['utilisateur.id'], ),
+    sa.PrimaryKeyConstraint('id_utilisateur')
+    )
+    # roll calls upsert on (etudiant, seance, date): keep the latest row of any duplicates first
+    op.execute(
+        "DELETE FROM absence WHERE id NOT IN ("
+        " SELECT keep FROM (SELECT MAX(id) AS keep FROM absence GROUP BY id_etudiant, id_seance, date) AS latest"
+        ")"
+    )
+    with op.batch_alter_table('absence', schema=None) as batch_op:
+        batch_op.create_index('ix_absence_date_statut', ['date', 'statut'], unique=False)
+        batch_op.create_index('ix_absence_etudiant_date', ['id_etudiant', 'date'], unique=False)
+        batch_op.create_index('ix_absence_seance_date', ['id_seance', 'date'], unique=False)
+        batch_op.create_unique_constraint('uq_absence_etudiant_seance_date', ['id_etudiant', 'id_seance', 'date'])
+
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('lu', sa.Boolean(), server_default=sa.text('0'), nullable=False))
+        batch_op.create_index('ix_message_destinataire_id', ['id_destinataire', 'id'], unique=False)
+        batch_op.create_index('ix_message_expediteur_id', ['id_expediteur', 'id'], unique=False)
+
+    # messages sent before read tracking existed count as read, so badges start at zero
+    op.execute("UPDATE message SET lu = 1")
+
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.drop_index('ix_message_expediteur_id')
+        batch_op.drop_index('ix_message_destinataire_id')
+        batch_op.drop_column('lu')
+
+    with op.batch_alter_table('absence', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_absence_etudiant_seance_date', type_='unique')
+        batch_op.drop_index('ix_absence_seance_date')
+        batch_op.drop_index('ix_absence_etudiant_date')
+        batch_op.drop_index('ix_absence_date_statut')
+
+    op.drop_table('message_counter')
+    with op.batch_alter_table('email_outbox', schema=None) as batch_op:
+        batch_op.drop_index('ix_email_outbox_status_next')
+        batch_op.drop_index('ix_email_outbox_lock_token')
+        batch_op.drop_index(batch_op.f('ix_email_outbox_id'))
+
+    op.drop_table('email_outbox')
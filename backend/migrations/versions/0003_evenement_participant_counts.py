@@ -0,0 +1,39 @@
+"""evenement participant counts and date index
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 17:52:10.418235
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('evenement', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('nb_etudiants', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('nb_enseignants', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_evenement_date', ['date'], unique=False)
+
+    # registrations made before the counters existed
+    op.execute(
+        "UPDATE evenement SET "
+        "nb_etudiants = (SELECT COUNT(*) FROM evenement_etudiants WHERE evenement_etudiants.evenement_id = evenement.id), "
+        "nb_enseignants = (SELECT COUNT(*) FROM evenement_enseignants WHERE evenement_enseignants.evenement_id = evenement.id)"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('evenement', schema=None) as batch_op:
+        batch_op.drop_index('ix_evenement_date')
+        batch_op.drop_column('nb_enseignants')
+        batch_op.drop_column('nb_etudiants')
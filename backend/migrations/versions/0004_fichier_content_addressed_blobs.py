@@ -0,0 +1,39 @@
+"""fichier content-addressed blobs
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 17:35:59.853003
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'fichier',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('taille', sa.BigInteger(), nullable=False),
+        sa.Column('content_type', sa.String(length=100), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('nb_references', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('orphelin_depuis', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('sha256'),
+    )
+    with op.batch_alter_table('fichier', schema=None) as batch_op:
+        batch_op.create_index('ix_fichier_orphelin_depuis', ['orphelin_depuis'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('fichier', schema=None) as batch_op:
+        batch_op.drop_index('ix_fichier_orphelin_depuis')
+    op.drop_table('fichier')
@@ -0,0 +1,33 @@
+"""jeton calendrier: revocable calendar feed secrets
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 21:04:37.512940
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'jeton_calendrier',
+        sa.Column('id_utilisateur', sa.Integer(), nullable=False),
+        sa.Column('secret', sa.String(length=64), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['id_utilisateur'], ['utilisateur.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id_utilisateur'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('jeton_calendrier')
@@ -0,0 +1,31 @@
+"""email outbox: clear the body of finished messages
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 22:41:09.207355
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('email_outbox', schema=None) as batch_op:
+        batch_op.alter_column('body', existing_type=sa.Text(), nullable=True)
+    # activation mails carry plaintext passwords: drop the ones already delivered or abandoned
+    op.execute("UPDATE email_outbox SET body = NULL WHERE status IN ('sent', 'failed')")
+
+
+def downgrade() -> None:
+    op.execute("UPDATE email_outbox SET body = '' WHERE body IS NULL")
+    with op.batch_alter_table('email_outbox', schema=None) as batch_op:
+        batch_op.alter_column('body', existing_type=sa.Text(), nullable=False)
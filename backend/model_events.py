@@ -0,0 +1,105 @@
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, List
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+# ---------------- Commit-time change notifications ----------------
+# In-process caches (conflict index, occupancy bitmaps, snapshots...) subscribe here to hear
+# about ORM inserts/updates/deletes once the transaction that made them has committed.
+
+ChangeCallback = Callable[[List[dict], List[dict]], None]
+InsertCallback = Callable[[List[dict]], None]
+
+_subscribers: Dict[type, List[ChangeCallback]] = defaultdict(list)
+_insert_subscribers: Dict[type, List[InsertCallback]] = defaultdict(list)
+
+_INFO_KEY = "model_events.pending"
+
+# ---------------- Logging ----------------
+logger = logging.getLogger("model_events")
+
+
+def subscribe(model: type, callback: ChangeCallback):
+    """
+    Call callback(upserted, deleted) after each commit touching `model`.
+    Rows are plain dicts of column values captured at flush time.
+    """
+    _subscribers[model].append(callback)
+
+
+def subscribe_inserts(model: type, callback: InsertCallback):
+    """
+    Call callback(inserted) after each commit that created rows of `model`
+    (notifications about new rows, as opposed to cache maintenance).
+    """
+    _insert_subscribers[model].append(callback)
+
+
+def _watched(obj) -> bool:
+    return type(obj) in _subscribers or type(obj) in _insert_subscribers
+
+
+def snapshot(obj) -> dict:
+    return {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs}
+
+
+def _primary_key(obj):
+    # inspect(obj).identity is only set once the flush is over, so rows inserted by this flush
+    # would all share the key None; their primary key attributes are already populated here
+    key = tuple(inspect(obj).mapper.primary_key_from_instance(obj))
+    return key if None not in key else ("object", id(obj))
+
+
+@event.listens_for(Session, "after_flush")
+def _collect(session: Session, flush_context):
+    pending = session.info.get(_INFO_KEY)
+    for action, objects in (("insert", session.new), ("update", session.dirty)):
+        for obj in objects:
+            if not _watched(obj):
+                continue
+            if pending is None:
+                pending = session.info[_INFO_KEY] = {}
+            key = (type(obj), _primary_key(obj))
+            previous = pending.get(key)
+            # a row inserted then updated within one transaction is still an insert
+            kind = "insert" if previous is not None and previous[0] == "insert" else action
+            pending[key] = (kind, snapshot(obj))
+    for obj in session.deleted:
+        if not _watched(obj):
+            continue
+        if pending is None:
+            pending = session.info[_INFO_KEY] = {}
+        pending[(type(obj), _primary_key(obj))] = ("delete", snapshot(obj))
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch(session: Session):
+    pending = session.info.pop(_INFO_KEY, None)
+    if not pending:
+        return
+    grouped: Dict[type, tuple] = {}
+    for (model, _), (action, row) in pending.items():
+        upserted, deleted, inserted = grouped.setdefault(model, ([], [], []))
+        if action == "delete":
+            deleted.append(row)
+        else:
+            upserted.append(row)
+            if action == "insert":
+                inserted.append(row)
+    for model, (upserted, deleted, inserted) in grouped.items():
+        calls = [(callback, (upserted, deleted)) for callback in _subscribers.get(model, ())]
+        if inserted:
+            calls += [(callback, (inserted,)) for callback in _insert_subscribers.get(model, ())]
+        for callback, args in calls:
+            try:
+                callback(*args)
+            except Exception as e:
+                # a cache refresh must never fail a commit that already happened
+                logger.exception(f"[model_events] {callback.__qualname__} failed for {model.__name__}: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session: Session):
+    session.info.pop(_INFO_KEY, None)
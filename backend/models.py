@@ -1,5 +1,5 @@
-from sqlalchemy import Index
-from sqlalchemy import Column, Integer, String, Date, Time, ForeignKey, Boolean, PrimaryKeyConstraint
+from sqlalchemy import Index, false
+from sqlalchemy import BigInteger, Column, Integer, String, Date, DateTime, Text, Time, ForeignKey, Boolean, PrimaryKeyConstraint, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy import Table, Column, Integer, String, Date, ForeignKey
 from sqlalchemy.orm import relationship
@@ -187,6 +187,14 @@ class Absence(Base):
     etudiant = relationship("Etudiant")
     seance = relationship("Seance", back_populates="absences")
 
+    __table_args__ = (
+        # one status per student, seance and day: roll calls upsert on this key
+        UniqueConstraint('id_etudiant', 'id_seance', 'date', name='uq_absence_etudiant_seance_date'),
+        Index('ix_absence_etudiant_date', 'id_etudiant', 'date'),
+        Index('ix_absence_seance_date', 'id_seance', 'date'),
+        Index('ix_absence_date_statut', 'date', 'statut'),
+    )
+
 class Message(Base):
     __tablename__ = "message"
 
@@ -196,10 +204,27 @@ class Message(Base):
 
     contenu = Column(String(1000), nullable=False)
     date = Column(Date, nullable=False)
+    lu = Column(Boolean, nullable=False, default=False, server_default=false())
 
     expediteur = relationship("Utilisateur", foreign_keys=[id_expediteur])
     destinataire = relationship("Utilisateur", foreign_keys=[id_destinataire])
 
+    __table_args__ = (
+        # keyset pagination: WHERE owner = ? AND id < cursor ORDER BY id DESC
+        Index('ix_message_destinataire_id', 'id_destinataire', 'id'),
+        Index('ix_message_expediteur_id', 'id_expediteur', 'id'),
+    )
+
+
+class MessageCounter(Base):
+    """
+    Per-user unread message count, maintained on send and read so the badge is a primary-key read.
+    """
+    __tablename__ = "message_counter"
+
+    id_utilisateur = Column(Integer, ForeignKey("utilisateur.id"), primary_key=True)
+    non_lus = Column(Integer, nullable=False, default=0)
+
 
 
 # Association table for students registering for events
@@ -230,10 +255,19 @@ class Evenement(Base):
     created_by_id = Column(Integer, ForeignKey("administratif.id"), nullable=False)
     created_by = relationship("Administratif", backref="evenements_created")
 
+    # Participant counts, maintained by the registration endpoints in the same transaction
+    # as the association rows (rebuilt by POST /evenements/compteurs/recalcul)
+    nb_etudiants = Column(Integer, nullable=False, default=0, server_default="0")
+    nb_enseignants = Column(Integer, nullable=False, default=0, server_default="0")
+
     # Many-to-many relationships
     etudiants = relationship("Etudiant", secondary=evenement_etudiants, backref="evenements")
     enseignants = relationship("Enseignant", secondary=evenement_enseignants, backref="evenements")
 
+    __table_args__ = (
+        Index('ix_evenement_date', 'date'),
+    )
+
 class MessEnsAbs(Base):
     __tablename__ = "mess_ens_abs"
 
@@ -249,4 +283,63 @@ class MessEnsAbs(Base):
 
     enseignant = relationship("Enseignant", backref="messages_abs")
     chef = relationship("Chef", backref="messages_abs")   
-    seance = relationship("Seance", backref="messages_abs")
\ No newline at end of file
+    seance = relationship("Seance", backref="messages_abs")
+
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    to_email = Column(String(100), nullable=False)
+    subject = Column(String(255), nullable=False)
+    # cleared once the row is sent or failed: activation mails carry plaintext passwords
+    body = Column(Text, nullable=True)
+
+    # pending -> sending -> sent | failed (pending again while retries remain)
+    status = Column(String(20), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False)
+    last_error = Column(String(500), nullable=True)
+    lock_token = Column(String(32), nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('ix_email_outbox_status_next', 'status', 'next_attempt_at'),
+        Index('ix_email_outbox_lock_token', 'lock_token'),
+    )
+
+
+class Fichier(Base):
+    """
+    Uploaded blob, stored once on disk under its sha256 (see attachments.py). Referenced by
+    path strings ("/fichiers/<sha256>") from Utilisateur.image and MessEnsAbs.file_path.
+    """
+    __tablename__ = "fichier"
+
+    sha256 = Column(String(64), primary_key=True)
+    taille = Column(BigInteger, nullable=False)
+    content_type = Column(String(100), nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+    # References held by other rows; an unreferenced blob is collected once
+    # orphelin_depuis is older than the grace period
+    nb_references = Column(Integer, nullable=False, default=0, server_default="0")
+    orphelin_depuis = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('ix_fichier_orphelin_depuis', 'orphelin_depuis'),
+    )
+
+
+class JetonCalendrier(Base):
+    """
+    Per-user secret behind the calendar feed token (see auth_utils.create_feed_token): feed URLs
+    stay valid until the secret is replaced or the row deleted, which revokes them.
+    """
+    __tablename__ = "jeton_calendrier"
+
+    id_utilisateur = Column(Integer, ForeignKey("utilisateur.id", ondelete="CASCADE"), primary_key=True)
+    secret = Column(String(64), nullable=False)
+    created_at = Column(DateTime, nullable=False)
@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import os
+import math
+import time
+import asyncio
+import logging
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+import model_events
+from lazy_imports import lazy_module
+from conflicts import RESOURCES, to_minutes, weekday
+
+np = lazy_module("numpy")
+
+# ---------------- Configuration ----------------
+CELL_MINUTES = int(os.getenv("OCCUPANCY_CELL_MINUTES", 15))
+CELLS = 24 * 60 // CELL_MINUTES
+DAYS = 7
+OCCUPANCY_TTL = float(os.getenv("OCCUPANCY_TTL", 300))
+
+# ---------------- Logging ----------------
+logger = logging.getLogger("occupancy")
+
+
+def cell_range(start_minutes: int, end_minutes: int) -> Tuple[int, int]:
+    """
+    Cells touched by [start, end): a partial cell counts as occupied.
+    """
+    return start_minutes // CELL_MINUTES, min(CELLS, math.ceil(end_minutes / CELL_MINUTES))
+
+
+def week_start(day: date) -> date:
+    """
+    Sunday opening the week that contains `day` (day_of_week 0).
+    """
+    return day - timedelta(days=weekday(day))
+
+
+class ResourceGrid:
+    """
+    Occupancy counters for one kind of resource: a (resources x 7 days x cells) array for
+    recurring seances, plus sparse per-week overlays for dated seances. Counts rather than
+    bits so that removing one of two overlapping seances leaves the cell busy.
+    """
+
+    def __init__(self):
+        self.rows: Dict[int, int] = {}
+        self.counts = np.zeros((16, DAYS, CELLS), dtype=np.uint16)
+        self.overlays: Dict[date, Dict[int, np.ndarray]] = {}
+
+    def row(self, resource_id: int) -> int:
+        row = self.rows.get(resource_id)
+        if row is None:
+            row = self.rows[resource_id] = len(self.rows)
+            if row >= len(self.counts):
+                grown = np.zeros((len(self.counts) * 2, DAYS, CELLS), dtype=np.uint16)
+                grown[:len(self.counts)] = self.counts
+                self.counts = grown
+        return row
+
+    def apply(self, resource_id: int, day: int, week: Optional[date], c0: int, c1: int, delta: int):
+        row = self.row(resource_id)
+        if week is None:
+            target = self.counts[row]
+        else:
+            week_rows = self.overlays.setdefault(week, {})
+            target = week_rows.get(row)
+            if target is None:
+                target = week_rows[row] = np.zeros((DAYS, CELLS), dtype=np.uint16)
+
+        if delta > 0:
+            target[day, c0:c1] += delta
+        else:
+            target[day, c0:c1] -= -delta
+
+        if week is not None and not target.any():
+            del self.overlays[week][row]
+            if not self.overlays[week]:
+                del self.overlays[week]
+
+    def busy(self, week: Optional[date] = None) -> np.ndarray:
+        """
+        Boolean (resources, days, cells) occupancy, rows ordered as self.rows.
+        """
+        busy = self.counts[:len(self.rows)] > 0
+        for row, overlay in self.overlays.get(week, {}).items():
+            busy[row] |= overlay > 0
+        return busy
+
+    def busy_row(self, resource_id: int, week: Optional[date] = None) -> np.ndarray:
+        row = self.rows.get(resource_id)
+        if row is None:
+            return np.zeros((DAYS, CELLS), dtype=bool)
+        busy = self.counts[row] > 0
+        overlay = self.overlays.get(week, {}).get(row)
+        if overlay is not None:
+            busy |= overlay > 0
+        return busy
+
+
+class OccupancyIndex:
+    """
+    Occupancy bitmaps for rooms, teachers and groups, plus room attributes as column arrays.
+    """
+
+    def __init__(self):
+        self.grids = {kind: ResourceGrid() for kind, _ in RESOURCES}
+        # seance id -> (day, week or None, c0, c1, {kind: resource id}) so edits can be undone
+        self.footprints: Dict[int, tuple] = {}
+        self.rooms: Dict[int, dict] = {}
+        # positional with the salle grid rows; -1 capacity marks rows without a known room
+        self.room_capacity = np.full(16, -1, dtype=np.int32)
+        self.room_type = np.empty(16, dtype=object)
+
+    # ---- rooms ----
+    def _fit_room_arrays(self):
+        size = len(self.grids["salle"].counts)
+        if len(self.room_capacity) < size:
+            capacity = np.full(size, -1, dtype=np.int32)
+            capacity[:len(self.room_capacity)] = self.room_capacity
+            room_type = np.empty(size, dtype=object)
+            room_type[:len(self.room_type)] = self.room_type
+            self.room_capacity, self.room_type = capacity, room_type
+
+    def set_room(self, room: dict):
+        row = self.grids["salle"].row(room["id"])
+        self._fit_room_arrays()
+        self.room_capacity[row] = room["capacite"] or 0
+        self.room_type[row] = room["type"]
+        self.rooms[room["id"]] = {"id": room["id"], "numero": room["numero"], "type": room["type"], "capacite": room["capacite"]}
+
+    def remove_room(self, room_id: int):
+        row = self.grids["salle"].rows.get(room_id)
+        self.rooms.pop(room_id, None)
+        if row is not None:
+            # keep the row (arrays are positional) but make it unmatchable
+            self.room_capacity[row] = -1
+            self.room_type[row] = None
+
+    def room_rows(self, salle_type: Optional[str] = None, capacite_min: Optional[int] = None) -> np.ndarray:
+        """
+        Grid rows of the rooms matching the filters, selected with array comparisons.
+        """
+        self._fit_room_arrays()
+        n = len(self.grids["salle"].rows)
+        mask = self.room_capacity[:n] >= (capacite_min or 0)
+        if salle_type is not None:
+            mask &= self.room_type[:n] == salle_type
+        return np.flatnonzero(mask)
+
+    def room_ids(self) -> np.ndarray:
+        ids = np.empty(len(self.grids["salle"].rows), dtype=np.int64)
+        for room_id, row in self.grids["salle"].rows.items():
+            ids[row] = room_id
+        return ids
+
+    # ---- seances ----
+    def add_seance(self, seance: dict):
+        if seance["id"] in self.footprints:
+            self.remove_seance(seance["id"])
+        if seance.get("specific_date") is not None:
+            day, week = weekday(seance["specific_date"]), week_start(seance["specific_date"])
+        elif seance.get("day_of_week") is not None:
+            day, week = seance["day_of_week"], None
+        else:
+            return
+        c0, c1 = cell_range(to_minutes(seance["heure_debut"]), to_minutes(seance["heure_fin"]))
+        owners = {kind: seance[column] for kind, column in RESOURCES}
+        for kind, resource_id in owners.items():
+            self.grids[kind].apply(resource_id, day, week, c0, c1, +1)
+        self.footprints[seance["id"]] = (day, week, c0, c1, owners)
+
+    def remove_seance(self, seance_id: int):
+        footprint = self.footprints.pop(seance_id, None)
+        if footprint is None:
+            return
+        day, week, c0, c1, owners = footprint
+        for kind, resource_id in owners.items():
+            self.grids[kind].apply(resource_id, day, week, c0, c1, -1)
+
+
+# ---------------- Vectorised helpers ----------------
+def window_free(free: np.ndarray, length: int) -> np.ndarray:
+    """
+    For a boolean (..., cells) array, True at c when cells c .. c+length-1 are all free.
+    Output has cells - length + 1 positions along the last axis.
+    """
+    padded = np.concatenate([np.zeros(free.shape[:-1] + (1,), dtype=np.int32), free.cumsum(axis=-1, dtype=np.int32)], axis=-1)
+    return (padded[..., length:] - padded[..., :-length]) == length
+
+
+def runs(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    [start, end) index pairs of the True runs in a 1-D boolean array.
+    """
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1).tolist(), np.flatnonzero(edges == -1).tolist()))
+
+
+# ---------------- Process-wide index ----------------
+# allocated on first load: building the arrays is what pulls in numpy
+index: Optional[OccupancyIndex] = None
+_loaded_at: Optional[float] = None
+_load_lock = asyncio.Lock()
+# (apply function, upserted, deleted) committed while a build reads the tables, replayed onto it
+_during_build: Optional[List[Tuple[Callable, List[dict], List[dict]]]] = None
+
+
+async def ensure_loaded(db: AsyncSession) -> OccupancyIndex:
+    """
+    Build the bitmaps from the seance and salle tables on first use and every OCCUPANCY_TTL seconds;
+    in between they are maintained incrementally from committed changes.
+    """
+    global _loaded_at, index, _during_build
+    if _loaded_at is not None and time.monotonic() - _loaded_at < OCCUPANCY_TTL:
+        return index
+    async with _load_lock:
+        if _loaded_at is not None and time.monotonic() - _loaded_at < OCCUPANCY_TTL:
+            return index
+        started = time.perf_counter()
+        _during_build = []
+        try:
+            rooms = (await db.execute(select(
+                models.Salle.id, models.Salle.numero, models.Salle.type, models.Salle.capacite,
+            ))).mappings().all()
+            seances = (await db.execute(select(
+                models.Seance.id, models.Seance.id_salle, models.Seance.id_enseignant, models.Seance.id_groupe,
+                models.Seance.day_of_week, models.Seance.specific_date,
+                models.Seance.heure_debut, models.Seance.heure_fin,
+            ))).mappings().all()
+            fresh = OccupancyIndex()
+            for room in rooms:
+                fresh.set_room(room)
+            for seance in seances:
+                fresh.add_seance(seance)
+            for apply, upserted, deleted in _during_build:
+                apply(fresh, upserted, deleted)
+        finally:
+            _during_build = None
+        index, _loaded_at = fresh, time.monotonic()
+        logger.info(
+            f"[occupancy] {len(rooms)} rooms, {len(seances)} seances loaded in "
+            f"{(time.perf_counter() - started) * 1000:.1f} ms"
+        )
+    return index
+
+
+def _apply_seances(target: OccupancyIndex, upserted: List[dict], deleted: List[dict]):
+    for row in deleted:
+        target.remove_seance(row["id"])
+    for row in upserted:
+        target.add_seance(row)
+
+
+def _apply_salles(target: OccupancyIndex, upserted: List[dict], deleted: List[dict]):
+    for row in deleted:
+        target.remove_room(row["id"])
+    for row in upserted:
+        target.set_room(row)
+
+
+def _on_change(apply: Callable, upserted: List[dict], deleted: List[dict]):
+    if _during_build is not None:
+        _during_build.append((apply, upserted, deleted))
+    if _loaded_at is not None:
+        apply(index, upserted, deleted)
+
+
+def _on_seance_change(upserted: List[dict], deleted: List[dict]):
+    _on_change(_apply_seances, upserted, deleted)
+
+
+def _on_salle_change(upserted: List[dict], deleted: List[dict]):
+    _on_change(_apply_salles, upserted, deleted)
+
+
+model_events.subscribe(models.Seance, _on_seance_change)
+model_events.subscribe(models.Salle, _on_salle_change)
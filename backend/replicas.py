@@ -0,0 +1,296 @@
+import os
+import time
+import asyncio
+import logging
+import itertools
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+import database
+from security import ExpiringLRU
+
+# ---------------- Configuration ----------------
+# Comma-separated URLs in the same form as DATABASE_URL; none means everything runs on the primary.
+# Locally, copies of one SQLite file stand in for replicas:
+#   DATABASE_REPLICA_URLS=sqlite:////tmp/replica-1.db,sqlite:////tmp/replica-2.db
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_STRATEGY = os.getenv("REPLICA_STRATEGY", "least_loaded")  # least_loaded | round_robin
+REPLICA_HEALTH_INTERVAL = float(os.getenv("REPLICA_HEALTH_INTERVAL", 5))
+REPLICA_HEALTH_TIMEOUT = float(os.getenv("REPLICA_HEALTH_TIMEOUT", 2))
+# After a client's write its reads stay on the primary this long (replication lag allowance)
+READ_YOUR_WRITES_WINDOW = float(os.getenv("READ_YOUR_WRITES_WINDOW", 5))
+REPLICA_PIN_CACHE_SIZE = int(os.getenv("REPLICA_PIN_CACHE_SIZE", 100000))
+
+# ---------------- Logging ----------------
+logger = logging.getLogger("replicas")
+
+
+class ReplicaWriteError(RuntimeError):
+    pass
+
+
+class ReplicaSession(Session):
+    """
+    Bound to a replica, but sends its statements to the primary once that replica is marked
+    down: the choice is made when a statement runs, so opening the session costs nothing.
+    """
+
+    def get_bind(self, mapper=None, **kw):
+        replica = self.info.get("replica")
+        if replica is not None and not replica.healthy:
+            if not self.info.get("fell_back"):
+                self.info["fell_back"] = True
+                replicas.fallbacks += 1
+            return database.async_engine.sync_engine
+        return super().get_bind(mapper, **kw)
+
+
+class Replica:
+    """
+    One replica: its own engine and pool, refusing any write statement.
+    """
+    __slots__ = ("name", "engine", "sessions", "healthy", "in_flight", "served", "failures", "last_error")
+
+    def __init__(self, url: str):
+        async_url = database.to_async_url(url)
+        self.name = make_url(url).render_as_string(hide_password=True)
+        self.engine = create_async_engine(async_url, **database.pool_options(async_url))
+        self.sessions = async_sessionmaker(
+            bind=self.engine, class_=AsyncSession, sync_session_class=ReplicaSession,
+            autoflush=False, expire_on_commit=False, info={"replica": self},
+        )
+        self.healthy = True
+        self.in_flight = 0
+        self.served = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        event.listen(self.engine.sync_engine, "before_cursor_execute", _refuse_writes)
+        event.listen(self.engine.sync_engine, "handle_error", self._on_error)
+
+    def _on_error(self, context):
+        # no connection: the replica could not be reached at all
+        if context.is_disconnect or context.connection is None:
+            replicas.mark_down(self, context.original_exception)
+
+
+_WRITE_VERBS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+def _is_write(statement: str, context) -> bool:
+    if context is not None and (context.isinsert or context.isupdate or context.isdelete):
+        return True
+    # textual SQL carries no flags
+    return statement.lstrip()[:7].upper().startswith(_WRITE_VERBS)
+
+
+def _refuse_writes(conn, cursor, statement, parameters, context, executemany):
+    if _is_write(statement, context):
+        raise ReplicaWriteError("Écriture refusée sur une réplique en lecture seule")
+
+
+class ReplicaSet:
+    """
+    The configured replicas, their health (checked every REPLICA_HEALTH_INTERVAL seconds,
+    and marked down at once on a failed checkout or a dropped connection) and their load.
+    """
+
+    def __init__(self, urls: List[str]):
+        self.replicas = [Replica(url) for url in urls]
+        self._turn = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+        self.fallbacks = 0
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def pick(self) -> Optional[Replica]:
+        healthy = [r for r in self.replicas if r.healthy]
+        if not healthy:
+            return None
+        offset = next(self._turn) % len(healthy)
+        if REPLICA_STRATEGY == "round_robin":
+            return healthy[offset]
+        # fewest sessions open, ties rotated so an idle set is still spread evenly
+        rotated = healthy[offset:] + healthy[:offset]
+        return min(rotated, key=lambda r: r.in_flight)
+
+    def mark_down(self, replica: Replica, error: BaseException):
+        replica.failures += 1
+        replica.last_error = f"{type(error).__name__}: {error}"[:200]
+        if replica.healthy:
+            replica.healthy = False
+            logger.warning(f"[replicas] {replica.name} down, reads fall back: {replica.last_error}")
+
+    async def check(self, replica: Replica):
+        try:
+            async with replica.engine.connect() as conn:
+                await asyncio.wait_for(conn.execute(text("SELECT 1")), REPLICA_HEALTH_TIMEOUT)
+        except Exception as e:
+            self.mark_down(replica, e)
+            return
+        if not replica.healthy:
+            replica.healthy = True
+            logger.info(f"[replicas] {replica.name} back in rotation")
+
+    async def check_all(self):
+        await asyncio.gather(*(self.check(r) for r in self.replicas))
+
+    def start(self):
+        if self.replicas and self._task is None:
+            self._task = asyncio.create_task(self._run(), name="replica-health")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    async def _run(self):
+        # the first check runs at startup, before the app takes requests
+        while True:
+            await asyncio.sleep(REPLICA_HEALTH_INTERVAL)
+            await self.check_all()
+
+    def stats(self) -> dict:
+        return {
+            "strategy": REPLICA_STRATEGY,
+            "fallbacks": self.fallbacks,
+            "replicas": [
+                {"name": r.name, "healthy": r.healthy, "in_flight": r.in_flight, "served": r.served,
+                 "failures": r.failures, "last_error": r.last_error}
+                for r in self.replicas
+            ],
+        }
+
+
+replicas = ReplicaSet(DATABASE_REPLICA_URLS)
+
+
+# ---------------- Read-your-writes ----------------
+class _RequestState:
+    __slots__ = ("caller", "wrote")
+
+    def __init__(self, caller: int):
+        self.caller = caller
+        self.wrote = False
+
+
+_state: ContextVar[Optional[_RequestState]] = ContextVar("replica_request_state", default=None)
+# caller key -> pinned to the primary until the entry expires
+_pins = ExpiringLRU(REPLICA_PIN_CACHE_SIZE)
+
+
+def _caller_key(scope) -> int:
+    """
+    Who is asking: the bearer token, else the client address. Hashed, so no credential is
+    kept in memory.
+    """
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            return hash(value)
+    client = scope.get("client")
+    return hash(client[0] if client else None)
+
+
+def _note_write(conn, cursor, statement, parameters, context, executemany):
+    if _is_write(statement, context):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+
+
+def track_writes():
+    """
+    Flag the current request as soon as it runs an INSERT / UPDATE / DELETE on the primary
+    (ORM or Core; the greenlet bridge shares the request's context).
+    """
+    event.listen(database.async_engine.sync_engine, "after_cursor_execute", _note_write)
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pure ASGI middleware: remembers which clients wrote to the primary, so their next reads
+    within READ_YOUR_WRITES_WINDOW do not hit a replica that has not caught up yet.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        state = _RequestState(_caller_key(scope))
+        token = _state.set(state)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _state.reset(token)
+            if state.wrote:
+                _pins.set(state.caller, True, time.time() + READ_YOUR_WRITES_WINDOW)
+
+
+def _pinned() -> bool:
+    state = _state.get()
+    if state is None:
+        return False
+    return state.wrote or _pins.get(state.caller) is not None
+
+
+# ---------------- Sessions ----------------
+@asynccontextmanager
+async def read_session() -> AsyncIterator[AsyncSession]:
+    """
+    A session for SELECTs only: on a replica when one is usable, otherwise on the primary.
+    No connection is taken until the first statement, so a request answered from an
+    in-process cache costs no round trip. A replica found down by the health check, or by a
+    failed checkout or dropped connection of an earlier statement, sends the session's next
+    statements to the primary; the statement that hit the failure itself is not retried.
+    """
+    replica = replicas.pick() if replicas and not _pinned() else None
+    if replica is not None:
+        replica.in_flight += 1
+        replica.served += 1
+        db = replica.sessions()
+    else:
+        db = database.AsyncSessionLocal()
+    try:
+        yield db
+    finally:
+        await db.close()
+        if replica is not None:
+            replica.in_flight -= 1
+
+
+async def get_read_db():
+    async with read_session() as db:
+        yield db
+
+
+def on_replica(db: AsyncSession) -> bool:
+    replica = db.sync_session.info.get("replica")
+    return replica is not None and replica.healthy
+
+
+@asynccontextmanager
+async def for_cache(db: AsyncSession, changed_at: float) -> AsyncIterator[AsyncSession]:
+    """
+    The session to (re)build an in-process cache from: `db`, unless it is a replica and the
+    cached data changed in this process within READ_YOUR_WRITES_WINDOW. A lagging replica
+    would then put the old data back in the cache until its TTL.
+    """
+    if not on_replica(db) or time.time() - changed_at >= READ_YOUR_WRITES_WINDOW:
+        yield db
+        return
+    async with database.AsyncSessionLocal() as primary:
+        yield primary
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
-from datetime import date
+from pydantic import BaseModel, EmailStr, Field, field_validator, model_validator
+from typing import Dict, List, Literal, Optional
+from datetime import date, time
 
 
 
@@ -19,7 +19,7 @@ class SigninRequest(BaseModel):
 
 class UserResponse(BaseModel):
     id: int
-    cin: str
+    cin: int
     nom: str
     prenom: str
     email: EmailStr
@@ -76,3 +76,444 @@ class MessEnsAbsCreate(BaseModel):
     id_seance: Optional[int] = None
     file_path: Optional[str] = None
     date: date
+
+
+class MessEnsAbsResponse(MessEnsAbsCreate):
+    id: int
+
+    class Config:
+        from_attributes = True
+
+
+# ---------------- Bulk user import ----------------
+RoleName = Literal["etudiant", "enseignant", "administratif"]
+
+
+class UserImportRow(BaseModel):
+    nom: str = Field(min_length=1, max_length=50)
+    prenom: str = Field(min_length=1, max_length=50)
+    email: EmailStr
+    cin: int
+    telp: Optional[str] = Field(default=None, max_length=20)
+    role: RoleName = "etudiant"
+
+    @field_validator("telp", mode="before")
+    @classmethod
+    def empty_to_none(cls, value):
+        # CSV exports write missing values as "" or the literal "null"
+        if isinstance(value, str) and value.strip().lower() in ("", "null", "none"):
+            return None
+        return value
+
+    @field_validator("role", mode="before")
+    @classmethod
+    def default_role(cls, value):
+        if value is None or (isinstance(value, str) and not value.strip()):
+            return "etudiant"
+        return value.strip().lower() if isinstance(value, str) else value
+
+
+class ImportRowError(BaseModel):
+    line: int
+    cin: Optional[str] = None
+    email: Optional[str] = None
+    error: str
+
+
+class UserImportReport(BaseModel):
+    total_rows: int
+    inserted: int
+    updated: int
+    skipped: int
+    failed: int
+    batches: int
+    batch_size: int
+    elapsed_seconds: float
+    rows_per_second: float
+    errors: List[ImportRowError]
+
+
+# ---------------- Batch account activation ----------------
+class BatchActivationRequest(BaseModel):
+    users: List[SignupRequest] = []
+    id_groupe: Optional[int] = None
+    id_niveau: Optional[int] = None
+
+    @model_validator(mode="after")
+    def check_target(self):
+        if not self.users and self.id_groupe is None and self.id_niveau is None:
+            raise ValueError("users, id_groupe ou id_niveau est requis")
+        return self
+
+
+class ActivationOutcome(BaseModel):
+    id: Optional[int] = None
+    cin: Optional[str] = None
+    email: Optional[str] = None
+    status: Literal["activated", "already_active", "not_found", "failed"]
+
+
+class BatchActivationReport(BaseModel):
+    requested: int
+    activated: int
+    already_active: int
+    not_found: int
+    failed: int
+    emails_queued: int
+    elapsed_seconds: float
+    results: List[ActivationOutcome]
+
+
+# ---------------- Seances ----------------
+class SeanceBase(BaseModel):
+    day_of_week: Optional[int] = None  # 0 = dimanche
+    specific_date: Optional[date] = None
+    heure_debut: time
+    heure_fin: time
+    id_salle: int
+    id_matiere: int
+    id_groupe: int
+    id_enseignant: int
+
+
+class SeanceInput(SeanceBase):
+    # checks for submitted slots only: responses serve stored rows as they are
+    day_of_week: Optional[int] = Field(default=None, ge=0, le=6)
+
+    @model_validator(mode="after")
+    def check_slot(self):
+        if (self.day_of_week is None) == (self.specific_date is None):
+            raise ValueError("Renseigner soit day_of_week soit specific_date")
+        if self.heure_fin <= self.heure_debut:
+            raise ValueError("heure_fin doit être après heure_debut")
+        return self
+
+
+class SeanceCreate(SeanceInput):
+    pass
+
+
+class SeanceCandidate(SeanceInput):
+    # id of the existing seance this candidate replaces, if any
+    id: Optional[int] = None
+
+
+class SeanceResponse(SeanceBase):
+    id: int
+    created_by: Optional[int] = None
+    is_presente: Optional[bool] = False
+
+    class Config:
+        from_attributes = True
+
+
+# ---------------- Nested views ----------------
+# Built from ORM rows whose relationships were filled by loaders.Loaders
+class SalleRef(BaseModel):
+    id: int
+    numero: str
+    type: str
+    capacite: int
+
+    class Config:
+        from_attributes = True
+
+
+class MatiereRef(BaseModel):
+    id: int
+    nom: str
+    id_niveau: int
+
+    class Config:
+        from_attributes = True
+
+
+class GroupeRef(BaseModel):
+    id: int
+    nom: str
+    id_niveau: int
+
+    class Config:
+        from_attributes = True
+
+
+class EnseignantDetail(BaseModel):
+    id: int
+    utilisateur: UserResponse
+
+    class Config:
+        from_attributes = True
+
+
+class SeanceDetail(SeanceResponse):
+    salle: SalleRef
+    matiere: MatiereRef
+    groupe: GroupeRef
+    enseignant: EnseignantDetail
+
+
+class EtudiantDetail(EtudiantResponse):
+    # both columns are nullable in the table
+    id_groupe: Optional[int] = None
+    id_specialite: Optional[int] = None
+    utilisateur: UserResponse
+
+
+class GroupeDetail(GroupeRef):
+    etudiants: List[EtudiantDetail]
+
+
+class SeanceRef(BaseModel):
+    id: Optional[int] = None
+    index: Optional[int] = None  # position in a proposed timetable
+    day_of_week: Optional[int] = None
+    specific_date: Optional[date] = None
+    heure_debut: str
+    heure_fin: str
+
+
+class SeanceConflict(BaseModel):
+    kind: Literal["salle", "enseignant", "groupe"]
+    resource_id: int
+    seance: SeanceRef
+    conflicting: SeanceRef
+
+
+class TimetableValidationRequest(BaseModel):
+    seances: List[SeanceCandidate]
+    include_existing: bool = True
+
+
+class TimetableValidationReport(BaseModel):
+    checked: int
+    conflicts: List[SeanceConflict]
+    elapsed_ms: float
+
+
+# ---------------- Roll call ----------------
+class RollCallEntry(BaseModel):
+    id_etudiant: int
+    statut: str = Field(..., min_length=1, max_length=20)
+
+
+class RollCallRequest(BaseModel):
+    date: date
+    entries: List[RollCallEntry] = Field(..., min_length=1)
+
+
+class RollCallReport(BaseModel):
+    id_seance: int
+    date: date
+    enregistres: int
+    par_statut: Dict[str, int]
+
+
+# ---------------- Messages ----------------
+class MessageCreate(BaseModel):
+    id_destinataire: int
+    contenu: str = Field(..., min_length=1, max_length=1000)
+
+
+class MessageResponse(BaseModel):
+    id: int
+    id_expediteur: int
+    id_destinataire: int
+    contenu: str
+    date: date
+    lu: bool
+
+    class Config:
+        from_attributes = True
+
+
+class MessagePage(BaseModel):
+    items: List[MessageResponse]
+    next_cursor: Optional[int] = None  # pass as `avant` to get the next page
+
+
+class UnreadCount(BaseModel):
+    non_lus: int
+
+
+class MarkReadRequest(BaseModel):
+    ids: Optional[List[int]] = None  # None marks the whole inbox as read
+
+
+class MarkReadReport(BaseModel):
+    marques: int
+    non_lus: int
+
+
+# ---------------- Free room / slot search ----------------
+class FreeRoom(BaseModel):
+    id: int
+    numero: str
+    type: str
+    capacite: int
+
+
+class FreeSlot(BaseModel):
+    day_of_week: int
+    jour: Optional[date] = None
+    debut_au_plus_tot: str
+    debut_au_plus_tard: str
+    fin_au_plus_tard: str
+    salles_disponibles: Optional[int] = None
+
+
+class FreeSlotReport(BaseModel):
+    duree: int
+    week_start: Optional[date] = None
+    slots: List[FreeSlot]
+
+
+# ---------------- Attendance analytics ----------------
+class AttendancePeriod(BaseModel):
+    debut: date
+    fin: date
+    semaines: List[date]  # week starts (Sunday), the columns of every par_semaine series
+
+
+class StudentAttendance(BaseModel):
+    id: int
+    id_groupe: int
+    absences: int
+    seances_prevues: int
+    taux: float
+
+
+class StudentAttendanceReport(AttendancePeriod):
+    etudiants: List[StudentAttendance]
+
+
+class MatiereAttendance(BaseModel):
+    id_matiere: int
+    absences: int
+    seances_prevues: int
+    taux: float
+    par_semaine: List[int]  # absences per week
+
+
+class StudentAttendanceDetail(AttendancePeriod, StudentAttendance):
+    matieres: List[MatiereAttendance]
+
+
+class AttendanceSeries(BaseModel):
+    id: int
+    absences: int
+    seances_prevues: int
+    taux: float
+    par_semaine: List[float]  # absence rate per week
+
+
+class AttendanceRollup(AttendancePeriod):
+    items: List[AttendanceSeries]
+
+
+class AtRiskStudent(BaseModel):
+    id_etudiant: int
+    id_groupe: int
+    id_matiere: int
+    absences: int
+    seances_prevues: int
+    taux: float
+
+
+class AtRiskReport(AttendancePeriod):
+    seuil: float
+    etudiants: List[AtRiskStudent]
+
+
+# ---------------- Evenements ----------------
+class EvenementCreate(BaseModel):
+    titre: str = Field(..., min_length=1, max_length=255)
+    type: str = Field(..., min_length=1, max_length=50)
+    date: date
+    description: Optional[str] = Field(None, max_length=1000)
+
+
+class EvenementResponse(EvenementCreate):
+    id: int
+    created_by_id: int
+    nb_etudiants: int
+    nb_enseignants: int
+
+    class Config:
+        from_attributes = True
+
+
+class EventAudience(BaseModel):
+    """
+    Target population; the criteria are combined with OR.
+    """
+    id_departements: List[int] = []
+    id_specialites: List[int] = []
+    id_niveaux: List[int] = []
+    id_groupes: List[int] = []
+    id_etudiants: List[int] = []
+    id_enseignants: List[int] = []
+    # also teachers giving at least one seance to the groupes selected above
+    enseignants_des_groupes: bool = False
+
+    @model_validator(mode="after")
+    def not_empty(self):
+        if not any((self.id_departements, self.id_specialites, self.id_niveaux, self.id_groupes,
+                    self.id_etudiants, self.id_enseignants)):
+            raise ValueError("Aucune population cible")
+        return self
+
+
+class EventRegistrationReport(BaseModel):
+    etudiants: int  # rows inserted (or removed) by this call
+    enseignants: int
+    nb_etudiants: int  # totals after the call
+    nb_enseignants: int
+
+
+# ---------------- Attachments ----------------
+class FichierResponse(BaseModel):
+    sha256: str
+    taille: int
+    content_type: str
+    url: str  # what to store as a reference
+    lien: str  # signed URL to display the blob right away (see FichierLien)
+
+    class Config:
+        from_attributes = True
+
+
+class FichierLien(BaseModel):
+    url: str  # opens the blob without credentials until expires_at
+    expires_at: int  # epoch seconds
+
+
+class FichierGcReport(BaseModel):
+    supprimes: int
+    octets: int
+
+
+# ---------------- User search ----------------
+class UserSearchHit(BaseModel):
+    id: int
+    nom: str
+    prenom: str
+    email: str
+    role: str
+    score: float
+
+
+class UserSearchPage(BaseModel):
+    total: int  # matches before the limit
+    results: List[UserSearchHit]
+
+
+# ---------------- Calendar feeds ----------------
+class CalendarFeed(BaseModel):
+    token: str
+    url: str  # to subscribe to as is from a calendar app
+
+
+# ---------------- Event stream ----------------
+class StreamTicket(BaseModel):
+    ticket: str  # pass as ?ticket= to GET /events/stream
+    expires_at: int  # epoch seconds
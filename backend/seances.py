@@ -0,0 +1,253 @@
+import time
+import asyncio
+import logging
+from collections import Counter
+from typing import Dict, Hashable, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import and_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import bulk
+import models
+import schemas
+import analytics
+import conflicts
+from database import get_db
+from loaders import Loaders, get_loaders
+from replicas import get_read_db
+from security import Principal, get_current_user, require_roles
+
+# ---------------- Router ----------------
+router = APIRouter(prefix="/seances", tags=["Seances"])
+admin_only = require_roles("administratif")
+teaching_staff = require_roles("administratif", "enseignant")
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# ---------------- Logging ----------------
+logger = logging.getLogger("seances")
+
+
+# ---------------- Helpers ----------------
+def _ref(slot: conflicts.Slot, positions: Dict[Hashable, int]) -> schemas.SeanceRef:
+    return schemas.SeanceRef(
+        id=slot.ref if isinstance(slot.ref, int) else None,
+        index=positions.get(slot.ref),
+        day_of_week=slot.day_of_week,
+        specific_date=slot.specific_date,
+        heure_debut=f"{slot.start // 60:02d}:{slot.start % 60:02d}",
+        heure_fin=f"{slot.end // 60:02d}:{slot.end % 60:02d}",
+    )
+
+
+def _report(found: List[conflicts.Collision], positions: Dict[Hashable, int] = None) -> List[schemas.SeanceConflict]:
+    positions = positions or {}
+    return [
+        schemas.SeanceConflict(
+            kind=c.kind,
+            resource_id=c.resource_id,
+            seance=_ref(c.slot, positions),
+            conflicting=_ref(c.other, positions),
+        )
+        for c in found
+    ]
+
+
+def _raise_if_conflicts(found: List[conflicts.Collision]):
+    if found:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Conflit d'emploi du temps", "conflicts": [c.model_dump(mode="json") for c in _report(found)]},
+        )
+
+
+# ---------------- Conflict Checks ----------------
+@router.post("/conflicts", response_model=List[schemas.SeanceConflict], dependencies=[Depends(admin_only)])
+async def check_conflicts(candidate: schemas.SeanceCandidate, db: AsyncSession = Depends(get_db)):
+    """
+    Collisions of one seance (new, or an edit of `id`) with the current timetable.
+    """
+    index = await conflicts.ensure_loaded(db)
+    slot = conflicts.Slot.of(candidate, ref=candidate.id if candidate.id is not None else ("candidate", 0))
+    return _report(index.collisions(slot), {slot.ref: 0})
+
+
+@router.post("/validate", response_model=schemas.TimetableValidationReport, dependencies=[Depends(admin_only)])
+async def validate_timetable(req: schemas.TimetableValidationRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Validate a whole proposed timetable in one pass and return every collision,
+    both inside the proposal and (optionally) against the stored seances.
+    """
+    started = time.perf_counter()
+    index = await conflicts.ensure_loaded(db)
+    slots = [
+        conflicts.Slot.of(c, ref=c.id if c.id is not None else ("proposed", i))
+        for i, c in enumerate(req.seances)
+    ]
+    positions = {slot.ref: i for i, slot in enumerate(slots)}
+    found = index.validate(slots, include_existing=req.include_existing)
+    return schemas.TimetableValidationReport(
+        checked=len(slots),
+        conflicts=_report(found, positions),
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 3),
+    )
+
+
+# ---------------- Listing ----------------
+@router.get("", response_model=List[schemas.SeanceDetail], dependencies=[Depends(get_current_user)])
+async def list_seances(
+    id_groupe: Optional[int] = None,
+    id_enseignant: Optional[int] = None,
+    id_salle: Optional[int] = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db),
+    loaders: Loaders = Depends(get_loaders),
+):
+    """
+    Seances with their salle, matiere, groupe and enseignant: one query for the page, then one
+    per relationship (six in all) whatever the page size.
+    """
+    s = models.Seance
+    query = select(s)
+    for column, value in ((s.id_groupe, id_groupe), (s.id_enseignant, id_enseignant), (s.id_salle, id_salle)):
+        if value is not None:
+            query = query.where(column == value)
+    seances = (await db.execute(query.order_by(s.id).offset(offset).limit(limit))).scalars().all()
+
+    await asyncio.gather(*(loaders.load_all(seances, relationship) for relationship in (s.salle, s.matiere, s.groupe)))
+    enseignants = await loaders.load_all(seances, s.enseignant)
+    await loaders.load_all(enseignants, models.Enseignant.utilisateur)
+    return seances
+
+
+# ---------------- CRUD ----------------
+@router.post("", response_model=schemas.SeanceResponse, status_code=201)
+async def create_seance(
+    req: schemas.SeanceCreate,
+    db: AsyncSession = Depends(get_db),
+    principal: Principal = Depends(admin_only),
+):
+    """
+    Create a seance; rejected with 409 if it collides with the room, teacher or group timetable.
+    """
+    index = await conflicts.ensure_loaded(db)
+    _raise_if_conflicts(index.collisions(conflicts.Slot.of(req, ref=("candidate", 0))))
+
+    seance = models.Seance(**req.model_dump(), created_by=principal.id)
+    db.add(seance)
+    try:
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.exception(f"[create_seance] DB commit failed: {e}")
+        raise HTTPException(status_code=400, detail="Salle, matière, groupe ou enseignant invalide")
+    return seance
+
+
+@router.put("/{seance_id}", response_model=schemas.SeanceResponse, dependencies=[Depends(admin_only)])
+async def update_seance(seance_id: int, req: schemas.SeanceCreate, db: AsyncSession = Depends(get_db)):
+    """
+    Move or edit a seance; rejected with 409 on collision (the seance never collides with itself).
+    """
+    seance = await db.get(models.Seance, seance_id)
+    if seance is None:
+        raise HTTPException(status_code=404, detail="Séance introuvable")
+
+    index = await conflicts.ensure_loaded(db)
+    _raise_if_conflicts(index.collisions(conflicts.Slot.of(req, ref=seance_id)))
+
+    for key, value in req.model_dump().items():
+        setattr(seance, key, value)
+    try:
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.exception(f"[update_seance] DB commit failed: {e}")
+        raise HTTPException(status_code=400, detail="Salle, matière, groupe ou enseignant invalide")
+    return seance
+
+
+@router.delete("/{seance_id}", status_code=204, dependencies=[Depends(admin_only)])
+async def delete_seance(seance_id: int, db: AsyncSession = Depends(get_db)):
+    seance = await db.get(models.Seance, seance_id)
+    if seance is None:
+        raise HTTPException(status_code=404, detail="Séance introuvable")
+    await db.delete(seance)
+    try:
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.exception(f"[delete_seance] DB commit failed: {e}")
+        raise HTTPException(status_code=409, detail="Séance référencée par des absences ou messages")
+
+
+# ---------------- Roll Call ----------------
+@router.put("/{seance_id}/appel", response_model=schemas.RollCallReport)
+async def record_roll_call(
+    seance_id: int,
+    req: schemas.RollCallRequest,
+    db: AsyncSession = Depends(get_db),
+    principal: Principal = Depends(teaching_staff),
+):
+    """
+    Record the whole roll of one seance occurrence, keyed on (etudiant, seance, date):
+    resubmitting overwrites statuses instead of duplicating rows. Three statements whatever
+    the size of the group: one SELECT reads the seance together with which of the submitted
+    students belong to its group, one multi-row upsert writes the statuses and one UPDATE
+    marks the seance as held, both in the same transaction.
+    """
+    # last entry wins when a student appears twice in the payload
+    statuses = {entry.id_etudiant: entry.statut for entry in req.entries}
+    result = (await db.execute(
+        select(models.Seance, models.Etudiant.id)
+        .outerjoin(models.Etudiant, and_(
+            models.Etudiant.id_groupe == models.Seance.id_groupe, models.Etudiant.id.in_(statuses),
+        ))
+        .where(models.Seance.id == seance_id)
+    )).all()
+    if not result:
+        raise HTTPException(status_code=404, detail="Séance introuvable")
+    seance = result[0][0]
+    if not principal.has_role("administratif") and seance.id_enseignant != principal.id:
+        raise HTTPException(status_code=403, detail="Accès refusé")
+    held_that_day = (
+        req.date == seance.specific_date if seance.specific_date is not None
+        else conflicts.weekday(req.date) == seance.day_of_week
+    )
+    if not held_that_day:
+        raise HTTPException(status_code=422, detail="La séance n'a pas lieu à cette date")
+
+    enrolled = {student_id for _, student_id in result if student_id is not None}
+    strangers = sorted(set(statuses) - enrolled)
+    if strangers:
+        raise HTTPException(
+            status_code=422,
+            detail={"message": "Étudiants hors du groupe de la séance", "etudiants": strangers},
+        )
+
+    rows = [
+        {"id_etudiant": student_id, "id_seance": seance_id, "date": req.date, "statut": statut}
+        for student_id, statut in statuses.items()
+    ]
+    try:
+        await db.execute(bulk.upsert(
+            models.Absence.__table__, ("id_etudiant", "id_seance", "date"), ("statut",), values=rows,
+        ))
+        await db.execute(update(models.Seance).where(models.Seance.id == seance_id).values(is_presente=True))
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.exception(f"[record_roll_call] DB commit failed for seance {seance_id}: {e}")
+        raise HTTPException(status_code=500, detail="Enregistrement de l'appel impossible")
+
+    # Core statements bypass model_events
+    analytics.invalidate([req.date])
+    return schemas.RollCallReport(
+        id_seance=seance_id,
+        date=req.date,
+        enregistres=len(rows),
+        par_statut=dict(Counter(statuses.values())),
+    )
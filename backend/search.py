@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import math
+from datetime import date, time as dtime, timedelta
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import schemas
+import occupancy
+import user_index
+from lazy_imports import lazy_module
+from conflicts import to_minutes, weekday
+from database import get_db
+from security import Principal, get_current_user
+
+np = lazy_module("numpy")
+
+# ---------------- Router ----------------
+router = APIRouter(prefix="/search", tags=["Search"], dependencies=[Depends(get_current_user)])
+
+DEFAULT_OPENING = dtime(8, 0)
+DEFAULT_CLOSING = dtime(19, 0)
+
+
+def _resolve_day(day_of_week: Optional[int], on: Optional[date]):
+    """
+    (day index, week key) for a query: a date selects that week's dated seances too.
+    """
+    if on is not None:
+        return weekday(on), occupancy.week_start(on)
+    if day_of_week is not None:
+        return day_of_week, None
+    raise HTTPException(status_code=422, detail="Renseigner date ou day_of_week")
+
+
+def _clock(cell: int) -> str:
+    minutes = cell * occupancy.CELL_MINUTES
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+# ---------------- Free Rooms ----------------
+@router.get("/free-rooms", response_model=List[schemas.FreeRoom])
+async def free_rooms(
+    heure_debut: dtime,
+    heure_fin: dtime,
+    jour: Optional[date] = Query(None, alias="date"),
+    day_of_week: Optional[int] = Query(None, ge=0, le=6),
+    type: Optional[str] = None,
+    capacite_min: Optional[int] = Query(None, ge=0),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Rooms of the requested type/capacity with no seance overlapping the slot.
+    """
+    if heure_fin <= heure_debut:
+        raise HTTPException(status_code=422, detail="heure_fin doit être après heure_debut")
+    day, week = _resolve_day(day_of_week, jour)
+    index = await occupancy.ensure_loaded(db)
+
+    c0, c1 = occupancy.cell_range(to_minutes(heure_debut), to_minutes(heure_fin))
+    rows = index.room_rows(type, capacite_min)
+    busy = index.grids["salle"].busy(week)[rows, day, c0:c1].any(axis=1)
+    room_ids = index.room_ids()[rows[~busy]]
+    return [index.rooms[int(room_id)] for room_id in room_ids if int(room_id) in index.rooms]
+
+
+# ---------------- Common Free Slots ----------------
+@router.get("/free-slots", response_model=schemas.FreeSlotReport)
+async def free_slots(
+    duree: int = Query(90, ge=occupancy.CELL_MINUTES, le=24 * 60, description="Durée en minutes"),
+    id_groupe: Optional[int] = None,
+    id_enseignant: Optional[int] = None,
+    salle_type: Optional[str] = None,
+    capacite_min: Optional[int] = Query(None, ge=0),
+    need_room: bool = True,
+    jour: Optional[date] = Query(None, alias="date"),
+    day_of_week: Optional[int] = Query(None, ge=0, le=6),
+    ouverture: dtime = DEFAULT_OPENING,
+    fermeture: dtime = DEFAULT_CLOSING,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Start windows where the group, the teacher and (optionally) at least one matching room
+    are all free for `duree` minutes. Without day_of_week, every day of the week is searched;
+    with a date, that week's one-off seances are taken into account.
+    """
+    week = occupancy.week_start(jour) if jour is not None else None
+    if jour is not None:
+        days = [weekday(jour)]
+    elif day_of_week is not None:
+        days = [day_of_week]
+    else:
+        days = list(range(occupancy.DAYS))
+    index = await occupancy.ensure_loaded(db)
+
+    length = math.ceil(duree / occupancy.CELL_MINUTES)
+    open_mask = np.zeros(occupancy.CELLS, dtype=bool)
+    open_c0, open_c1 = occupancy.cell_range(to_minutes(ouverture), to_minutes(fermeture))
+    open_mask[open_c0:open_c1] = True
+
+    free = np.broadcast_to(open_mask, (occupancy.DAYS, occupancy.CELLS)).copy()
+    if id_groupe is not None:
+        free &= ~index.grids["groupe"].busy_row(id_groupe, week)
+    if id_enseignant is not None:
+        free &= ~index.grids["enseignant"].busy_row(id_enseignant, week)
+    ok = occupancy.window_free(free, length)
+
+    rooms_available = None
+    if need_room:
+        rows = index.room_rows(salle_type, capacite_min)
+        room_free = ~index.grids["salle"].busy(week)[rows] & open_mask
+        rooms_available = occupancy.window_free(room_free, length).sum(axis=0)
+        ok &= rooms_available > 0
+
+    slots = []
+    for day in days:
+        for start, stop in occupancy.runs(ok[day]):
+            slots.append(schemas.FreeSlot(
+                day_of_week=day,
+                jour=(week + timedelta(days=day)) if week is not None else None,
+                debut_au_plus_tot=_clock(start),
+                debut_au_plus_tard=_clock(stop - 1),
+                fin_au_plus_tard=_clock(stop - 1 + length),
+                salles_disponibles=int(rooms_available[day, start:stop].min()) if rooms_available is not None else None,
+            ))
+    return schemas.FreeSlotReport(duree=duree, week_start=week, slots=slots)
+
+
+# ---------------- Users ----------------
+@router.get("/utilisateurs", response_model=schemas.UserSearchPage)
+async def search_users(
+    q: str = Query(..., min_length=1, max_length=100, description="Début de nom, prénom ou email (cin pour l'administration)"),
+    role: Optional[List[schemas.RoleName]] = Query(None),
+    limit: int = Query(10, ge=1, le=50),
+    principal: Principal = Depends(get_current_user),
+):
+    """
+    Autocomplete over every user from the in-memory index: accent- and case-insensitive prefixes
+    of each word, then names containing the term (typos included) when prefixes find too few.
+    """
+    index = await user_index.current()
+    total, hits = index.search(q, roles=role, limit=limit, with_cin=principal.has_role("administratif"))
+    return schemas.UserSearchPage(
+        total=total,
+        results=[
+            schemas.UserSearchHit(id=e.id, nom=e.nom, prenom=e.prenom, email=e.email, role=e.role, score=score)
+            for e, score in hits
+        ],
+    )
@@ -0,0 +1,211 @@
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from fastapi import Depends, HTTPException, Query
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+import schemas
+import auth_utils
+from database import get_db
+
+# ---------------- Configuration ----------------
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 5000))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 30))
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """
+    Authenticated caller, built from the JWT claims only.
+    """
+    id: Optional[int]
+    email: str
+    roles: Tuple[str, ...]
+
+    def has_role(self, *roles: str) -> bool:
+        return any(role in self.roles for role in roles)
+
+
+class ExpiringLRU:
+    """
+    Bounded LRU mapping where every entry carries its own absolute expiry (epoch seconds).
+    Not thread-safe: only used from the event loop.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[object, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at = entry
+        if expires_at <= time.time():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, expires_at: float):
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        self._data.pop(key, None)
+
+    def keys(self) -> list:
+        return list(self._data)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+token_cache = ExpiringLRU(TOKEN_CACHE_SIZE)
+user_cache = ExpiringLRU(USER_CACHE_SIZE)
+
+
+def _unauthorized(detail: str = "Jeton invalide ou expiré") -> HTTPException:
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+
+def principal_from_token(token: str) -> Optional[Principal]:
+    """
+    Return the Principal for a token, verifying the signature only on a cache miss.
+    """
+    principal = token_cache.get(token)
+    if principal is not None:
+        return principal
+
+    payload = auth_utils.decode_access_token(token)
+    if not payload or "sub" not in payload:
+        return None
+
+    principal = Principal(
+        id=payload.get("uid"),
+        email=payload["sub"],
+        roles=tuple(payload.get("roles", ())),
+    )
+    token_cache.set(token, principal, float(payload["exp"]))
+    return principal
+
+
+# ---------------- Dependencies ----------------
+async def get_current_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+) -> Principal:
+    """
+    Resolve the bearer token to a Principal without touching the database.
+    """
+    if credentials is None:
+        raise _unauthorized("Authentification requise")
+    principal = principal_from_token(credentials.credentials)
+    if principal is None:
+        raise _unauthorized()
+    return principal
+
+
+async def get_feed_principal(
+    token: Optional[str] = Query(None, description="Jeton de flux calendrier (POST /emploi-du-temps/moi/ics/jeton)"),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+    db: AsyncSession = Depends(get_db),
+) -> Principal:
+    """
+    For the iCalendar routes only: a bearer JWT, or ?token= carrying the caller's calendar feed
+    token (checked against its current secret, one primary-key lookup).
+    """
+    if credentials is not None:
+        return await get_current_user(credentials)
+    if not token:
+        raise _unauthorized("Authentification requise")
+    user_id = auth_utils.feed_token_user_id(token)
+    row = None
+    if user_id is not None:
+        row = (await db.execute(
+            select(models.JetonCalendrier.secret, models.Utilisateur.email, models.Utilisateur.role,
+                   models.Chef.id.label("id_chef"))
+            .join(models.Utilisateur, models.Utilisateur.id == models.JetonCalendrier.id_utilisateur)
+            .outerjoin(models.Chef, models.Chef.id == models.JetonCalendrier.id_utilisateur)
+            .where(models.JetonCalendrier.id_utilisateur == user_id)
+        )).first()
+    if row is None or not auth_utils.verify_feed_token(token, user_id, row.secret):
+        raise _unauthorized()
+    # same roles as signin puts in the JWT: a teacher heading a department is also "chef"
+    roles = (row.role, "chef") if row.role == "enseignant" and row.id_chef is not None else (row.role,)
+    return Principal(id=user_id, email=row.email, roles=roles)
+
+
+async def get_current_user_row(
+    principal: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> schemas.UserResponse:
+    """
+    Full user row for routes that need it, served from a short-TTL cache.
+    """
+    key = principal.id if principal.id is not None else principal.email
+    cached = user_cache.get(key)
+    if cached is not None:
+        return cached
+
+    query = select(models.Utilisateur)
+    if principal.id is not None:
+        query = query.filter(models.Utilisateur.id == principal.id)
+    else:
+        query = query.filter(models.Utilisateur.email == principal.email)
+    user = (await db.execute(query)).scalars().first()
+    if user is None:
+        raise _unauthorized("Utilisateur introuvable")
+
+    row = schemas.UserResponse.model_validate(user)
+    user_cache.set(key, row, time.time() + USER_CACHE_TTL)
+    return row
+
+
+async def get_current_user_id(
+    principal: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> int:
+    """
+    Caller's user id: the `uid` claim, or a cached row lookup for tokens issued before it existed.
+    """
+    if principal.id is not None:
+        return principal.id
+    return (await get_current_user_row(principal, db)).id
+
+
+def invalidate_user(user_id: int):
+    """
+    Drop a user from the row cache after it has been modified.
+    """
+    user_cache.pop(user_id)
+
+
+def require_roles(*roles: str):
+    """
+    Dependency factory restricting a route to principals holding one of the given roles.
+    """
+    async def dependency(principal: Principal = Depends(get_current_user)) -> Principal:
+        if not principal.has_role(*roles):
+            raise HTTPException(status_code=403, detail="Accès refusé")
+        return principal
+
+    return dependency
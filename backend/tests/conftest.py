@@ -0,0 +1,74 @@
+import os
+import sys
+import shutil
+import tempfile
+
+import pytest
+from sqlalchemy import event
+
+# ---------------- Test environment ----------------
+# Set before any backend module is imported: they read their configuration at import time.
+TEST_DIR = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ.update(
+    ENV_FILE=os.path.join(TEST_DIR, "absent.env"),
+    DATABASE_URL=f"sqlite:///{TEST_DIR}/test.db",
+    SECRET_KEY="test-secret-key-of-at-least-32-bytes!",
+    SCHEMA_CHECK="off",
+    WARMUP="false",
+    EMAIL_USER="",
+    FICHIERS_DIR=os.path.join(TEST_DIR, "fichiers"),
+    FICHIER_GC_INTERVAL="0",
+    HASH_POOL_WORKERS="1",
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+import models  # noqa: E402
+
+models.Base.metadata.create_all(database.engine)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def sync_db():
+    """
+    A sync session on the test database, for seeding rows and checking results.
+    """
+    with database.SessionLocal() as db:
+        yield db
+
+
+@pytest.fixture
+def statements():
+    """
+    The SQL statements the app's async engine sends during the test.
+    """
+    seen = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement)
+
+    event.listen(database.async_engine.sync_engine, "before_cursor_execute", record)
+    yield seen
+    event.remove(database.async_engine.sync_engine, "before_cursor_execute", record)
+
+
+class RacingSession:
+    """
+    Wraps an async session for a cache build: runs `during` once its first SELECT has returned,
+    as if a commit had landed while the build awaited it.
+    """
+
+    def __init__(self, db, during):
+        self.db = db
+        self.during = during
+
+    async def execute(self, statement):
+        result = await self.db.execute(statement)
+        if self.during is not None:
+            self.during, during = None, self.during
+            during()
+        return result
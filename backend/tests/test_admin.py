@@ -0,0 +1,64 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+import admin
+import auth_utils
+import database
+import main
+import models
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as c:
+        yield c
+
+
+@pytest.fixture(scope="module")
+def headers():
+    token = auth_utils.create_access_token({"sub": "admin@example.tn", "uid": 920001, "roles": ["administratif"]})
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def pending_users(sync_db):
+    users = [
+        models.Utilisateur(nom=f"Act{i}", prenom="Test", email=f"activation{i}@example.tn", cin=77000000 + i, role="etudiant")
+        for i in range(3)
+    ]
+    sync_db.add_all(users)
+    sync_db.commit()
+    return [{"id": u.id, "cin": str(u.cin), "email": u.email} for u in users]
+
+
+def _outbox(sync_db, emails):
+    return sync_db.scalar(select(func.count()).select_from(models.EmailOutbox).where(models.EmailOutbox.to_email.in_(emails)))
+
+
+def test_accounts_activated_concurrently_keep_their_password(client, headers, pending_users, sync_db, monkeypatch):
+    raced = pending_users[1]
+
+    async def hash_passwords(passwords):
+        # a signup for one of the accounts commits while the batch is hashing
+        with database.SessionLocal() as other:
+            other.get(models.Utilisateur, raced["id"]).mdp_hash = "hash-from-signup"
+            other.commit()
+        return [f"hash-{uuid.uuid4().hex}" for _ in passwords]
+
+    monkeypatch.setattr(admin.hash_pool, "hash_passwords", hash_passwords)
+    response = client.post("/admin/users/activate", headers=headers,
+                           json={"users": [{"cin": u["cin"], "email": u["email"]} for u in pending_users]})
+
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert (report["activated"], report["already_active"], report["emails_queued"]) == (2, 1, 2)
+    statuses = {r["id"]: r["status"] for r in report["results"]}
+    assert statuses[raced["id"]] == "already_active"
+
+    sync_db.expire_all()
+    assert sync_db.get(models.Utilisateur, raced["id"]).mdp_hash == "hash-from-signup"
+    assert _outbox(sync_db, [raced["email"]]) == 0
+    assert _outbox(sync_db, [u["email"] for u in pending_users if u is not raced]) == 2
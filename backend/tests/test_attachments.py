@@ -0,0 +1,61 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import auth_utils
+import attachments
+import main
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"pixels" * 100
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as c:
+        yield c
+
+
+@pytest.fixture(scope="module")
+def token():
+    return auth_utils.create_access_token({"sub": "fichiers@example.tn", "uid": 900001, "roles": ["enseignant"]})
+
+
+@pytest.fixture(scope="module")
+def blob(client, token):
+    response = client.post("/fichiers", content=PNG, headers={"Authorization": f"Bearer {token}", "Content-Type": "image/png"})
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def test_signed_links_open_the_blob_without_credentials(client, token, blob):
+    assert client.get(blob["lien"]).content == PNG
+
+    response = client.get(f"/fichiers/{blob['sha256']}/lien", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    link = response.json()
+    assert link["url"] == blob["lien"]
+    assert attachments.FICHIER_URL_TTL < link["expires_at"] - time.time() <= 2 * attachments.FICHIER_URL_TTL
+    assert "token" not in link["url"]
+    assert client.get(link["url"], headers={"Range": "bytes=0-7"}).content == PNG[:8]
+
+
+def test_bearer_token_still_works_in_the_header(client, token, blob):
+    response = client.get(blob["url"], headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200 and response.content == PNG
+
+
+def test_unsigned_tampered_or_expired_links_are_refused(client, token, blob):
+    digest = blob["sha256"]
+    assert client.get(blob["url"]).status_code == 401
+    # access tokens are not accepted in the URL anymore
+    assert client.get(blob["url"], params={"token": token}).status_code == 401
+
+    url, expires = attachments.signed_url(digest)
+    assert client.get(url.replace(f"expires={expires}", f"expires={expires + 3600}")).status_code == 403
+    other = "0" * 64
+    assert client.get(url.replace(digest, other)).status_code == 403
+
+    past = int(time.time()) - 1
+    expired = f"{blob['url']}?expires={past}&signature={attachments._signature(digest, past)}"
+    assert client.get(expired).status_code == 403
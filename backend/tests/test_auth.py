@@ -0,0 +1,48 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import auth_utils
+import database
+import main
+import models
+
+PASSWORD = "Mot-de-passe-1"
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as c:
+        yield c
+
+
+@pytest.fixture(scope="module")
+def chef():
+    """
+    An enseignant who is also chef: signin has to read utilisateur, enseignant and chef.
+    """
+    with database.SessionLocal() as db:
+        user = models.Utilisateur(
+            nom="Trabelsi", prenom="Sami", email="sami.trabelsi@example.tn", cin=11223344,
+            mdp_hash=auth_utils.hash_password(PASSWORD), role="enseignant",
+        )
+        db.add(user)
+        db.flush()
+        db.add_all([models.Enseignant(id=user.id), models.Chef(id=user.id)])
+        db.commit()
+        return {"id": user.id, "email": user.email, "cin": user.cin}
+
+
+@pytest.mark.parametrize("identifier", ["email", "cin"])
+def test_signin_runs_one_statement(client, chef, statements, identifier):
+    response = client.post("/auth/signin", json={"cin_or_email": str(chef[identifier]), "password": PASSWORD})
+
+    assert response.status_code == 200
+    assert response.json()["roles"] == ["enseignant", "chef"]
+    assert len(statements) == 1, statements
+
+
+def test_signin_unknown_identifier_runs_no_statement(client, statements):
+    response = client.post("/auth/signin", json={"cin_or_email": "pas-un-identifiant", "password": PASSWORD})
+
+    assert response.status_code == 401
+    assert statements == []
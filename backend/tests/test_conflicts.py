@@ -0,0 +1,50 @@
+import asyncio
+from datetime import time
+
+import pytest
+from sqlalchemy import delete
+
+import conflicts
+from conftest import RacingSession
+import database
+import models
+
+MONDAY = 1
+SLOT = dict(day_of_week=MONDAY, specific_date=None, heure_debut=time(8, 0), heure_fin=time(10, 0),
+            id_salle=990001, id_matiere=1, id_groupe=990002, id_enseignant=990003)
+
+
+@pytest.fixture
+def stored(sync_db):
+    seance = models.Seance(**SLOT)
+    sync_db.add(seance)
+    sync_db.commit()
+    row = {"id": seance.id, **SLOT}
+    yield row
+    sync_db.execute(delete(models.Seance).where(models.Seance.id == seance.id))
+    sync_db.commit()
+
+
+def test_changes_committed_during_a_rebuild_are_kept(monkeypatch, stored):
+    monkeypatch.setattr(conflicts, "_loaded_at", None)
+    monkeypatch.setattr(conflicts, "index", conflicts.ConflictIndex())
+    added = {**SLOT, "id": 10 ** 9, "id_salle": 990004, "id_groupe": 990005, "id_enseignant": 990006}
+
+    def during():
+        conflicts._on_seance_change([added], [stored])
+
+    async def rebuild():
+        try:
+            async with database.AsyncSessionLocal() as db:
+                return await conflicts.ensure_loaded(RacingSession(db, during))
+        finally:
+            await database.async_engine.dispose()
+
+    index = asyncio.run(rebuild())
+
+    assert added["id"] in index.slots
+    assert stored["id"] not in index.slots
+    # the seance created meanwhile blocks its room
+    probe = conflicts.Slot.of({**added, "id": None, "id_groupe": 1, "id_enseignant": 1})
+    assert [c.kind for c in index.collisions(probe)] == ["salle"]
+    assert conflicts._during_build is None
@@ -0,0 +1,55 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import auth_utils
+import events
+import main
+
+USER_ID = 910001
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as c:
+        yield c
+
+
+@pytest.fixture
+def jwt():
+    return auth_utils.create_access_token({"sub": "flux@example.tn", "uid": USER_ID, "roles": ["etudiant"]})
+
+
+@pytest.fixture(autouse=True)
+def finite_stream(monkeypatch):
+    # the real stream never ends; report who it was opened for instead
+    async def stream(user_id, last_event_id):
+        yield f"user {user_id}\n"
+
+    monkeypatch.setattr(events, "_stream", stream)
+
+
+def test_ticket_opens_the_stream(client, jwt):
+    response = client.post("/events/ticket", headers={"Authorization": f"Bearer {jwt}"})
+    assert response.status_code == 200
+    ticket = response.json()
+    assert 0 < ticket["expires_at"] - time.time() <= auth_utils.STREAM_TICKET_TTL
+
+    response = client.get("/events/stream", params={"ticket": ticket["ticket"]})
+    assert response.status_code == 200
+    assert response.text == f"user {USER_ID}\n"
+    assert client.get("/events/stream", headers={"Authorization": f"Bearer {jwt}"}).text == f"user {USER_ID}\n"
+
+
+def test_access_tokens_and_bad_tickets_are_refused(client, jwt):
+    assert client.get("/events/stream", params={"token": jwt}).status_code == 401
+    assert client.get("/events/stream", params={"ticket": jwt}).status_code == 401
+
+    ticket, _ = auth_utils.create_stream_ticket(USER_ID)
+    forged = ticket.replace(f"{USER_ID}.", f"{USER_ID + 1}.", 1)
+    assert client.get("/events/stream", params={"ticket": forged}).status_code == 401
+
+    past = int(time.time()) - 1
+    expired = f"{USER_ID}.{past}.{auth_utils._ticket_signature(USER_ID, past)}"
+    assert client.get("/events/stream", params={"ticket": expired}).status_code == 401
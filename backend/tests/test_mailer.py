@@ -0,0 +1,217 @@
+import asyncio
+import socket
+from datetime import datetime, timedelta
+
+import pytest
+from aiosmtpd.controller import Controller
+from sqlalchemy import delete, select, update
+
+import database
+import mailer
+import models
+
+
+class Mailbox:
+    """
+    aiosmtpd handler: keeps what it accepts, refuses "inconnu@" recipients for good and can
+    answer DATA with a temporary failure a given number of times.
+    """
+
+    def __init__(self):
+        self.received = []
+        self.temporary_failures = 0
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("inconnu@"):
+            return "550 5.1.1 Unknown recipient"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.temporary_failures:
+            self.temporary_failures -= 1
+            return "451 4.3.0 Try again later"
+        self.received.extend(envelope.rcpt_tos)
+        return "250 Message accepted"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def mailbox():
+    handler = Mailbox()
+    controller = Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    handler.port = controller.port
+    yield handler
+    controller.stop()
+
+
+@pytest.fixture(autouse=True)
+def outbox(monkeypatch, sync_db):
+    monkeypatch.setattr(mailer, "MAIL_FROM", "noreply@example.tn")
+    monkeypatch.setattr(mailer, "MAIL_RATE_PER_MINUTE", 60_000)
+    sync_db.execute(delete(models.EmailOutbox))
+    sync_db.commit()
+
+
+def _dispatcher(mailbox: Mailbox) -> mailer.OutboxDispatcher:
+    dispatcher = mailer.OutboxDispatcher()
+    dispatcher.pool = mailer.SMTPConnectionPool("127.0.0.1", mailbox.port, False, None, None, size=2)
+    return dispatcher
+
+
+def _run(coroutine):
+    async def wrapper():
+        try:
+            return await coroutine
+        finally:
+            # pooled connections belong to this event loop
+            await database.async_engine.dispose()
+    return asyncio.run(wrapper())
+
+
+async def _enqueue(*recipients: str):
+    async with database.AsyncSessionLocal() as db:
+        await mailer.enqueue_emails(db, [(to, "Sujet", f"Bonjour {to}") for to in recipients])
+        await db.commit()
+
+
+def _rows(sync_db):
+    sync_db.expire_all()
+    return sync_db.execute(select(models.EmailOutbox).order_by(models.EmailOutbox.id)).scalars().all()
+
+
+def test_delivers_pending_messages_over_the_pool(mailbox, sync_db):
+    recipients = [f"etu{i}@example.tn" for i in range(5)]
+
+    async def scenario():
+        await _enqueue(*recipients)
+        dispatcher = _dispatcher(mailbox)
+        processed = await dispatcher.dispatch_once()
+        await dispatcher.pool.close()
+        return processed, dispatcher
+
+    processed, dispatcher = _run(scenario())
+
+    assert processed == 5
+    assert sorted(mailbox.received) == sorted(recipients)
+    assert all(row.status == "sent" and row.attempts == 1 and row.lock_token is None for row in _rows(sync_db))
+    # delivered mails keep no body (activation mails carry passwords)
+    assert all(row.body is None for row in _rows(sync_db))
+    # five messages, at most pool-size connections
+    assert dispatcher.pool.connects <= 2
+
+
+def test_temporary_failure_is_retried_after_backoff(mailbox, sync_db):
+    mailbox.temporary_failures = 1
+
+    async def first_attempt():
+        await _enqueue("etu@example.tn")
+        dispatcher = _dispatcher(mailbox)
+        started = datetime.utcnow()
+        await dispatcher.dispatch_once()
+        # not due yet: nothing is claimed
+        again = await dispatcher.dispatch_once()
+        await dispatcher.pool.close()
+        return started, again
+
+    started, again = _run(first_attempt())
+    [row] = _rows(sync_db)
+    assert again == 0 and mailbox.received == []
+    assert row.status == "pending" and row.attempts == 1 and "451" in row.last_error
+    assert row.body == "Bonjour etu@example.tn"
+    delay = (row.next_attempt_at - started).total_seconds()
+    assert mailer.MAIL_BACKOFF_BASE * 0.8 - 1 <= delay <= mailer.MAIL_BACKOFF_BASE * 1.2 + 1
+
+    sync_db.execute(update(models.EmailOutbox).values(next_attempt_at=datetime.utcnow() - timedelta(seconds=1)))
+    sync_db.commit()
+
+    async def second_attempt():
+        dispatcher = _dispatcher(mailbox)
+        processed = await dispatcher.dispatch_once()
+        await dispatcher.pool.close()
+        return processed
+
+    assert _run(second_attempt()) == 1
+    [row] = _rows(sync_db)
+    assert row.status == "sent" and row.attempts == 2
+    assert mailbox.received == ["etu@example.tn"]
+
+
+def test_refused_recipient_fails_without_retry(mailbox, sync_db):
+    async def scenario():
+        await _enqueue("inconnu@example.tn")
+        dispatcher = _dispatcher(mailbox)
+        await dispatcher.dispatch_once()
+        await dispatcher.pool.close()
+
+    _run(scenario())
+    [row] = _rows(sync_db)
+    assert row.status == "failed" and row.attempts == 1 and row.body is None
+
+
+def test_concurrent_dispatchers_claim_each_message_once(mailbox, sync_db):
+    recipients = [f"ens{i}@example.tn" for i in range(20)]
+
+    async def scenario():
+        await _enqueue(*recipients)
+        dispatchers = [_dispatcher(mailbox) for _ in range(3)]
+        processed = await asyncio.gather(*(d.dispatch_once() for d in dispatchers))
+        for d in dispatchers:
+            await d.pool.close()
+        return processed
+
+    processed = _run(scenario())
+
+    assert sum(processed) == len(recipients)
+    assert sorted(mailbox.received) == sorted(recipients)
+    assert all(row.status == "sent" and row.attempts == 1 for row in _rows(sync_db))
+
+
+def test_stale_claims_are_recovered(sync_db):
+    async def scenario():
+        await _enqueue("etu@example.tn")
+        async with database.AsyncSessionLocal() as db:
+            await db.execute(update(models.EmailOutbox).values(
+                status="sending", lock_token="0" * 32,
+                locked_at=datetime.utcnow() - timedelta(seconds=mailer.MAIL_LOCK_TIMEOUT + 1),
+            ))
+            await db.commit()
+        await mailer.OutboxDispatcher().recover_stale()
+
+    _run(scenario())
+    [row] = _rows(sync_db)
+    assert row.status == "pending" and row.lock_token is None
+
+
+def test_running_dispatcher_keeps_recovering_stale_claims(mailbox, monkeypatch, sync_db):
+    monkeypatch.setattr(mailer, "MAIL_RECOVER_INTERVAL", 0)
+    monkeypatch.setattr(mailer, "MAIL_POLL_INTERVAL", 0.05)
+
+    async def scenario():
+        dispatcher = _dispatcher(mailbox)
+        dispatcher.start()
+        await asyncio.sleep(0.2)
+        # a worker crashed after claiming this row, long after the dispatcher started
+        await _enqueue("etu@example.tn")
+        async with database.AsyncSessionLocal() as db:
+            await db.execute(update(models.EmailOutbox).values(
+                status="sending", lock_token="0" * 32,
+                locked_at=datetime.utcnow() - timedelta(seconds=mailer.MAIL_LOCK_TIMEOUT + 1),
+            ))
+            await db.commit()
+        for _ in range(100):
+            if mailbox.received:
+                break
+            await asyncio.sleep(0.05)
+        await dispatcher.stop()
+
+    _run(scenario())
+    assert mailbox.received == ["etu@example.tn"]
+    [row] = _rows(sync_db)
+    assert row.status == "sent"
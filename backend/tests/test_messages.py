@@ -0,0 +1,62 @@
+import asyncio
+from datetime import date
+
+from sqlalchemy import delete, insert, select, update
+
+import database
+import messages
+import models
+
+USER, SENDER = 990101, 990102
+
+
+class DeliveringSession:
+    """
+    Wraps an async session: after the first statement, a message is delivered to USER
+    (row and counter), as another request would between _mark_read's two writes.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.delivered = False
+
+    async def execute(self, statement):
+        result = await self.db.execute(statement)
+        if not self.delivered:
+            self.delivered = True
+            await self.db.execute(insert(models.Message).values(
+                id_expediteur=SENDER, id_destinataire=USER, contenu="tard", date=date.today(), lu=False,
+            ))
+            counter = models.MessageCounter
+            await self.db.execute(update(counter).where(counter.id_utilisateur == USER).values(non_lus=counter.non_lus + 1))
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+
+def test_read_all_keeps_a_message_delivered_meanwhile(sync_db):
+    sync_db.add_all([
+        models.Message(id_expediteur=SENDER, id_destinataire=USER, contenu=str(i), date=date.today(), lu=False)
+        for i in range(2)
+    ])
+    sync_db.add(models.MessageCounter(id_utilisateur=USER, non_lus=2))
+    sync_db.commit()
+
+    async def read_all():
+        try:
+            async with database.AsyncSessionLocal() as db:
+                return await messages._mark_read(DeliveringSession(db), USER, None)
+        finally:
+            await database.async_engine.dispose()
+
+    try:
+        report = asyncio.run(read_all())
+        assert report.marques == 2
+        assert report.non_lus == 1
+        sync_db.expire_all()
+        assert sync_db.scalar(select(models.MessageCounter.non_lus).where(models.MessageCounter.id_utilisateur == USER)) == 1
+    finally:
+        sync_db.execute(delete(models.Message).where(models.Message.id_destinataire == USER))
+        sync_db.execute(delete(models.MessageCounter).where(models.MessageCounter.id_utilisateur == USER))
+        sync_db.commit()
@@ -0,0 +1,21 @@
+from fastapi.testclient import TestClient
+
+import main
+import metrics
+
+
+def test_metrics_are_not_exposed_without_a_configured_token(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", None)
+    with TestClient(main.app) as client:
+        assert client.get("/metrics").status_code == 404
+        assert client.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 404
+
+
+def test_metrics_require_the_token(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "scrape-me")
+    with TestClient(main.app) as client:
+        assert client.get("/metrics").status_code == 401
+        assert client.get("/metrics", headers={"Authorization": "Bearer autre"}).status_code == 401
+        response = client.get("/metrics", headers={"Authorization": "Bearer scrape-me"})
+    assert response.status_code == 200
+    assert "# TYPE http_request_duration_seconds histogram" in response.text
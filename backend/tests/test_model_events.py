@@ -0,0 +1,50 @@
+import pytest
+
+import model_events
+import models
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    # replace the app's Salle subscribers for the duration of the test
+    received = {"changes": [], "inserts": []}
+    monkeypatch.setitem(model_events._subscribers, models.Salle,
+                        [lambda upserted, deleted: received["changes"].append((upserted, deleted))])
+    monkeypatch.setitem(model_events._insert_subscribers, models.Salle,
+                        [lambda inserted: received["inserts"].append(inserted)])
+    return received
+
+
+def test_every_insert_of_one_commit_is_dispatched(calls, sync_db):
+    salles = [models.Salle(numero=f"B{i}", type="td", capacite=30) for i in range(4)]
+    sync_db.add_all(salles)
+    sync_db.flush()
+    # updated before the commit: still reported once, as an insert
+    salles[0].capacite = 40
+    sync_db.commit()
+
+    [(upserted, deleted)] = calls["changes"]
+    [inserted] = calls["inserts"]
+    assert sorted(row["numero"] for row in upserted) == ["B0", "B1", "B2", "B3"]
+    assert sorted(row["numero"] for row in inserted) == ["B0", "B1", "B2", "B3"]
+    assert next(row for row in upserted if row["numero"] == "B0")["capacite"] == 40
+    assert deleted == []
+
+
+def test_update_and_delete_are_dispatched_once_committed(calls, sync_db):
+    salles = [models.Salle(numero=f"C{i}", type="td", capacite=30) for i in range(2)]
+    sync_db.add_all(salles)
+    sync_db.commit()
+    calls["changes"].clear()
+    calls["inserts"].clear()
+
+    salles[0].capacite = 50
+    sync_db.delete(salles[1])
+    sync_db.flush()
+    assert calls["changes"] == []
+    sync_db.commit()
+
+    [(upserted, deleted)] = calls["changes"]
+    assert [(row["numero"], row["capacite"]) for row in upserted] == [("C0", 50)]
+    assert [row["numero"] for row in deleted] == ["C1"]
+    assert calls["inserts"] == []
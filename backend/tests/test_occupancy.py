@@ -0,0 +1,49 @@
+import asyncio
+from datetime import time
+
+import pytest
+from sqlalchemy import delete
+
+import database
+import models
+import occupancy
+from conftest import RacingSession
+
+SLOT = dict(day_of_week=1, specific_date=None, heure_debut=time(8, 0), heure_fin=time(10, 0),
+            id_salle=991001, id_matiere=1, id_groupe=991002, id_enseignant=991003)
+
+
+@pytest.fixture
+def stored(sync_db):
+    seance = models.Seance(**SLOT)
+    sync_db.add(seance)
+    sync_db.commit()
+    yield {"id": seance.id, **SLOT}
+    sync_db.execute(delete(models.Seance).where(models.Seance.id == seance.id))
+    sync_db.commit()
+
+
+def test_changes_committed_during_a_rebuild_are_kept(monkeypatch, stored):
+    monkeypatch.setattr(occupancy, "_loaded_at", None)
+    room = {"id": 991004, "numero": "Z1", "type": "td", "capacite": 20}
+    booked = {**SLOT, "id": 10 ** 9, "id_salle": room["id"], "id_groupe": 991005, "id_enseignant": 991006}
+
+    def during():
+        occupancy._on_salle_change([room], [])
+        occupancy._on_seance_change([booked], [stored])
+
+    async def rebuild():
+        try:
+            async with database.AsyncSessionLocal() as db:
+                return await occupancy.ensure_loaded(RacingSession(db, during))
+        finally:
+            await database.async_engine.dispose()
+
+    index = asyncio.run(rebuild())
+
+    assert room["id"] in index.grids["salle"].rows
+    assert index.grids["salle"].busy_row(room["id"])[SLOT["day_of_week"]].any()
+    assert booked["id"] in index.footprints
+    assert stored["id"] not in index.footprints
+    assert not index.grids["salle"].busy_row(SLOT["id_salle"]).any()
+    assert occupancy._during_build is None
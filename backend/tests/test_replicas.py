@@ -0,0 +1,133 @@
+import os
+import shutil
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import conftest
+import database
+import models
+import replicas
+
+
+def _create_replica(path: str) -> str:
+    """
+    A second SQLite file with the schema but no rows: a read tells which file answered it.
+    """
+    os.makedirs(path, exist_ok=True)
+    url = f"sqlite:///{path}/replica.db"
+    engine = create_engine(url)
+    models.Base.metadata.create_all(engine)
+    engine.dispose()
+    return url
+
+
+@pytest.fixture
+def replica_dir():
+    path = os.path.join(conftest.TEST_DIR, "replica")
+    yield path, _create_replica(path)
+    shutil.rmtree(path, ignore_errors=True)
+
+
+@pytest.fixture
+def app(monkeypatch, replica_dir, sync_db):
+    _, url = replica_dir
+    replica_set = replicas.ReplicaSet([url])
+    monkeypatch.setattr(replicas, "replicas", replica_set)
+    sync_db.add(models.Salle(numero="R1", type="cours", capacite=30))
+    sync_db.commit()
+
+    app = FastAPI()
+    app.add_middleware(replicas.ReadYourWritesMiddleware)
+
+    @app.get("/salles/count")
+    async def count(db: AsyncSession = Depends(replicas.get_read_db)):
+        salles = (await db.execute(select(func.count()).select_from(models.Salle))).scalar()
+        return {"on_replica": salles == 0}
+
+    @app.post("/salles")
+    async def create(db: AsyncSession = Depends(database.get_db)):
+        db.add(models.Salle(numero="R2", type="td", capacite=20))
+        await db.commit()
+
+    @app.get("/cached")
+    async def cached(db: AsyncSession = Depends(replicas.get_read_db)):
+        return {}
+
+    event.listen(database.async_engine.sync_engine, "after_cursor_execute", replicas._note_write)
+    yield app, replica_set
+    event.remove(database.async_engine.sync_engine, "after_cursor_execute", replicas._note_write)
+    replicas._pins.clear()
+
+
+def _on_replica(client, caller):
+    response = client.get("/salles/count", headers={"Authorization": f"Bearer {caller}"})
+    assert response.status_code == 200, response.text
+    return response.json()["on_replica"]
+
+
+def test_reads_go_to_the_replica_until_the_caller_writes(app):
+    app, replica_set = app
+    with TestClient(app) as client:
+        assert _on_replica(client, "alice") and _on_replica(client, "bob")
+
+        assert client.post("/salles", headers={"Authorization": "Bearer alice"}).status_code == 200
+
+        # alice reads her write back from the primary, bob keeps using the replica
+        assert not _on_replica(client, "alice")
+        assert _on_replica(client, "bob")
+    assert replica_set.replicas[0].served == 3
+
+
+def test_sessions_take_no_connection_until_queried(app):
+    app, replica_set = app
+    replica = replica_set.replicas[0]
+    checkouts = []
+    event.listen(replica.engine.sync_engine.pool, "checkout", lambda *args: checkouts.append(args))
+    with TestClient(app) as client:
+        assert client.get("/cached").status_code == 200
+        assert checkouts == []
+        assert _on_replica(client, "alice")
+    assert len(checkouts) == 1
+
+
+def test_reads_fall_back_to_the_primary_when_the_replica_is_down(app, replica_dir):
+    app, replica_set = app
+    path, _ = replica_dir
+    replica = replica_set.replicas[0]
+    with TestClient(app, raise_server_exceptions=False) as client:
+        assert _on_replica(client, "alice")
+
+        # the replica's file goes away: new connections to it fail
+        client.portal.call(replica.engine.dispose)
+        shutil.rmtree(path)
+
+        # the health check takes it out of rotation
+        client.portal.call(replica_set.check_all)
+        assert not replica.healthy
+        assert not _on_replica(client, "alice")
+        assert replica_set.fallbacks == 0
+
+        replica.healthy = True
+        failures = replica.failures
+        # a failed checkout marks it down at once; that statement itself is not retried
+        response = client.get("/salles/count")
+        assert response.status_code == 500
+        assert not replica.healthy and replica.failures > failures
+
+        # a session opened while it looked healthy moves to the primary on its next statement
+        async def read_on_session_opened_before_the_failure():
+            async with replica.sessions() as db:
+                replica.healthy = False
+                return (await db.execute(select(func.count()).select_from(models.Salle))).scalar()
+
+        assert client.portal.call(read_on_session_opened_before_the_failure) > 0
+        assert replica_set.fallbacks == 1
+
+        # back up: back in rotation at the next check
+        _create_replica(path)
+        client.portal.call(replica_set.check_all)
+        assert replica.healthy and _on_replica(client, "bob")
@@ -0,0 +1,146 @@
+from datetime import date, time
+
+import pytest
+from pydantic import ValidationError
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+import auth_utils
+import conflicts
+import database
+import main
+import models
+import schemas
+
+MONDAY = date(2026, 10, 19)
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as c:
+        yield c
+
+
+@pytest.fixture(scope="module")
+def seance():
+    """
+    A Monday seance of a two-student group, its teacher, and a student of another group.
+    """
+    with database.SessionLocal() as db:
+        departement = models.Departement(nom="Informatique (appel)")
+        db.add(departement)
+        db.flush()
+        specialite = models.Specialite(nom="GL", id_departement=departement.id)
+        db.add(specialite)
+        db.flush()
+        niveau = models.Niveau(nom="L2", id_specialite=specialite.id)
+        db.add(niveau)
+        db.flush()
+        groupes = [models.Groupe(nom=nom, id_niveau=niveau.id) for nom in ("G1", "G2")]
+        matiere = models.Matiere(nom="Bases de données", id_niveau=niveau.id)
+        salle = models.Salle(numero="A12", type="cours", capacite=30)
+        db.add_all([*groupes, matiere, salle])
+        db.flush()
+
+        users = [
+            models.Utilisateur(nom=f"Nom{i}", prenom=f"Prenom{i}", email=f"appel{i}@example.tn",
+                               cin=55000000 + i, role="enseignant" if i == 0 else "etudiant")
+            for i in range(4)
+        ]
+        db.add_all(users)
+        db.flush()
+        teacher, *students = users
+        db.add(models.Enseignant(id=teacher.id))
+        db.add_all([
+            models.Etudiant(id=students[0].id, id_groupe=groupes[0].id),
+            models.Etudiant(id=students[1].id, id_groupe=groupes[0].id),
+            models.Etudiant(id=students[2].id, id_groupe=groupes[1].id),
+        ])
+        seance = models.Seance(
+            day_of_week=conflicts.weekday(MONDAY), heure_debut=time(8, 30), heure_fin=time(10, 0),
+            id_salle=salle.id, id_matiere=matiere.id, id_groupe=groupes[0].id, id_enseignant=teacher.id,
+        )
+        db.add(seance)
+        db.commit()
+        token = auth_utils.create_access_token({"sub": teacher.email, "uid": teacher.id, "roles": ["enseignant"]})
+        return {
+            "id": seance.id,
+            "headers": {"Authorization": f"Bearer {token}"},
+            "group": [students[0].id, students[1].id],
+            "stranger": students[2].id,
+            "other_group": groupes[1].id,
+        }
+
+
+def _roll(seance, statuts, day=MONDAY):
+    return {
+        "date": day.isoformat(),
+        "entries": [{"id_etudiant": student_id, "statut": statut} for student_id, statut in statuts.items()],
+    }
+
+
+def test_roll_call_runs_three_statements(client, seance, statements, sync_db):
+    first, second = seance["group"]
+    response = client.put(f"/seances/{seance['id']}/appel", headers=seance["headers"],
+                          json=_roll(seance, {first: "absent", second: "present"}))
+
+    assert response.status_code == 200, response.text
+    assert response.json()["par_statut"] == {"absent": 1, "present": 1}
+    executed = [s for s in statements if not s.lstrip().upper().startswith(("BEGIN", "COMMIT", "ROLLBACK"))]
+    assert len(executed) == 3, executed
+
+    # resubmitting overwrites
+    response = client.put(f"/seances/{seance['id']}/appel", headers=seance["headers"],
+                          json=_roll(seance, {first: "present"}))
+    assert response.status_code == 200
+    rows = sync_db.execute(
+        select(models.Absence.id_etudiant, models.Absence.statut).where(models.Absence.id_seance == seance["id"])
+    ).all()
+    assert sorted(rows) == sorted([(first, "present"), (second, "present")])
+    assert sync_db.get(models.Seance, seance["id"]).is_presente
+
+
+def test_roll_call_rejects_students_outside_the_group(client, seance):
+    response = client.put(f"/seances/{seance['id']}/appel", headers=seance["headers"],
+                          json=_roll(seance, {seance["group"][0]: "absent", seance["stranger"]: "absent"}))
+
+    assert response.status_code == 422
+    assert response.json()["detail"]["etudiants"] == [seance["stranger"]]
+
+
+def test_roll_call_checks_the_seance(client, seance):
+    entries = {seance["group"][0]: "absent"}
+    missing = client.put("/seances/999999/appel", headers=seance["headers"], json=_roll(seance, entries))
+    tuesday = client.put(f"/seances/{seance['id']}/appel", headers=seance["headers"],
+                         json=_roll(seance, entries, day=date(2026, 10, 20)))
+
+    assert missing.status_code == 404
+    assert tuesday.status_code == 422
+
+
+def test_stored_rows_are_listed_even_if_they_would_fail_input_checks(client, seance, sync_db):
+    template = sync_db.get(models.Seance, seance["id"])
+    # neither a weekday nor a date, and ending before it starts
+    sync_db.add(models.Seance(
+        day_of_week=None, specific_date=None, heure_debut=time(12, 0), heure_fin=time(11, 0),
+        id_salle=template.id_salle, id_matiere=template.id_matiere, id_groupe=seance["other_group"],
+        id_enseignant=template.id_enseignant,
+    ))
+    sync_db.commit()
+
+    response = client.get("/seances", params={"id_groupe": seance["other_group"]}, headers=seance["headers"])
+
+    assert response.status_code == 200, response.text
+    [listed] = response.json()
+    assert listed["day_of_week"] is None and listed["heure_fin"] == "11:00:00"
+
+
+def test_submitted_slots_are_checked():
+    slot = dict(heure_debut="12:00", heure_fin="11:00", id_salle=1, id_matiere=1, id_groupe=1, id_enseignant=1)
+    for schema in (schemas.SeanceCreate, schemas.SeanceCandidate):
+        with pytest.raises(ValidationError):
+            schema(day_of_week=1, **slot)
+        with pytest.raises(ValidationError):
+            schema(**{**slot, "heure_fin": "13:00"})
+        with pytest.raises(ValidationError):
+            schema(day_of_week=7, **{**slot, "heure_fin": "13:00"})
@@ -0,0 +1,35 @@
+import pytest
+from starlette.requests import Request
+
+import throttle
+
+
+def _request(forwarded=None, peer="10.0.0.1"):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded is not None else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 5000)})
+
+
+def test_forwarded_for_is_ignored_without_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(throttle, "TRUSTED_PROXY_HOPS", 0)
+    assert throttle.client_ip(_request("203.0.113.7")) == "10.0.0.1"
+
+
+@pytest.mark.parametrize("spoofed", ["1.2.3.4", "1.2.3.4, 5.6.7.8", "garbage,"])
+def test_spoofed_forwarded_for_entries_do_not_change_the_address(monkeypatch, spoofed):
+    monkeypatch.setattr(throttle, "TRUSTED_PROXY_HOPS", 1)
+    # the proxy appends the address it saw to whatever the client sent
+    assert throttle.client_ip(_request(f"{spoofed}, 198.51.100.9")) == "198.51.100.9"
+    assert throttle.client_ip(_request("198.51.100.9")) == "198.51.100.9"
+
+
+def test_two_trusted_hops(monkeypatch):
+    monkeypatch.setattr(throttle, "TRUSTED_PROXY_HOPS", 2)
+    # client-supplied, then what the CDN saw, then what the load balancer saw (the CDN)
+    assert throttle.client_ip(_request("1.2.3.4, 198.51.100.9, 192.0.2.10")) == "198.51.100.9"
+    assert throttle.client_ip(_request()) == "10.0.0.1"
+
+
+def test_login_bucket_is_not_escaped_by_rotating_spoofed_addresses(monkeypatch):
+    monkeypatch.setattr(throttle, "TRUSTED_PROXY_HOPS", 1)
+    addresses = {throttle.client_ip(_request(f"10.9.{i}.{i}, 198.51.100.9")) for i in range(50)}
+    assert addresses == {"198.51.100.9"}
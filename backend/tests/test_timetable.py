@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import auth_utils
+import database
+import main
+import models
+import security
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as c:
+        yield c
+
+
+@pytest.fixture(scope="module")
+def teacher():
+    with database.SessionLocal() as db:
+        user = models.Utilisateur(nom="Ben Ali", prenom="Amel", email="amel.benali@example.tn", cin=66000001, role="enseignant")
+        db.add(user)
+        db.flush()
+        db.add(models.Enseignant(id=user.id))
+        db.commit()
+        token = auth_utils.create_access_token({"sub": user.email, "uid": user.id, "roles": ["enseignant"]})
+        return {"id": user.id, "jwt": token, "headers": {"Authorization": f"Bearer {token}"}}
+
+
+def _feed(client, teacher, **params):
+    response = client.post("/emploi-du-temps/moi/ics/jeton", headers=teacher["headers"], params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_feed_token_opens_the_calendar(client, teacher):
+    feed = _feed(client, teacher)
+
+    assert feed["url"].endswith(f"/emploi-du-temps/moi/ics?token={feed['token']}")
+    response = client.get("/emploi-du-temps/moi/ics", params={"token": feed["token"]})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/calendar")
+    assert client.get(f"/emploi-du-temps/enseignants/{teacher['id']}/ics", params={"token": feed["token"]}).status_code == 200
+    # stable until renewed
+    assert _feed(client, teacher)["token"] == feed["token"]
+
+
+def test_feed_token_is_accepted_by_the_ics_routes_only(client, teacher):
+    token = _feed(client, teacher)["token"]
+
+    assert client.get("/emploi-du-temps/moi", headers={"Authorization": f"Bearer {token}"}).status_code == 401
+    assert client.get("/emploi-du-temps/moi", params={"token": token}).status_code == 401
+    # and access tokens no longer travel in URLs
+    assert client.get("/emploi-du-temps/moi/ics", params={"token": teacher["jwt"]}).status_code == 401
+
+
+def test_forged_or_revoked_tokens_are_refused(client, teacher):
+    old = _feed(client, teacher)["token"]
+    new = _feed(client, teacher, renouveler="true")["token"]
+
+    assert new != old
+    assert client.get("/emploi-du-temps/moi/ics", params={"token": old}).status_code == 401
+    assert client.get("/emploi-du-temps/moi/ics", params={"token": new}).status_code == 200
+    other_user = f"{teacher['id'] + 1}.{new.partition('.')[2]}"
+    assert client.get("/emploi-du-temps/moi/ics", params={"token": other_user}).status_code == 401
+
+    assert client.delete("/emploi-du-temps/moi/ics/jeton", headers=teacher["headers"]).status_code == 204
+    assert client.get("/emploi-du-temps/moi/ics", params={"token": new}).status_code == 401
+
+
+def test_feed_principal_carries_the_signin_roles(client):
+    with database.SessionLocal() as db:
+        user = models.Utilisateur(nom="Gharbi", prenom="Nadia", email="nadia.gharbi@example.tn", cin=66000003, role="enseignant")
+        db.add(user)
+        db.flush()
+        db.add_all([models.Enseignant(id=user.id), models.Chef(id=user.id)])
+        db.commit()
+        token = auth_utils.create_access_token({"sub": user.email, "uid": user.id, "roles": ["enseignant", "chef"]})
+        user_id = user.id
+    feed = _feed(client, {"headers": {"Authorization": f"Bearer {token}"}})
+
+    async def principal():
+        try:
+            async with database.AsyncSessionLocal() as db:
+                return await security.get_feed_principal(token=feed["token"], credentials=None, db=db)
+        finally:
+            await database.async_engine.dispose()
+
+    assert asyncio.run(principal()) == security.Principal(id=user_id, email="nadia.gharbi@example.tn", roles=("enseignant", "chef"))
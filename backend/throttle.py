@@ -0,0 +1,242 @@
+import os
+import math
+import time
+import struct
+import logging
+from typing import Dict, List, Optional, Protocol, Tuple
+
+from fastapi import HTTPException, Request
+
+# ---------------- Configuration ----------------
+# Per client IP: generous, a whole classroom may log in from behind one NAT address
+LOGIN_IP_BURST = int(os.getenv("LOGIN_IP_BURST", 60))
+LOGIN_IP_PER_MINUTE = float(os.getenv("LOGIN_IP_PER_MINUTE", 60))
+# Per identifier (cin_or_email): a user retyping a password never gets near these
+LOGIN_ID_BURST = int(os.getenv("LOGIN_ID_BURST", 10))
+LOGIN_ID_PER_MINUTE = float(os.getenv("LOGIN_ID_PER_MINUTE", 6))
+# Progressive lockout: after LOGIN_LOCKOUT_AFTER consecutive failures the identifier is locked
+# for LOGIN_LOCKOUT_BASE seconds, doubling with every further failure up to LOGIN_LOCKOUT_MAX
+LOGIN_LOCKOUT_AFTER = int(os.getenv("LOGIN_LOCKOUT_AFTER", 5))
+LOGIN_LOCKOUT_BASE = float(os.getenv("LOGIN_LOCKOUT_BASE", 30))
+LOGIN_LOCKOUT_MAX = float(os.getenv("LOGIN_LOCKOUT_MAX", 900))
+# Failures are forgotten this long after the last one (or after the lock ends)
+LOGIN_FAILURE_WINDOW = float(os.getenv("LOGIN_FAILURE_WINDOW", 900))
+THROTTLE_MAX_KEYS = int(os.getenv("THROTTLE_MAX_KEYS", 500_000))
+# Take the client address from X-Forwarded-For (only behind a proxy that sets it)
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "false").lower() in ("1", "true", "yes")
+# Proxies in front of the API that append to X-Forwarded-For; the client is the address the
+# outermost of them saw, counted from the right (entries further left are whatever the client sent)
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", 1 if TRUST_FORWARDED_FOR else 0))
+
+# ---------------- Logging ----------------
+logger = logging.getLogger("throttle")
+
+
+class LoginThrottled(HTTPException):
+    """
+    Raised before any query or hashing when a login attempt is over its limits.
+    """
+
+    def __init__(self, retry_after: float):
+        seconds = max(1, math.ceil(retry_after))
+        super().__init__(
+            status_code=429,
+            detail=f"Trop de tentatives de connexion, réessayez dans {seconds} s",
+            headers={"Retry-After": str(seconds)},
+        )
+
+
+# ---------------- Backends ----------------
+class ThrottleBackend(Protocol):
+    """
+    Storage for limiter state: two floats per key with an absolute expiry (epoch seconds).
+    Past its expiry an entry must read as missing, which for every limiter here is the same
+    as a fresh key, so a backend may drop it at any time after that.
+    """
+
+    def get(self, key: int) -> Optional[Tuple[float, float]]: ...
+
+    def set(self, key: int, a: float, b: float, expires_at: float): ...
+
+    def delete(self, key: int): ...
+
+    def __len__(self) -> int: ...
+
+
+_ENTRY = struct.Struct("<ddd")
+
+
+class MemoryBackend:
+    """
+    Process-local backend sized for hundreds of thousands of keys: keys are 64-bit hashes,
+    entries are 24 packed bytes (about 150 B per key all in), and expiry runs on a timing
+    wheel with one-second slots swept as time passes, with no per-key timer and no full scan.
+    Not thread-safe: only used from the event loop.
+    """
+
+    def __init__(self, max_keys: int = THROTTLE_MAX_KEYS):
+        self.max_keys = max_keys
+        self._data: Dict[int, bytes] = {}
+        self._wheel: Dict[int, List[int]] = {}
+        self._swept_to = int(time.time())
+        self.expired = 0
+        self.evicted = 0
+
+    def get(self, key: int) -> Optional[Tuple[float, float]]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        a, b, expires_at = _ENTRY.unpack(entry)
+        if expires_at <= time.time():
+            return None
+        return a, b
+
+    def set(self, key: int, a: float, b: float, expires_at: float):
+        self._sweep()
+        if key not in self._data and len(self._data) >= self.max_keys:
+            # oldest insertion first: under a key-spraying flood it is the least useful state
+            del self._data[next(iter(self._data))]
+            self.evicted += 1
+        self._data[key] = _ENTRY.pack(a, b, expires_at)
+        self._wheel.setdefault(int(expires_at) + 1, []).append(key)
+
+    def delete(self, key: int):
+        self._data.pop(key, None)
+
+    def _sweep(self):
+        now = int(time.time())
+        if now <= self._swept_to:
+            return
+        self._swept_to = now
+        for slot in [slot for slot in self._wheel if slot <= now]:
+            for key in self._wheel.pop(slot):
+                entry = self._data.get(key)
+                # a key set again since lives on in a later slot
+                if entry is not None and _ENTRY.unpack(entry)[2] <= now:
+                    del self._data[key]
+                    self.expired += 1
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# ---------------- Limiters ----------------
+class TokenBucket:
+    """
+    `burst` attempts at once, refilled at `per_minute`. The state is (tokens, updated_at)
+    and expires when the bucket would be full again, so idle keys cost nothing.
+    """
+
+    def __init__(self, backend: ThrottleBackend, namespace: str, burst: int, per_minute: float):
+        self.backend = backend
+        self.namespace = namespace
+        self.burst = burst
+        self.rate = per_minute / 60.0
+
+    def key(self, value: str) -> int:
+        return hash((self.namespace, value))
+
+    def take(self, value: str, now: float) -> float:
+        """
+        Consume one token; returns 0 when allowed, else the seconds until one is available.
+        """
+        key = self.key(value)
+        state = self.backend.get(key)
+        tokens = self.burst if state is None else min(self.burst, state[0] + (now - state[1]) * self.rate)
+        if tokens < 1:
+            return (1 - tokens) / self.rate
+        tokens -= 1
+        self.backend.set(key, tokens, now, now + (self.burst - tokens) / self.rate)
+        return 0.0
+
+
+class Lockout:
+    """
+    Consecutive failures per identifier as (failures, locked_until).
+    """
+
+    def __init__(self, backend: ThrottleBackend, namespace: str = "lockout"):
+        self.backend = backend
+        self.namespace = namespace
+
+    def key(self, value: str) -> int:
+        return hash((self.namespace, value))
+
+    def remaining(self, value: str, now: float) -> float:
+        state = self.backend.get(self.key(value))
+        return max(0.0, state[1] - now) if state is not None else 0.0
+
+    def failed(self, value: str, now: float) -> float:
+        key = self.key(value)
+        state = self.backend.get(key)
+        failures = (state[0] if state is not None else 0) + 1
+        locked_until = now
+        if failures >= LOGIN_LOCKOUT_AFTER:
+            locked_until = now + min(LOGIN_LOCKOUT_MAX, LOGIN_LOCKOUT_BASE * 2 ** (failures - LOGIN_LOCKOUT_AFTER))
+        self.backend.set(key, failures, locked_until, locked_until + LOGIN_FAILURE_WINDOW)
+        return locked_until - now
+
+    def reset(self, value: str):
+        self.backend.delete(self.key(value))
+
+
+class LoginThrottle:
+    """
+    Admission control for /auth/signin, evaluated before the user lookup and bcrypt:
+    a locked identifier is refused outright, then one token is taken from the identifier's
+    bucket and one from the client IP's.
+    """
+
+    def __init__(self, backend: Optional[ThrottleBackend] = None):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.by_ip = TokenBucket(self.backend, "ip", LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE)
+        self.by_identifier = TokenBucket(self.backend, "id", LOGIN_ID_BURST, LOGIN_ID_PER_MINUTE)
+        self.lockout = Lockout(self.backend)
+        self.rejected = {"lockout": 0, "identifier": 0, "ip": 0}
+        self.locked = 0
+
+    @staticmethod
+    def normalise(identifier: str) -> str:
+        return identifier.strip().lower()
+
+    def check(self, client_ip: str, identifier: str):
+        now = time.time()
+        identifier = self.normalise(identifier)
+        wait = self.lockout.remaining(identifier, now)
+        if wait > 0:
+            self.rejected["lockout"] += 1
+            raise LoginThrottled(wait)
+        wait = self.by_identifier.take(identifier, now)
+        if wait > 0:
+            self.rejected["identifier"] += 1
+            raise LoginThrottled(wait)
+        wait = self.by_ip.take(client_ip, now)
+        if wait > 0:
+            self.rejected["ip"] += 1
+            raise LoginThrottled(wait)
+
+    def failed(self, identifier: str):
+        locked_for = self.lockout.failed(self.normalise(identifier), time.time())
+        if locked_for > 0:
+            self.locked += 1
+            logger.warning(f"[throttle] identifier locked for {locked_for:.0f} s after repeated failures")
+
+    def succeeded(self, identifier: str):
+        self.lockout.reset(self.normalise(identifier))
+
+    def stats(self) -> dict:
+        stats = {"keys": len(self.backend), "rejected": dict(self.rejected), "lockouts": self.locked}
+        if isinstance(self.backend, MemoryBackend):
+            stats.update(expired=self.backend.expired, evicted=self.backend.evicted)
+        return stats
+
+
+def client_ip(request: Request) -> str:
+    if TRUSTED_PROXY_HOPS > 0:
+        forwarded = [entry.strip() for entry in request.headers.get("x-forwarded-for", "").split(",") if entry.strip()]
+        if forwarded:
+            return forwarded[max(0, len(forwarded) - TRUSTED_PROXY_HOPS)]
+    return request.client.host if request.client is not None else "unknown"
+
+
+login = LoginThrottle()
@@ -0,0 +1,449 @@
+import os
+import time
+import secrets
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import and_, delete, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import bulk
+import models
+import schemas
+import auth_utils
+import model_events
+from conflicts import to_minutes
+from database import get_db
+from replicas import for_cache, get_read_db
+from hierarchy import Document
+from occupancy import week_start
+from security import ExpiringLRU, Principal, get_current_user, get_current_user_id, get_feed_principal
+
+# ---------------- Configuration ----------------
+TIMETABLE_CACHE_SIZE = int(os.getenv("TIMETABLE_CACHE_SIZE", 20000))
+# Safety net for writes made by other workers or by the Node service, which this process never sees.
+TIMETABLE_TTL = float(os.getenv("TIMETABLE_TTL", 600))
+TIMETABLE_MAX_WEEKS = int(os.getenv("TIMETABLE_MAX_WEEKS", 26))
+ICS_UID_DOMAIN = os.getenv("ICS_UID_DOMAIN", "emploi-du-temps.local")
+
+# ---------------- Router ----------------
+router = APIRouter(prefix="/emploi-du-temps", tags=["Emploi du temps"])
+
+# ---------------- Logging ----------------
+logger = logging.getLogger("timetable")
+
+# entity kind -> Seance column it is filtered on
+KINDS = {
+    "groupe": models.Seance.id_groupe,
+    "enseignant": models.Seance.id_enseignant,
+    "salle": models.Seance.id_salle,
+}
+_ROW_KEYS = {"groupe": "id_groupe", "enseignant": "id_enseignant", "salle": "id_salle"}
+_ENTITY_MODELS = {"groupe": models.Groupe, "enseignant": models.Enseignant, "salle": models.Salle}
+_NOT_FOUND = {"groupe": "Groupe introuvable", "enseignant": "Enseignant introuvable", "salle": "Salle introuvable"}
+
+
+@dataclass
+class Week:
+    """
+    One entity's week: the JSON document serialised once, the seances it was built from,
+    and the iCalendar VEVENT block, rendered on first use.
+    """
+    document: Document
+    seances: List[dict]
+    built_at: float
+    ics: Optional[bytes] = None
+
+
+# ---------------- Week build ----------------
+def _week_query(kind: str, entity_id: int, start: date):
+    s, m, sa, g, u = models.Seance, models.Matiere, models.Salle, models.Groupe, models.Utilisateur
+    return (
+        select(
+            s.id, s.day_of_week, s.specific_date, s.heure_debut, s.heure_fin,
+            s.id_matiere, m.nom.label("matiere"),
+            s.id_salle, sa.numero.label("salle"),
+            s.id_groupe, g.nom.label("groupe"),
+            s.id_enseignant, u.nom.label("enseignant_nom"), u.prenom.label("enseignant_prenom"),
+        )
+        .join(m, m.id == s.id_matiere)
+        .join(sa, sa.id == s.id_salle)
+        .join(g, g.id == s.id_groupe)
+        .outerjoin(u, u.id == s.id_enseignant)
+        .where(
+            KINDS[kind] == entity_id,
+            or_(
+                and_(s.specific_date.is_(None), s.day_of_week.isnot(None)),
+                s.specific_date.between(start, start + timedelta(days=6)),
+            ),
+        )
+    )
+
+
+def _overlaps(a: dict, b: dict) -> bool:
+    return to_minutes(a["heure_debut"]) < to_minutes(b["heure_fin"]) and to_minutes(b["heure_debut"]) < to_minutes(a["heure_fin"])
+
+
+def assemble(rows, start: date) -> Tuple[List[dict], List[dict]]:
+    """
+    Place every seance on its date in the week. A dated seance overrides the recurring ones
+    of the same entity it overlaps on that day (make-up, room change...): those are left out
+    and listed as replaced.
+    """
+    dated: Dict[date, List[dict]] = {}
+    recurring: List[dict] = []
+    for r in rows:
+        seance = {
+            "id": r.id,
+            "date": r.specific_date or start + timedelta(days=r.day_of_week),
+            "heure_debut": r.heure_debut,
+            "heure_fin": r.heure_fin,
+            "recurrente": r.specific_date is None,
+            "matiere": {"id": r.id_matiere, "nom": r.matiere},
+            "salle": {"id": r.id_salle, "numero": r.salle},
+            "groupe": {"id": r.id_groupe, "nom": r.groupe},
+            "enseignant": {"id": r.id_enseignant, "nom": r.enseignant_nom, "prenom": r.enseignant_prenom},
+        }
+        if seance["recurrente"]:
+            recurring.append(seance)
+        else:
+            dated.setdefault(seance["date"], []).append(seance)
+
+    seances = [s for day in dated.values() for s in day]
+    replaced = []
+    for seance in recurring:
+        overriding = [d for d in dated.get(seance["date"], ()) if _overlaps(seance, d)]
+        if overriding:
+            replaced.append({"id": seance["id"], "date": seance["date"], "par": [d["id"] for d in overriding]})
+        else:
+            seances.append(seance)
+    seances.sort(key=lambda s: (s["date"], s["heure_debut"], s["id"]))
+    return seances, replaced
+
+
+# ---------------- iCalendar ----------------
+def _ics_text(value) -> str:
+    return str(value).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _fold(line: str) -> bytes:
+    """
+    RFC 5545 folding: at most 75 octets per line, continuation lines start with a space,
+    never splitting a UTF-8 sequence.
+    """
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return encoded + b"\r\n"
+    out, chunk = [], b""
+    for char in line:
+        piece = char.encode()
+        if len(chunk) + len(piece) > 75:
+            out.append(chunk)
+            chunk = b" "
+        chunk += piece
+    out.append(chunk)
+    return b"\r\n".join(out) + b"\r\n"
+
+
+def _vevents(seances: List[dict], stamp: str) -> bytes:
+    lines = []
+    for s in seances:
+        enseignant = " ".join(p for p in (s["enseignant"]["prenom"], s["enseignant"]["nom"]) if p)
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:seance-{s['id']}-{s['date']:%Y%m%d}@{ICS_UID_DOMAIN}",
+            f"DTSTAMP:{stamp}",
+            # floating local times: the university's wall clock, whatever the reader's zone
+            f"DTSTART:{datetime.combine(s['date'], s['heure_debut']):%Y%m%dT%H%M%S}",
+            f"DTEND:{datetime.combine(s['date'], s['heure_fin']):%Y%m%dT%H%M%S}",
+            f"SUMMARY:{_ics_text(s['matiere']['nom'])}",
+            f"LOCATION:{_ics_text(s['salle']['numero'])}",
+            f"DESCRIPTION:{_ics_text('Groupe ' + s['groupe']['nom'] + ' - ' + enseignant)}",
+            "END:VEVENT",
+        ]
+    return b"".join(_fold(line) for line in lines)
+
+
+def calendar(name: str, weeks: List[Week]) -> bytes:
+    head = b"".join(_fold(line) for line in (
+        "BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Gestion des absences//Emploi du temps//FR",
+        "CALSCALE:GREGORIAN", "METHOD:PUBLISH", f"X-WR-CALNAME:{_ics_text(name)}",
+    ))
+    for cached in weeks:
+        if cached.ics is None:
+            stamp = datetime.fromtimestamp(cached.built_at, timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+            cached.ics = _vevents(cached.seances, stamp)
+    return head + b"".join(cached.ics for cached in weeks) + b"END:VCALENDAR\r\n"
+
+
+# ---------------- Process-wide cache ----------------
+@dataclass
+class TimetableCache:
+    """
+    Weeks keyed by (kind, entity id, week start, entity generation). A change to a recurring
+    seance bumps the generation of the entities it belongs to (all their weeks at once); a
+    dated seance only drops the week it falls in. Seances are indexed by id with where they
+    were served, since an update only reports the new values and a move must also clear
+    the old place.
+    """
+    weeks: ExpiringLRU = field(default_factory=lambda: ExpiringLRU(TIMETABLE_CACHE_SIZE))
+    generations: Dict[Tuple[str, int], int] = field(default_factory=dict)
+    served: Dict[int, Set[tuple]] = field(default_factory=dict)
+    changes: int = 0
+    changed_at: float = 0.0
+    builds: int = 0
+    locks: Dict[tuple, asyncio.Lock] = field(default_factory=dict)
+
+    def key(self, kind: str, entity_id: int, start: date) -> tuple:
+        return kind, entity_id, start, self.generations.get((kind, entity_id), 0)
+
+    def record(self, kind: str, entity_id: int, start: date, seances: List[dict], replaced: List[dict]):
+        for s in seances + replaced:
+            scope = (kind, entity_id) if s.get("recurrente", True) else (kind, entity_id, start)
+            self.served.setdefault(s["id"], set()).add(scope)
+
+    def scopes(self, row: dict) -> Set[tuple]:
+        found = set(self.served.pop(row["id"], ()))
+        day = row.get("specific_date")
+        for kind, column in _ROW_KEYS.items():
+            if row.get(column) is None:
+                continue
+            found.add((kind, row[column], week_start(day)) if day is not None else (kind, row[column]))
+        return found
+
+    def invalidate(self, scopes: Set[tuple]):
+        self.changes += 1
+        self.changed_at = time.time()
+        for scope in scopes:
+            if len(scope) == 2:
+                self.generations[scope] = self.generations.get(scope, 0) + 1
+            else:
+                self.weeks.pop(self.key(*scope))
+
+    def clear(self):
+        self.changes += 1
+        self.changed_at = time.time()
+        self.weeks.clear()
+        self.served.clear()
+
+
+cache = TimetableCache()
+
+
+def _on_seances(upserted: List[dict], deleted: List[dict]):
+    scopes = set()
+    for row in upserted + deleted:
+        scopes |= cache.scopes(row)
+    cache.invalidate(scopes)
+
+
+def _on_labels(*_):
+    # names shown in every week (matiere, salle, groupe, enseignant): rare, start over
+    cache.clear()
+
+
+def _on_users(upserted: List[dict], deleted: List[dict]):
+    if any(row.get("role") == "enseignant" for row in upserted + deleted):
+        cache.clear()
+
+
+model_events.subscribe(models.Seance, _on_seances)
+for _model in (models.Matiere, models.Salle, models.Groupe):
+    model_events.subscribe(_model, _on_labels)
+model_events.subscribe(models.Utilisateur, _on_users)
+
+
+async def week(db: AsyncSession, kind: str, entity_id: int, start: date) -> Week:
+    """
+    The cached week, or one joined query assembled and serialised once. A build that raced
+    with a seance change is served but not kept.
+    """
+    key = cache.key(kind, entity_id, start)
+    cached = cache.weeks.get(key)
+    if cached is not None:
+        return cached
+    lock = cache.locks.setdefault(key, asyncio.Lock())
+    try:
+        async with lock:
+            cached = cache.weeks.get(key)
+            if cached is not None:
+                return cached
+            changes = cache.changes
+            async with for_cache(db, cache.changed_at) as source:
+                rows = (await source.execute(_week_query(kind, entity_id, start))).all()
+                if not rows and await source.get(_ENTITY_MODELS[kind], entity_id) is None:
+                    raise HTTPException(status_code=404, detail=_NOT_FOUND[kind])
+            seances, replaced = assemble(rows, start)
+            built = Week(
+                document=Document.of({
+                    "type": kind, "id": entity_id, "semaine": start,
+                    "seances": seances, "remplacees": replaced,
+                }),
+                seances=seances,
+                built_at=time.time(),
+            )
+            cache.builds += 1
+            if cache.changes == changes:
+                cache.record(kind, entity_id, start, seances, replaced)
+                cache.weeks.set(key, built, built.built_at + TIMETABLE_TTL)
+            return built
+    finally:
+        if not lock.locked() and cache.locks.get(key) is lock:
+            del cache.locks[key]
+
+
+def stats() -> dict:
+    return {
+        "weeks": len(cache.weeks), "hits": cache.weeks.hits, "misses": cache.weeks.misses,
+        "builds": cache.builds, "seances_indexed": len(cache.served), "changes": cache.changes,
+    }
+
+
+# ---------------- Endpoints ----------------
+async def _caller_entity(principal: Principal, db: AsyncSession) -> Tuple[str, int]:
+    """
+    What "my timetable" means: a student's groupe, a teacher's own seances.
+    """
+    user_id = principal.id
+    if user_id is None:
+        user_id = await db.scalar(select(models.Utilisateur.id).where(models.Utilisateur.email == principal.email))
+    if principal.has_role("enseignant"):
+        return "enseignant", user_id
+    if principal.has_role("etudiant"):
+        groupe_id = await db.scalar(select(models.Etudiant.id_groupe).where(models.Etudiant.id == user_id))
+        if groupe_id is not None:
+            return "groupe", groupe_id
+    raise HTTPException(status_code=404, detail="Aucun emploi du temps pour ce compte")
+
+
+def _serve(request: Request, document: Document) -> Response:
+    headers = {"ETag": document.etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or document.etag in (tag.strip() for tag in if_none_match.split(","))):
+        return Response(status_code=304, headers=headers)
+    return Response(content=document.body, media_type="application/json", headers=headers)
+
+
+async def _json(request: Request, db: AsyncSession, kind: str, entity_id: int, semaine: Optional[date]) -> Response:
+    result = await week(db, kind, entity_id, week_start(semaine or date.today()))
+    return _serve(request, result.document)
+
+
+async def _ics(db: AsyncSession, kind: str, entity_id: int, semaines: int) -> Response:
+    first = week_start(date.today())
+    weeks = [await week(db, kind, entity_id, first + timedelta(weeks=i)) for i in range(semaines)]
+    return Response(
+        content=calendar(f"Emploi du temps - {kind} {entity_id}", weeks),
+        media_type="text/calendar; charset=utf-8",
+        headers={"Cache-Control": "private, max-age=300", "Content-Disposition": f'inline; filename="{kind}-{entity_id}.ics"'},
+    )
+
+
+_Semaine = Query(None, description="Un jour de la semaine voulue (par défaut: aujourd'hui)")
+_Semaines = Query(4, ge=1, le=TIMETABLE_MAX_WEEKS, description="Semaines à partir de la semaine courante")
+
+
+@router.get("/moi")
+async def my_week(
+    request: Request,
+    semaine: Optional[date] = _Semaine,
+    principal: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    kind, entity_id = await _caller_entity(principal, db)
+    return await _json(request, db, kind, entity_id, semaine)
+
+
+@router.get("/moi/ics")
+async def my_calendar(
+    semaines: int = _Semaines,
+    principal: Principal = Depends(get_feed_principal),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Subscribable iCalendar feed of the caller's coming weeks (?token= with a calendar feed token).
+    """
+    kind, entity_id = await _caller_entity(principal, db)
+    return await _ics(db, kind, entity_id, semaines)
+
+
+@router.post("/moi/ics/jeton", response_model=schemas.CalendarFeed)
+async def issue_feed_token(
+    request: Request,
+    renouveler: bool = Query(False, description="Remplacer le jeton: les anciens liens cessent de fonctionner"),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    The caller's calendar feed token and URL, created on first use. The token does not
+    expire and only opens the iCalendar routes; renouveler=true or DELETE revokes it.
+    """
+    secret = None if renouveler else await db.scalar(
+        select(models.JetonCalendrier.secret).where(models.JetonCalendrier.id_utilisateur == user_id)
+    )
+    if secret is None:
+        secret = secrets.token_hex(32)
+        try:
+            await db.execute(bulk.upsert(
+                models.JetonCalendrier.__table__, ("id_utilisateur",), ("secret", "created_at"),
+                values=[{"id_utilisateur": user_id, "secret": secret, "created_at": datetime.utcnow()}],
+            ))
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.exception(f"[issue_feed_token] DB commit failed for user {user_id}: {e}")
+            raise HTTPException(status_code=500, detail="Création du jeton impossible")
+    token = auth_utils.create_feed_token(user_id, secret)
+    return schemas.CalendarFeed(token=token, url=str(request.url_for("my_calendar").include_query_params(token=token)))
+
+
+@router.delete("/moi/ics/jeton", status_code=204)
+async def revoke_feed_token(user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_db)):
+    """
+    Revoke the caller's calendar feed token: subscribed calendars stop updating.
+    """
+    try:
+        await db.execute(delete(models.JetonCalendrier).where(models.JetonCalendrier.id_utilisateur == user_id))
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.exception(f"[revoke_feed_token] DB commit failed for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Révocation du jeton impossible")
+    return Response(status_code=204)
+
+
+@router.get("/groupes/{groupe_id}", dependencies=[Depends(get_current_user)])
+async def group_week(groupe_id: int, request: Request, semaine: Optional[date] = _Semaine, db: AsyncSession = Depends(get_read_db)):
+    """
+    A groupe's week (Sunday to Saturday), recurring seances merged with dated ones, pre-serialised.
+    """
+    return await _json(request, db, "groupe", groupe_id, semaine)
+
+
+@router.get("/groupes/{groupe_id}/ics", dependencies=[Depends(get_feed_principal)])
+async def group_calendar(groupe_id: int, semaines: int = _Semaines, db: AsyncSession = Depends(get_read_db)):
+    return await _ics(db, "groupe", groupe_id, semaines)
+
+
+@router.get("/enseignants/{enseignant_id}", dependencies=[Depends(get_current_user)])
+async def teacher_week(enseignant_id: int, request: Request, semaine: Optional[date] = _Semaine, db: AsyncSession = Depends(get_read_db)):
+    return await _json(request, db, "enseignant", enseignant_id, semaine)
+
+
+@router.get("/enseignants/{enseignant_id}/ics", dependencies=[Depends(get_feed_principal)])
+async def teacher_calendar(enseignant_id: int, semaines: int = _Semaines, db: AsyncSession = Depends(get_read_db)):
+    return await _ics(db, "enseignant", enseignant_id, semaines)
+
+
+@router.get("/salles/{salle_id}", dependencies=[Depends(get_current_user)])
+async def room_week(salle_id: int, request: Request, semaine: Optional[date] = _Semaine, db: AsyncSession = Depends(get_read_db)):
+    return await _json(request, db, "salle", salle_id, semaine)
+
+
+@router.get("/salles/{salle_id}/ics", dependencies=[Depends(get_feed_principal)])
+async def room_calendar(salle_id: int, semaines: int = _Semaines, db: AsyncSession = Depends(get_read_db)):
+    return await _ics(db, "salle", salle_id, semaines)
@@ -0,0 +1,371 @@
+import os
+import re
+import time
+import heapq
+import asyncio
+import logging
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter
+from functools import lru_cache
+from itertools import groupby
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+import model_events
+from replicas import for_cache, read_session
+
+# ---------------- Configuration ----------------
+# Safety net for users written by the Node service or by Core statements, which emit no ORM events.
+USER_INDEX_TTL = float(os.getenv("USER_INDEX_TTL", 3600))
+# Trigram similarity (shared / distinct, as pg_trgm) for a word to match when prefixes find too few
+TRIGRAM_MIN_SIMILARITY = float(os.getenv("TRIGRAM_MIN_SIMILARITY", 0.3))
+
+# ---------------- Logging ----------------
+logger = logging.getLogger("user_index")
+
+# Where a token comes from, and how much a match on it counts
+NAME, EMAIL, CIN = 0, 1, 2
+FIELD_WEIGHTS = (1.0, 0.75, 1.0)
+
+# Room left between neighbouring ranks for users added later (halved by each insertion there)
+RANK_GAP = 1 << 32
+
+# Past this many postings tied at one weight, sort their union instead of merging them
+MERGE_FAN_IN = 16
+
+_SEPARATORS = re.compile(r"[\W_]+")
+_LAST = "\U0010ffff"
+
+
+def fold(text: str) -> str:
+    """
+    Lower case without accents: "Hédi Ben Aïssa" -> "hedi ben aissa".
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+@lru_cache(maxsize=65536)
+def tokens(text: str) -> Tuple[str, ...]:
+    # names repeat a lot: folding each distinct value once keeps rebuilds fast
+    return tuple(t for t in _SEPARATORS.split(fold(text)) if t)
+
+
+def trigrams(token: str) -> Set[str]:
+    """
+    Padded like pg_trgm, so words sharing their first letters score higher.
+    """
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class Entry:
+    """
+    One user as the index holds it: the displayed fields, the (token, field) keys it is posted
+    under and its rank, an integer following alphabetical order.
+    """
+    __slots__ = ("id", "nom", "prenom", "email", "role", "order", "keys", "rank")
+
+    def __init__(self, row: dict):
+        self.id = row["id"]
+        self.nom = row["nom"]
+        self.prenom = row["prenom"]
+        self.email = row["email"]
+        self.role = row["role"]
+        self.rank = 0
+
+        nom, prenom = tokens(self.nom), tokens(self.prenom)
+        self.order = (" ".join(nom), " ".join(prenom), self.id)
+        names = set(nom) | set(prenom)
+        for parts in (nom, prenom):
+            if len(parts) > 1:
+                # "Ben Salah" is also typed "bensalah"
+                names.add("".join(parts))
+        emails = set(tokens(self.email.rsplit("@", 1)[0])) - names
+        self.keys: List[Tuple[str, int]] = (
+            [(t, NAME) for t in names] + [(t, EMAIL) for t in emails] + [(str(row["cin"]), CIN)]
+        )
+
+
+class UserIndex:
+    """
+    Distinct tokens kept sorted for prefix lookups, each posting the set of users carrying it
+    (per field), plus trigram postings over the tokens for typos. Names repeat a lot, so the
+    vocabulary stays small and matches are combined with set operations rather than per user.
+
+    Sets hold ranks rather than ids, spaced RANK_GAP apart: equally scored matches then come
+    out in alphabetical order from a plain sort of integers.
+    """
+
+    def __init__(self):
+        self.users: Dict[int, Entry] = {}
+        self.by_rank: Dict[int, Entry] = {}
+        self.ranks: List[Tuple[Tuple[str, str, int], int]] = []  # (order, rank), sorted
+        self.vocabulary: List[str] = []
+        self.postings: Dict[str, Dict[int, Set[int]]] = {}
+        self.sorted: Dict[Tuple[str, int], List[int]] = {}  # postings sorted on demand
+        self.grams: Dict[str, Set[str]] = {}
+        self.roles: Dict[str, Set[int]] = {}
+
+    @classmethod
+    def build(cls, rows: Iterable[dict]) -> "UserIndex":
+        index = cls()
+        index._load([Entry(row) for row in rows])
+        return index
+
+    def _load(self, entries: List[Entry]):
+        entries.sort(key=lambda entry: entry.order)
+        for position, entry in enumerate(entries, 1):
+            entry.rank = position * RANK_GAP
+            self._post(entry, keep_sorted=False)
+        self.ranks = [(entry.order, entry.rank) for entry in entries]
+        self.vocabulary.sort()
+
+    def _post(self, entry: Entry, keep_sorted: bool = True):
+        self.users[entry.id] = entry
+        self.by_rank[entry.rank] = entry
+        self.roles.setdefault(entry.role, set()).add(entry.rank)
+        for token, field in entry.keys:
+            fields = self.postings.get(token)
+            if fields is None:
+                fields = self.postings[token] = {}
+                if keep_sorted:
+                    insort(self.vocabulary, token)
+                else:
+                    self.vocabulary.append(token)
+                if not token.isdigit():
+                    for gram in trigrams(token):
+                        self.grams.setdefault(gram, set()).add(token)
+            fields.setdefault(field, set()).add(entry.rank)
+            self.sorted.pop((token, field), None)
+
+    def add(self, row: dict):
+        self.remove(row["id"])
+        entry = Entry(row)
+        i = bisect_left(self.ranks, (entry.order,))
+        before = self.ranks[i - 1][1] if i > 0 else 0
+        after = self.ranks[i][1] if i < len(self.ranks) else before + 2 * RANK_GAP
+        if after - before < 2:
+            # that gap is used up: space every rank out again
+            entries = list(self.users.values()) + [entry]
+            self.__init__()
+            self._load(entries)
+            return
+        entry.rank = (before + after) // 2
+        self.ranks.insert(i, (entry.order, entry.rank))
+        self._post(entry)
+
+    def remove(self, user_id: int):
+        entry = self.users.pop(user_id, None)
+        if entry is None:
+            return
+        del self.by_rank[entry.rank]
+        del self.ranks[bisect_left(self.ranks, (entry.order, entry.rank))]
+        self.roles[entry.role].discard(entry.rank)
+        for token, field in entry.keys:
+            self.sorted.pop((token, field), None)
+            fields = self.postings[token]
+            fields[field].discard(entry.rank)
+            if fields[field]:
+                continue
+            del fields[field]
+            if fields:
+                continue
+            del self.postings[token]
+            del self.vocabulary[bisect_left(self.vocabulary, token)]
+            if not token.isdigit():
+                for gram in trigrams(token):
+                    self.grams[gram].discard(token)
+                    if not self.grams[gram]:
+                        del self.grams[gram]
+
+    def _sorted(self, token: str, field: int) -> List[int]:
+        ranks = self.sorted.get((token, field))
+        if ranks is None:
+            ranks = self.sorted[(token, field)] = sorted(self.postings[token][field])
+        return ranks
+
+    def _groups(self, term: str, wanted: int, with_cin: bool) -> List[Tuple[float, str, int]]:
+        """
+        (weight, token, field) for every token the term matches, best first: 2 for the whole
+        token, 1..2 for a prefix (closer to the whole token is better), below 1 for a trigram match.
+        """
+        groups = []
+        lo = bisect_left(self.vocabulary, term)
+        hi = bisect_left(self.vocabulary, term + _LAST, lo)
+        for token in self.vocabulary[lo:hi]:
+            base = 2.0 if token == term else 1.0 + len(term) / len(token)
+            for field in self.postings[token]:
+                if field != CIN or with_cin:
+                    groups.append((base * FIELD_WEIGHTS[field], token, field))
+
+        if len(term) >= 3 and len(groups) < wanted and sum(len(self.postings[token][field]) for _, token, field in groups) < wanted:
+            grams = trigrams(term)
+            shared = Counter()
+            for gram in grams:
+                shared.update(self.grams.get(gram, ()))
+            for token, common in shared.items():
+                similarity = common / (len(grams) + len(trigrams(token)) - common)
+                if similarity >= TRIGRAM_MIN_SIMILARITY and not token.startswith(term):
+                    for field in self.postings[token]:
+                        groups.append((0.9 * similarity * FIELD_WEIGHTS[field], token, field))
+        groups.sort(key=lambda group: group[0], reverse=True)
+        return groups
+
+    def search(self, text: str, roles: Optional[Iterable[str]] = None, limit: int = 10, with_cin: bool = False) -> Tuple[int, List[Tuple[Entry, float]]]:
+        """
+        Users matching every term of `text`, best first then alphabetical: (number of matches, top `limit`).
+        """
+        terms = sorted(set(tokens(text)), key=len, reverse=True)
+        if not terms:
+            return 0, []
+        # candidates: users matching every term (and a role), by set intersection
+        matched = []
+        candidates: Optional[Set[int]] = None
+        for term in terms:
+            groups = self._groups(term, limit, with_cin)
+            postings = [self.postings[token][field] for _, token, field in groups]
+            if candidates is None:
+                candidates = set().union(*postings)
+            else:
+                # intersecting each posting costs its overlap with the (already small) candidates
+                candidates = set().union(*(candidates & ranks for ranks in postings))
+            if not candidates:
+                return 0, []
+            matched.append(groups)
+        filtered = len(matched) > 1 or bool(roles)
+        if roles:
+            candidates &= set().union(*(self.roles.get(role, ()) for role in roles))
+
+        best: List[Tuple[Entry, float]] = []
+        if len(matched) == 1:
+            # a user counts at its best token: walk the tokens best first, each level's sorted
+            # postings merged, and stop after `limit` users
+            seen: Set[int] = set()
+            for weight, level in groupby(matched[0], key=lambda group: group[0]):
+                level = list(level)
+                if len(level) <= MERGE_FAN_IN:
+                    ordered = heapq.merge(*(self._sorted(token, field) for _, token, field in level))
+                else:
+                    # many small postings (e.g. one email per user): cheaper sorted as one
+                    ordered = sorted(set().union(*(self.postings[token][field] for _, token, field in level)))
+                for rank in ordered:
+                    if rank in seen or (filtered and rank not in candidates):
+                        continue
+                    seen.add(rank)
+                    best.append((self.by_rank[rank], round(weight, 3)))
+                    if len(best) >= limit:
+                        return len(candidates), best
+            return len(candidates), best
+
+        # several terms: candidates are few once intersected, score each one
+        scores = dict.fromkeys(candidates, 0.0)
+        for groups in matched:
+            pending = set(candidates)
+            for weight, token, field in groups:
+                ranks = self.postings[token][field]
+                hit = ranks & pending
+                for rank in hit:
+                    scores[rank] += weight
+                pending -= hit
+        by_score: Dict[float, List[int]] = {}
+        for rank, score in scores.items():
+            by_score.setdefault(score, []).append(rank)
+        for score in sorted(by_score, reverse=True):
+            for rank in sorted(by_score[score])[:limit - len(best)]:
+                best.append((self.by_rank[rank], round(score, 3)))
+            if len(best) >= limit:
+                break
+        return len(candidates), best
+
+
+# ---------------- Process-wide index ----------------
+index: Optional[UserIndex] = None
+_loaded_at: Optional[float] = None
+_invalidated_at = 0.0
+_load_lock = asyncio.Lock()
+# changes committed while a build reads the table, replayed onto the new index
+_during_build: Optional[List[Tuple[List[dict], List[dict]]]] = None
+_builds = 0
+
+
+def _fresh() -> bool:
+    return _loaded_at is not None and time.monotonic() - _loaded_at < USER_INDEX_TTL
+
+
+async def ensure_loaded(db: AsyncSession) -> UserIndex:
+    """
+    Build the index from one column-only query on first use, after invalidate() and every
+    USER_INDEX_TTL seconds; in between it follows committed ORM changes.
+    """
+    global index, _loaded_at, _during_build, _builds
+    if _fresh():
+        return index
+    async with _load_lock:
+        if _fresh():
+            return index
+        started = time.perf_counter()
+        _during_build = []
+        try:
+            async with for_cache(db, _invalidated_at) as source:
+                rows = (await source.execute(select(
+                    models.Utilisateur.id, models.Utilisateur.nom, models.Utilisateur.prenom,
+                    models.Utilisateur.email, models.Utilisateur.cin, models.Utilisateur.role,
+                ))).mappings().all()
+            fresh = UserIndex.build(rows)
+            for upserted, deleted in _during_build:
+                _apply(fresh, upserted, deleted)
+        finally:
+            _during_build = None
+        index, _loaded_at = fresh, time.monotonic()
+        _builds += 1
+        logger.info(f"[user_index] {len(rows)} users indexed in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return index
+
+
+async def current() -> UserIndex:
+    """
+    The index; a session (and a connection) is only taken when it has to be built.
+    """
+    if _fresh():
+        return index
+    async with read_session() as db:
+        return await ensure_loaded(db)
+
+
+def invalidate():
+    """
+    Rebuild on next use, after writes that bypass the ORM (bulk imports).
+    """
+    global _loaded_at, _invalidated_at
+    _loaded_at = None
+    _invalidated_at = time.time()
+
+
+def _apply(target: UserIndex, upserted: List[dict], deleted: List[dict]):
+    for row in deleted:
+        target.remove(row["id"])
+    for row in upserted:
+        target.add(row)
+
+
+def _on_user_change(upserted: List[dict], deleted: List[dict]):
+    if _during_build is not None:
+        _during_build.append((upserted, deleted))
+    if index is not None:
+        _apply(index, upserted, deleted)
+
+
+def stats() -> dict:
+    return {
+        "users": len(index.users) if index is not None else 0,
+        "tokens": len(index.vocabulary) if index is not None else 0,
+        "builds": _builds,
+    }
+
+
+model_events.subscribe(models.Utilisateur, _on_user_change)